@@ -1,122 +1,465 @@
 """Agentic wine selection using LLM to interpret themes."""
+import asyncio
 import json
-import subprocess
 import sys
-from typing import Dict, Any, List
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Any, List, Optional
 
 sys.path.append('.')
-from data.db import WineDatabase
+from data.db import FACET_EXPRESSIONS, SAMPLE_STRATA, SEARCH_ORDERS
+from data.derived import PRICE_BANDS
+from data.metrics import LLM_REQUEST_SECONDS, record_llm_usage
+from data.pool import WineDatabasePool
+from agent.encoding import ALLOWED_FIELDS, encode_results, prune_history
+from agent.scheduler import BATCH, INTERACTIVE, LLMScheduler
 
 
-def select_wines_agentic(theme_name: str, theme_description: str, wine_count: int) -> List[Dict]:
-    """
-    Use Claude to intelligently select wines based on theme description.
-    Claude uses search_wines tool to explore database.
-    """
+MODEL = "claude-sonnet-4-5-20250929"
+MAX_ITERATIONS = 5
+
+# Wines per 'candidates' progress event
+PROGRESS_CANDIDATES = 10
+PROGRESS_FIELDS = ['id', 'name', 'winery', 'country', 'rating', 'price_usd']
+
+FILTER_PROPERTIES = {
+    "country": {"type": "string"},
+    "region": {"type": "string"},
+    "grapes": {"type": "string"},
+    "wine_type": {"type": "string"},
+    "min_rating": {"type": "number"},
+    "max_price": {"type": "number"},
+    "notes": {"type": "string", "description": "Words the tasting notes must contain (e.g. smoky, food-friendly)"},
+}
+
+FILTER_KEYS = list(FILTER_PROPERTIES)
 
-    db = WineDatabase()
-    db.connect()
-
-    # Define the tool
-    tool = {
-        "name": "search_wines",
-        "description": "Search wine database with filters",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "country": {"type": "string"},
-                "region": {"type": "string"},
-                "grapes": {"type": "string"},
-                "wine_type": {"type": "string"},
-                "min_rating": {"type": "number"},
-                "max_price": {"type": "number"},
-                "limit": {"type": "integer", "default": 50}
+# Define the tools
+SEARCH_TOOL = {
+    "name": "search_wines",
+    "description": "Search wine database with filters",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            **FILTER_PROPERTIES,
+            "query": {"type": "string", "description": "Free text over name, winery, region and grapes; without sort, results are ranked by text relevance blended with rating and popularity"},
+            "price_band": {"type": "string", "enum": [label for label, _, _ in PRICE_BANDS]},
+            "min_value": {"type": "number", "description": "Minimum rating per dollar"},
+            "sort": {"type": "string", "enum": list(SEARCH_ORDERS), "default": "rating",
+                     "description": "rating, value (rating per dollar) or availability (likely US availability); without it a notes search is ranked by note relevance"},
+            "limit": {"type": "integer", "default": 50},
+            "fields": {
+                "type": "array",
+                "items": {"type": "string", "enum": ALLOWED_FIELDS},
+                "description": "Columns to return (default: id, name, winery, region, country, vintage, rating, price_usd, wine_type, grapes)"
             }
         }
     }
+}
+
+FACET_TOOL = {
+    "name": "facet_counts",
+    "description": "Count matching wines per country/region/grapes/wine_type/price_band. Cheap: use it to learn the catalog's shape before searching.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            **FILTER_PROPERTIES,
+            "facets": {
+                "type": "array",
+                "items": {"type": "string", "enum": list(FACET_EXPRESSIONS)}
+            },
+            "limit": {"type": "integer", "default": 20, "description": "Max values per facet"}
+        },
+        "required": ["facets"]
+    }
+}
+
+HISTOGRAM_TOOL = {
+    "name": "rating_histogram",
+    "description": "Count matching wines per rating bucket",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            **FILTER_PROPERTIES,
+            "bin_width": {"type": "number", "default": 0.5}
+        }
+    }
+}
 
-    # System prompt
-    system = """You are a wine expert curator. Use the search_wines tool to explore the database and select wines.
-Make multiple searches with different filters to find the best matches for the theme.
+REGIONS_TOOL = {
+    "name": "distinct_regions",
+    "description": "List distinct regions whose name contains a string, with wine counts",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "match": {"type": "string"},
+            "country": {"type": "string"},
+            "limit": {"type": "integer", "default": 50}
+        },
+        "required": ["match"]
+    }
+}
+
+SAMPLE_TOOL = {
+    "name": "sample_wines",
+    "description": "Random sample of matching wines instead of the top rated, optionally spread evenly across countries, wine types or price bands. Use it for variety.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            **FILTER_PROPERTIES,
+            "n": {"type": "integer", "default": 20},
+            "stratify": {"type": "string", "enum": SAMPLE_STRATA},
+            "seed": {"type": "integer", "description": "Same seed, same sample"},
+            "fields": SEARCH_TOOL["input_schema"]["properties"]["fields"]
+        }
+    }
+}
+
+TOOLS = [SEARCH_TOOL, FACET_TOOL, HISTOGRAM_TOOL, REGIONS_TOOL, SAMPLE_TOOL]
+
+# System prompt
+SYSTEM_PROMPT = """You are a wine expert curator. Use the tools to explore the database and select wines.
+Start with facet_counts, rating_histogram or distinct_regions to see how many wines match before pulling rows.
+Then make targeted search_wines calls to find the best matches for the theme; use sample_wines when the theme calls for variety over top ratings.
+Results come back as columns plus rows; values of columns listed in "dicts" are indexes into that table.
+Older results are replaced by a summary listing their wine ids.
 Return your final selection as a JSON array of exactly the requested number of wines."""
 
-    # User prompt
-    user_prompt = f"""Curate exactly {wine_count} wines for this theme:
+
+def _build_prompt(theme_name: str, theme_description: str, wine_count: int) -> str:
+    return f"""Curate exactly {wine_count} wines for this theme:
 
 **{theme_name}**
 {theme_description}
 
-Use search_wines tool to explore. Be creative - interpret the theme intelligently, not just keywords.
+Use the tools to explore. Be creative - interpret the theme intelligently, not just keywords.
 Final response must be JSON: {{"wines": [...], "reasoning": "why these wines fit"}}"""
 
-    # Call Claude via API
+
+def _block_to_param(block) -> Dict[str, Any]:
+    """Convert a response content block back into a request message block."""
+    if block.type == "tool_use":
+        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+    return {"type": "text", "text": block.text}
+
+
+def _filters(args: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: args.get(key) for key in FILTER_KEYS}
+
+
+def _compact_json(obj: Any) -> str:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def _search_wines(db, args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    The search_wines tool, branching like tools.search_wines_tool: ranked
+    text search for a query without a sort, ranked note search for notes
+    without a sort, otherwise a filtered search (planned if there is a
+    query) in the requested order.
+    """
+    limit = args.get('limit', 50)
+    filters = _filters(args)
+    derived = {'price_band': args.get('price_band'), 'min_value': args.get('min_value')}
+
+    if args.get('query') and not args.get('sort'):
+        return db.search_ranked(args['query'], limit=limit, **derived, **filters)
+
+    if args.get('notes') and not args.get('sort'):
+        notes = filters.pop('notes')
+        return db.search_notes(notes, limit=limit, **derived, **filters)
+
+    return db.search_wines(
+        query=args.get('query'),
+        limit=limit,
+        order_by=args.get('sort', 'rating'),
+        **derived,
+        **filters
+    )
+
+
+# Tool name -> (database call, result encoder)
+TOOL_HANDLERS = {
+    "search_wines": (
+        _search_wines,
+        lambda results, args, compact: (
+            encode_results(results, fields=args.get('fields')) if compact
+            else json.dumps(results[:20])  # Legacy full-row encoding
+        )
+    ),
+    "facet_counts": (
+        lambda db, args: db.facet_counts(args.get('facets') or ['country'], limit=args.get('limit', 20), **_filters(args)),
+        lambda results, args, compact: _compact_json(results)
+    ),
+    "rating_histogram": (
+        lambda db, args: db.rating_histogram(bin_width=args.get('bin_width', 0.5), **_filters(args)),
+        lambda results, args, compact: _compact_json(results)
+    ),
+    "distinct_regions": (
+        lambda db, args: db.distinct_regions(args.get('match', ''), country=args.get('country'), limit=args.get('limit', 50)),
+        lambda results, args, compact: _compact_json(results)
+    ),
+    "sample_wines": (
+        lambda db, args: db.sample_wines(args.get('n', 20), seed=args.get('seed'), stratify=args.get('stratify'), **_filters(args)),
+        lambda results, args, compact: (
+            encode_results(results, fields=args.get('fields')) if compact
+            else json.dumps(results[:20])
+        )
+    ),
+}
+
+
+async def _run_tool(
+    block,
+    pool: WineDatabasePool,
+    compact: bool = True,
+    on_result: Optional[Callable[[Any, Any], None]] = None
+) -> Dict[str, Any]:
+    """
+    Execute one tool_use block on the pool and wrap it as a tool_result.
+    on_result(block, results) sees the raw results of successful calls.
+    """
     try:
-        import anthropic
-        client = anthropic.Anthropic()
+        if block.name not in TOOL_HANDLERS:
+            raise ValueError(f"Unknown tool: {block.name}")
+        query, encode = TOOL_HANDLERS[block.name]
+        args = block.input
+        results = await pool.run(lambda db: query(db, args))
+        content = encode(results, args, compact)
+        is_error = False
+        if on_result:
+            on_result(block, results)
+    except Exception as e:
+        content = f"Error: {e}"
+        is_error = True
+
+    return {
+        "type": "tool_result",
+        "tool_use_id": block.id,
+        "content": content,
+        "is_error": is_error
+    }
+
+
+class _PerLoopAnthropic:
+    """
+    AsyncAnthropic with one client per event loop: its HTTP connection pool
+    can't be reused once the loop that opened it has closed.
+    """
+
+    def __init__(self):
+        self.messages = self
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def create(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            import anthropic
+            # The scheduler owns retries, so the SDK's own retry loop is disabled
+            client = self._clients[loop] = anthropic.AsyncAnthropic(max_retries=0)
+        return await client.messages.create(**kwargs)
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def shared_scheduler() -> LLMScheduler:
+    """The process-wide scheduler (configured from the environment on first use)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler.from_env(_PerLoopAnthropic())
+        return _scheduler
+
+
+def _make_client(priority: int = INTERACTIVE):
+    """Anthropic client whose calls go through the shared scheduler at priority."""
+    return shared_scheduler().client(priority)
+
+
+async def select_wines_agentic_async(
+    theme_name: str,
+    theme_description: str,
+    wine_count: int,
+    client=None,
+    pool: Optional[WineDatabasePool] = None,
+    db_path: str = "data/wines.db",
+    compact: bool = True,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> List[Dict]:
+    """
+    Use Claude to intelligently select wines based on theme description.
+    Claude explores the database with search and aggregate tools; every
+    tool call in a turn runs concurrently on the database pool.
+
+    With compact=True tool results are columnar and budgeted (see
+    agent/encoding.py) and results older than the previous turn are pruned
+    to one-line summaries. compact=False keeps the legacy full-row JSON.
+
+    progress, if given, is called with an event dict as curation proceeds:
+
+        {'event': 'iteration', 'iteration': i}
+        {'event': 'tool_call', 'iteration': i, 'tool': name, 'args': {...}, 'count': n}
+        {'event': 'candidates', 'iteration': i, 'total': n, 'wines': [...]}
+        {'event': 'selection', 'wines': [...]}
+
+    'candidates' lists the best-rated wines the searches have turned up so
+    far (PROGRESS_CANDIDATES of them, PROGRESS_FIELDS only).
+
+    LLM and client errors propagate, so callers can tell a failure from an
+    empty selection (select_wines_agentic turns them into []).
+    """
+    owns_pool = pool is None
+    if owns_pool:
+        pool = WineDatabasePool(db_path)
+
+    def emit(event: Dict[str, Any]):
+        if progress:
+            progress(event)
+
+    candidates: Dict[int, Dict[str, Any]] = {}
+
+    def on_result(block, results):
+        emit({
+            'event': 'tool_call',
+            'iteration': iteration,
+            'tool': block.name,
+            'args': block.input,
+            'count': len(results) if isinstance(results, (list, dict)) else None
+        })
+        if isinstance(results, list):
+            for row in results:
+                if isinstance(row, dict) and 'id' in row and 'name' in row:
+                    candidates[row['id']] = {k: row.get(k) for k in PROGRESS_FIELDS}
+
+    try:
+        if client is None:
+            client = _make_client()
 
         wines_selected = []
-        messages = [{"role": "user", "content": user_prompt}]
+        messages = [{"role": "user", "content": _build_prompt(theme_name, theme_description, wine_count)}]
 
         # Tool use loop
-        for iteration in range(5):  # Max 5 iterations
-            response = client.messages.create(
-                model="claude-sonnet-4-5-20250929",
-                max_tokens=4096,
-                system=system,
-                tools=[tool],
-                messages=messages
-            )
-
-            # Collect all tool use blocks
-            tool_results = []
-            has_text_response = False
+        for iteration in range(MAX_ITERATIONS):
+            emit({'event': 'iteration', 'iteration': iteration})
+            if compact:
+                prune_history(messages, keep_last=1)
 
-            for block in response.content:
-                if block.type == "tool_use":
-                    # Execute search
-                    args = block.input
-                    results = db.search_wines(
-                        country=args.get('country'),
-                        region=args.get('region'),
-                        grapes=args.get('grapes'),
-                        wine_type=args.get('wine_type'),
-                        min_rating=args.get('min_rating'),
-                        max_price=args.get('max_price'),
-                        limit=args.get('limit', 50)
-                    )
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                response = await client.messages.create(
+                    model=MODEL,
+                    max_tokens=4096,
+                    system=SYSTEM_PROMPT,
+                    tools=TOOLS,
+                    messages=messages
+                )
+                outcome = 'ok'
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, model=MODEL, outcome=outcome)
+            record_llm_usage(MODEL, response)
 
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": json.dumps(results[:20])  # Limit context
-                    })
+            tool_blocks = [b for b in response.content if b.type == "tool_use"]
 
-                elif block.type == "text":
+            for block in response.content:
+                if block.type == "text":
                     # Try to parse final JSON response
                     try:
                         result = json.loads(block.text)
                         wines_selected = result.get('wines', [])
-                        has_text_response = True
                         break
-                    except:
+                    except (json.JSONDecodeError, AttributeError):
                         pass
 
-            if has_text_response and wines_selected:
+            if wines_selected or not tool_blocks:
                 break
 
+            tool_results = await asyncio.gather(*(
+                _run_tool(b, pool, compact, on_result if progress else None) for b in tool_blocks
+            ))
+            if candidates:
+                best = sorted(candidates.values(), key=lambda w: w['rating'] or 0, reverse=True)
+                emit({
+                    'event': 'candidates',
+                    'iteration': iteration,
+                    'total': len(candidates),
+                    'wines': best[:PROGRESS_CANDIDATES]
+                })
+
             # Add assistant response and all tool results
-            if tool_results:
-                messages.append({"role": "assistant", "content": response.content})
-                messages.append({"role": "user", "content": tool_results})
+            messages.append({"role": "assistant", "content": [_block_to_param(b) for b in response.content]})
+            messages.append({"role": "user", "content": list(tool_results)})
 
-        db.close()
+        emit({'event': 'selection', 'wines': wines_selected[:wine_count]})
         return wines_selected[:wine_count]
 
+    finally:
+        if owns_pool:
+            pool.close()
+
+
+def select_wines_agentic(
+    theme_name: str,
+    theme_description: str,
+    wine_count: int,
+    client=None,
+    db_path: str = "data/wines.db",
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> List[Dict]:
+    """Synchronous entry point for select_wines_agentic_async; errors are printed and give []."""
+    try:
+        return asyncio.run(select_wines_agentic_async(
+            theme_name, theme_description, wine_count, client=client, db_path=db_path, progress=progress
+        ))
     except ImportError:
         print("anthropic library not installed. Install with: pip install anthropic")
-        db.close()
         return []
     except Exception as e:
         print(f"Error in agentic selection: {e}")
-        db.close()
         return []
+
+
+async def curate_themes_async(
+    themes,
+    max_concurrency: int = 4,
+    client=None,
+    db_path: str = "data/wines.db",
+    db_workers: int = 8,
+    compact: bool = True
+) -> Dict[str, List[Dict]]:
+    """
+    Curate many themes concurrently, at most max_concurrency at a time.
+
+    All themes share one LLM client and one database pool. Without an
+    explicit client, calls go through one BATCH-priority scheduler.
+    """
+    if client is None:
+        client = _make_client(BATCH)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    with WineDatabasePool(db_path, max_workers=db_workers) as pool:
+        async def curate(theme):
+            async with semaphore:
+                try:
+                    return theme.name, await select_wines_agentic_async(
+                        theme.name, theme.curation_brief(), theme.wine_count,
+                        client=client, pool=pool, compact=compact
+                    )
+                except Exception as e:
+                    # One failed theme shouldn't sink the batch
+                    print(f"Error curating {theme.name}: {e}")
+                    return theme.name, []
+
+        results = await asyncio.gather(*(curate(t) for t in themes))
+
+    return dict(results)
+
+
+def curate_themes(themes, max_concurrency: int = 4, client=None, db_path: str = "data/wines.db") -> Dict[str, List[Dict]]:
+    """Synchronous entry point for curate_themes_async."""
+    return asyncio.run(curate_themes_async(themes, max_concurrency, client=client, db_path=db_path))
@@ -0,0 +1,192 @@
+"""Budget-constrained box selection (a knapsack with diversity and type-mix constraints)."""
+import bisect
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Diversity rule -> wine attribute it varies
+DIVERSITY_ATTRIBUTES = {
+    'vary_region': 'region',
+    'vary_winery': 'winery',
+    'vary_vintage': 'vintage',
+    'vary_type': 'wine_type',
+    'vary_grapes': 'grapes',
+    'vary_country': 'country',
+}
+
+# Objective bonus for each attribute value a wine adds to the box
+DIVERSITY_BONUS = 0.25
+
+# Search stack frame kinds
+_VISIT, _UNDO = 0, 1
+
+# Same split _ensure_type_mix aims for
+MIX_TYPES_RATIO = {'red': 0.6, 'white': 0.4}
+
+
+def type_minimums(count: int, rules: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Minimum bottles per wine type implied by the diversity rules.
+
+    Each type gets at least one bottle when the box has room for all of
+    them; smaller boxes only keep the ratio's (rounded down) minimums.
+    """
+    if not rules.get('mix_types'):
+        return {}
+    minimums = {t: int(count * share) for t, share in MIX_TYPES_RATIO.items()}
+    if count < len(minimums):
+        return {t: n for t, n in minimums.items() if n}
+    return {t: max(1, n) for t, n in minimums.items()}
+
+
+def _insert_capped(prices: List[float], price: float, cap: int) -> List[float]:
+    """A copy of sorted `prices` with `price` inserted, keeping the `cap` smallest."""
+    merged = list(prices)
+    bisect.insort(merged, price)
+    return merged[:cap]
+
+
+def box_value(wines: List[Dict[str, Any]], rules: Dict[str, Any]) -> float:
+    """Objective: total rating plus a bonus per distinct value of each varied attribute."""
+    value = sum(w.get('rating') or 0 for w in wines)
+    for rule, attribute in DIVERSITY_ATTRIBUTES.items():
+        if rules.get(rule):
+            value += DIVERSITY_BONUS * len({w.get(attribute) for w in wines if w.get(attribute) is not None})
+    return value
+
+
+def optimize_box(
+    wines: List[Dict[str, Any]],
+    count: int,
+    budget: float,
+    rules: Optional[Dict[str, Any]] = None,
+    time_limit: float = 0.5
+) -> List[Dict[str, Any]]:
+    """
+    Choose `count` wines maximising box_value with total price <= budget.
+
+    Depth-first branch and bound over candidates ordered by optimistic value
+    (rating plus every diversity bonus it could earn). A branch is cut when
+    its optimistic bound can't beat the best box found, when even the
+    cheapest remaining wines would break the budget, or when too few wines of
+    a required type remain. The search starts from a greedy box and returns
+    the best box found when `time_limit` seconds run out. Wines without a
+    price are skipped. Returns [] when no feasible box exists.
+    """
+    deadline = time.perf_counter() + time_limit
+    rules = rules or {}
+    minimums = type_minimums(count, rules)
+    varied = [a for r, a in DIVERSITY_ATTRIBUTES.items() if rules.get(r)]
+    max_bonus = DIVERSITY_BONUS * len(varied)
+
+    items = [w for w in wines if w.get('price_usd') is not None and w['price_usd'] <= budget]
+    items.sort(key=lambda w: (w.get('rating') or 0, -w['price_usd']), reverse=True)
+    n = len(items)
+    if n < count:
+        return []
+
+    ratings = [w.get('rating') or 0 for w in items]
+    prices = [w['price_usd'] for w in items]
+    types = [w.get('wine_type') for w in items]
+
+    # Suffix tables: the `count` cheapest prices of items[i:], overall and per
+    # required type, built from the end in O(n * count); a type's list is
+    # shared with the next position until one of its wines is reached
+    suffix_prices = [[] for _ in range(n + 1)]
+    suffix_type_prices = [{t: [] for t in minimums} for _ in range(n + 1)]
+    for i in range(n - 1, -1, -1):
+        suffix_prices[i] = _insert_capped(suffix_prices[i + 1], prices[i], count)
+        suffix_type_prices[i] = dict(suffix_type_prices[i + 1])
+        if types[i] in minimums:
+            suffix_type_prices[i][types[i]] = _insert_capped(suffix_type_prices[i + 1][types[i]], prices[i], count)
+
+    def cheapest_completion(i: int, need: int, type_counts: Dict[str, int]) -> float:
+        """Lower bound on the cost of `need` more wines from items[i:], inf if infeasible."""
+        deficits = {t: max(0, m - type_counts.get(t, 0)) for t, m in minimums.items()}
+        if sum(deficits.values()) > need or n - i < need:
+            return float('inf')
+        cost = 0.0
+        for t, d in deficits.items():
+            if len(suffix_type_prices[i][t]) < d:
+                return float('inf')
+            cost += sum(suffix_type_prices[i][t][:d])
+        return cost + sum(suffix_prices[i][:need - sum(deficits.values())])
+
+    best = {'value': float('-inf'), 'box': []}
+
+    # Greedy incumbent: best-rated first while the budget and type needs allow
+    greedy, spent, counts = [], 0.0, {}
+    for i in range(n):
+        need = count - len(greedy)
+        if need == 0:
+            break
+        counts[types[i]] = counts.get(types[i], 0) + 1
+        if spent + prices[i] + cheapest_completion(i + 1, need - 1, counts) > budget:
+            counts[types[i]] -= 1
+            continue
+        greedy.append(i)
+        spent += prices[i]
+    if len(greedy) == count and cheapest_completion(n, 0, counts) == 0:
+        best['box'] = greedy
+        best['value'] = box_value([items[i] for i in greedy], rules)
+
+    # Iterative depth-first search (one frame per candidate would overflow
+    # Python's stack on large pools). The stack holds nodes to visit and
+    # undo markers that restore the state after a "take" branch, pushed so
+    # that take is explored before skip, as a recursive search would.
+    chosen: List[int] = []
+    seen = [set() for _ in varied]
+    type_counts: Dict[str, int] = {}
+    cost, rating_sum = 0.0, 0.0
+    stack: List[Tuple] = [(_VISIT, 0)]
+    nodes = 0
+
+    while stack:
+        frame = stack.pop()
+        if frame[0] == _UNDO:
+            _, i, added, cost, rating_sum = frame
+            chosen.pop()
+            type_counts[types[i]] -= 1
+            for values, value in added:
+                values.discard(value)
+            continue
+
+        i = frame[1]
+        nodes += 1
+        if nodes % 1024 == 0 and time.perf_counter() > deadline:
+            break
+
+        need = count - len(chosen)
+        if need == 0:
+            if all(type_counts.get(t, 0) >= m for t, m in minimums.items()):
+                value = rating_sum + DIVERSITY_BONUS * sum(len(s) for s in seen)
+                if value > best['value']:
+                    best['value'], best['box'] = value, list(chosen)
+            continue
+
+        # Bounds: budget and type needs, then optimistic value
+        if cost + cheapest_completion(i, need, type_counts) > budget:
+            continue
+        current = rating_sum + DIVERSITY_BONUS * sum(len(s) for s in seen)
+        if current + sum(ratings[i:i + need]) + need * max_bonus <= best['value']:
+            continue
+
+        # Skip items[i] (explored after the take branch below)
+        stack.append((_VISIT, i + 1))
+
+        # Take items[i]
+        if cost + prices[i] <= budget:
+            wine = items[i]
+            added = []
+            for attribute, values in zip(varied, seen):
+                value = wine.get(attribute)
+                if value is not None and value not in values:
+                    values.add(value)
+                    added.append((values, value))
+            type_counts[types[i]] = type_counts.get(types[i], 0) + 1
+            chosen.append(i)
+            stack.append((_UNDO, i, added, cost, rating_sum))
+            stack.append((_VISIT, i + 1))
+            cost += prices[i]
+            rating_sum += ratings[i]
+
+    return [items[i] for i in best['box']]
@@ -1,17 +1,74 @@
 """Claude Agent SDK integration for intelligent wine selection."""
+import asyncio
 import json
 import sys
 import os
 import subprocess
 import tempfile
-from typing import Dict, Any, List, Optional
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from data.db import WineDatabase
+from data.history import ShipmentHistory
 from themes.presets import Theme, get_theme_by_name
 
+# Wine field candidates are sorted by for each Theme.order_by (then rating)
+ORDER_COLUMNS = {'rating': 'rating', 'value': 'value_score', 'availability': 'availability_score'}
+
+
+def hedge_info(status: str, deadline: float, start: float, timings: Dict[str, float]) -> Dict[str, Any]:
+    """The info dict of a hedged selection: winner, agentic status and timings in ms."""
+    return {
+        'winner': 'agentic' if status == 'ok' else 'deterministic',
+        'agentic_status': status,
+        'deadline_ms': round(deadline * 1000, 1),
+        'total_ms': round((time.perf_counter() - start) * 1000, 1),
+        **timings
+    }
+
+
+async def hedge_selection(
+    agentic: Awaitable[List[Dict[str, Any]]],
+    fallback: Awaitable[List[Dict[str, Any]]],
+    deadline: float
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    The race behind WineAgent.select_hedged and the server's hedged jobs.
+
+    agentic (raw curated wines) is cancelled after `deadline` seconds; it
+    wins if it finishes in time with wines, and fallback (started at once)
+    is cancelled, otherwise fallback is awaited. Agentic wines come back
+    unannotated. Returns (wines, hedge_info(...)).
+    """
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    def fallback_done(task: asyncio.Future):
+        if not task.cancelled():
+            timings['deterministic_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    fallback = asyncio.ensure_future(fallback)
+    fallback.add_done_callback(fallback_done)
+    try:
+        wines = await asyncio.wait_for(agentic, timeout=deadline)
+        status = 'ok' if wines else 'empty'
+    except asyncio.TimeoutError:
+        wines, status = [], 'timeout'
+    except Exception as e:
+        wines, status = [], f'error: {e}'
+    timings['agentic_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    if status == 'ok':
+        fallback.cancel()
+    else:
+        wines = await fallback
+    return wines, hedge_info(status, deadline, start, timings)
+
 
 class WineAgent:
     """
@@ -21,18 +78,127 @@ class WineAgent:
     It uses the database directly with intelligent heuristics for theme-based selection.
     """
 
-    def __init__(self, agentic=True):
-        self.db = WineDatabase()
+    def __init__(
+        self,
+        agentic=True,
+        hedge_deadline: Optional[float] = None,
+        db_path: str = "data/wines.db",
+        llm_client=None,
+        retrieval: bool = False,
+        club: Optional[str] = None,
+        seed: Optional[str] = None
+    ):
+        self.db = WineDatabase(db_path)
+        self.history = ShipmentHistory(self.db)
+        self.club = club
+        self.seed = seed
         self.agentic = agentic
+        self.retrieval = retrieval
+        self._vector_index = None
+        self._catalog_arrays = None
+        self.llm_client = llm_client
+        self.hedge_deadline = hedge_deadline
+        self.last_hedge: Optional[Dict[str, Any]] = None
+        self.last_search_plan: Optional[Dict[str, Any]] = None
+        self.last_search_any_term = False
+
+    def select_for_theme(
+        self,
+        theme: Theme,
+        box_budget: Optional[float] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Select wines for theme using agentic or deterministic approach.
+
+        With `box_budget`, the whole box must cost at most that much; this
+        always uses the deterministic box optimizer. `progress` receives
+        agentic curation events (see select_wines_agentic_async); the
+        deterministic paths emit none.
 
-    def select_for_theme(self, theme: Theme) -> List[Dict[str, Any]]:
-        """Select wines for theme using agentic or deterministic approach."""
+        A hedged selection's info is kept in last_hedge; callers sharing the
+        agent across threads should use select_with_hedge_info instead.
+        """
+        wines, self.last_hedge = self.select_with_hedge_info(theme, box_budget, progress)
+        return wines
+
+    def select_with_hedge_info(
+        self,
+        theme: Theme,
+        box_budget: Optional[float] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """select_for_theme returning (wines, hedge info or None) instead of setting last_hedge."""
+        if box_budget:
+            return self._select_box(theme, box_budget), None
+        if self.agentic and self.hedge_deadline:
+            return self.select_hedged(theme, self.hedge_deadline, progress)
         if self.agentic:
-            return self._select_agentic(theme)
-        else:
-            return self._select_deterministic(theme)
+            return self._select_agentic(theme, progress), None
+        return self._select_deterministic(theme), None
 
-    def _select_agentic(self, theme: Theme) -> List[Dict[str, Any]]:
+    def select_hedged(
+        self,
+        theme: Theme,
+        deadline: float,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Race agentic curation against deterministic selection.
+
+        The agentic loop starts on a background thread (see hedge_selection)
+        and is cancelled once `deadline` seconds have passed; the
+        deterministic selection runs meanwhile on this thread. The agentic
+        result wins if it arrives in time with wines, otherwise the
+        deterministic one is returned.
+
+        Returns:
+            (wines, info) where info records the winner, why, and timings in ms
+        """
+        from agent.agentic import select_wines_agentic_async
+
+        start = time.perf_counter()
+        deterministic: Future = Future()
+
+        async def race():
+            agentic = select_wines_agentic_async(
+                theme_name=theme.name,
+                theme_description=theme.curation_brief(),
+                wine_count=theme.wine_count,
+                client=self.llm_client,
+                db_path=str(self.db.db_path),
+                progress=progress
+            )
+            return await hedge_selection(agentic, asyncio.wrap_future(deterministic), deadline)
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wine-hedge")
+        future = executor.submit(asyncio.run, race())
+        try:
+            # Skipped if the agentic side has already won
+            if deterministic.set_running_or_notify_cancel():
+                try:
+                    deterministic.set_result(self._select_deterministic(theme))
+                except Exception as e:
+                    deterministic.set_exception(e)
+
+            # The agentic side cancels itself at the deadline; allow a moment
+            # for cancellation to unwind before giving up on it.
+            wines, info = future.result(timeout=max(0.0, deadline - (time.perf_counter() - start)) + 0.1)
+        except FutureTimeoutError:
+            elapsed = round((time.perf_counter() - start) * 1000, 1)
+            wines, info = deterministic.result(), hedge_info('timeout', deadline, start, {'agentic_ms': elapsed})
+        finally:
+            executor.shutdown(wait=False)
+
+        if info['winner'] == 'agentic':
+            return self.annotate_agentic(wines, theme), info
+        return wines, info
+
+    def _select_agentic(
+        self,
+        theme: Theme,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
         """
         Use Claude LLM to intelligently curate wines for a theme.
         The LLM reads the theme description and uses search tools to explore.
@@ -41,16 +207,32 @@ class WineAgent:
 
         wines = select_wines_agentic(
             theme_name=theme.name,
-            theme_description=theme.description,
-            wine_count=theme.wine_count
+            theme_description=theme.curation_brief(),
+            wine_count=theme.wine_count,
+            client=self.llm_client,
+            db_path=str(self.db.db_path),
+            progress=progress
         )
 
-        # Add selection reasons if not present
-        for wine in wines:
-            if 'selection_reason' not in wine:
-                wine['selection_reason'] = self._explain_selection(wine, theme)
+        return self.annotate_agentic(wines, theme)
 
-        return wines
+    def annotate_agentic(self, wines: List[Dict[str, Any]], theme: Theme) -> List[Dict[str, Any]]:
+        """
+        Match the LLM's picks to catalog IDs, drop wines the club already
+        received and add selection reasons the LLM didn't provide.
+        """
+        self.db.connect()
+
+        try:
+            wines = self._exclude_shipped(self._resolve_ids(wines))
+            for wine in wines:
+                if 'selection_reason' not in wine:
+                    wine['selection_reason'] = self._explain_selection(wine, theme)
+
+            return wines
+
+        finally:
+            self.db.close()
 
     def _select_deterministic(self, theme: Theme) -> List[Dict[str, Any]]:
         """
@@ -65,14 +247,37 @@ class WineAgent:
         self.db.connect()
 
         try:
-            # Start with base criteria from theme
-            all_wines = self._search_with_criteria(theme.criteria)
+            # Start with the top soft-criteria scores (theme.scoring), a random
+            # sample of matches (theme.sampling), wines whose text resembles
+            # the theme description (retrieval), or the theme's hard criteria.
+            # Scored candidates keep their order, as do retrieved ones unless
+            # the theme sets its own order; the rest follow theme.order_by.
+            # Fetch extra candidates to make up for the club's past shipments
+            # that match the theme.
+            candidates = 100 + self._shipped_count(theme.criteria)
+            all_wines = []
+            ranked = True
+            if theme.scoring:
+                all_wines = self._exclude_shipped(self._search_scored(theme, candidates))
+            elif theme.sampling:
+                all_wines = self._exclude_shipped(self._search_sampled(theme, candidates))
+                ranked = False
+            elif self.retrieval:
+                all_wines = self._exclude_shipped(self._search_semantic(theme, candidates))
+                ranked = theme.order_by == 'rating'
+            if len(all_wines) < theme.wine_count:
+                all_wines = self._exclude_shipped(
+                    self._search_with_criteria(theme.criteria, candidates, theme.order_by)
+                )
+                ranked = False
 
             # Apply diversity rules
             selected = self._apply_diversity(
                 all_wines,
                 theme.wine_count,
-                theme.diversity_rules
+                theme.diversity_rules,
+                ranked=ranked,
+                order_by=theme.order_by
             )
 
             # Add selection reasoning
@@ -84,8 +289,49 @@ class WineAgent:
         finally:
             self.db.close()
 
-    def _search_with_criteria(self, criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Search database with theme criteria."""
+    def _select_box(self, theme: Theme, budget: float, candidates: int = 150) -> List[Dict[str, Any]]:
+        """
+        Best-rated, diverse box for the theme whose total price fits `budget`.
+
+        Candidates are the top-rated wines matching the theme criteria priced
+        under the whole budget, plus those under an even per-bottle share of
+        it so that a feasible box exists whenever the catalog allows one.
+        """
+        from agent.box import optimize_box
+
+        self.db.connect()
+
+        try:
+            pool = {}
+            max_price = theme.criteria.get('max_price')
+            for ceiling in (budget, budget / theme.wine_count):
+                criteria = dict(theme.criteria, max_price=min(ceiling, max_price or ceiling))
+                limit = candidates + self._shipped_count(criteria)
+                for wine in self._exclude_shipped(self._search_with_criteria(criteria, limit, theme.order_by)):
+                    pool.setdefault(wine['id'], wine)
+
+            selected = optimize_box(
+                list(pool.values()),
+                theme.wine_count,
+                budget,
+                theme.diversity_rules
+            )
+
+            for wine in selected:
+                wine['selection_reason'] = self._explain_selection(wine, theme)
+
+            return selected
+
+        finally:
+            self.db.close()
+
+    def _search_with_criteria(
+        self,
+        criteria: Dict[str, Any],
+        limit: int = 100,
+        order_by: str = 'rating'
+    ) -> List[Dict[str, Any]]:
+        """Search database with theme criteria, best first by order_by (see Theme.order_by)."""
         wines = self.db.search_wines(
             country=criteria.get('country'),
             region=criteria.get('region'),
@@ -93,19 +339,155 @@ class WineAgent:
             min_rating=criteria.get('min_rating'),
             max_price=criteria.get('max_price'),
             wine_type=criteria.get('wine_type'),
-            limit=100  # Get more candidates for diversity selection
+            order_by=order_by,
+            limit=limit  # Get more candidates for diversity selection
+        )
+        return wines
+
+    def _search_semantic(self, theme: Theme, candidates: int = 100) -> List[Dict[str, Any]]:
+        """
+        Retrieve wines whose name/winery/region/grapes resemble the theme text.
+
+        Uses the local vector index (built on first use), then keeps hits that
+        also satisfy the theme criteria, in similarity order.
+        """
+        from data.vector_index import load_or_build
+
+        if self._vector_index is None:
+            self._vector_index = load_or_build(self.db)
+
+        hits = self._vector_index.query(f"{theme.name} {theme.description}", k=candidates * 5)
+        wines = self.db.get_wines_by_ids([wine_id for wine_id, _ in hits])
+        scores = dict(hits)
+
+        matched = []
+        for wine in wines:
+            if self._matches_criteria(wine, theme.criteria):
+                wine['similarity'] = round(scores[wine['id']], 3)
+                matched.append(wine)
+                if len(matched) >= candidates:
+                    break
+
+        return matched
+
+    def _search_sampled(self, theme: Theme, candidates: int = 100) -> List[Dict[str, Any]]:
+        """Seeded random sample of wines meeting the theme criteria."""
+        criteria = theme.criteria
+        return self.db.sample_wines(
+            candidates,
+            seed=self.seed,
+            stratify=theme.sampling.get('stratify'),
+            country=criteria.get('country'),
+            region=criteria.get('region'),
+            grapes=criteria.get('grapes'),
+            min_rating=criteria.get('min_rating'),
+            max_price=criteria.get('max_price'),
+            wine_type=criteria.get('wine_type')
+        )
+
+    def _search_scored(self, theme: Theme, candidates: int = 100) -> List[Dict[str, Any]]:
+        """Top wines by the theme's soft-criteria score over the whole catalog."""
+        from data.arrays import CatalogArrays
+        from agent.scoring import rank_wines
+
+        version = self.db.catalog_version()
+        if self._catalog_arrays is None or self._catalog_arrays.catalog_version != version:
+            self._catalog_arrays = CatalogArrays.load(self.db)
+
+        ranked = rank_wines(self._catalog_arrays, theme.scoring, k=candidates)
+        scores = dict(ranked)
+        wines = self.db.get_wines_by_ids([wine_id for wine_id, _ in ranked])
+        for wine in wines:
+            wine['score'] = round(scores[wine['id']], 3)
+
+        return wines
+
+    def _shipped_count(self, criteria: Dict[str, Any]) -> int:
+        """How many wines matching the criteria the current club has received (0 without a club)."""
+        if not self.club:
+            return 0
+        return self.db.shipped_count(
+            self.club,
+            country=criteria.get('country'),
+            region=criteria.get('region'),
+            grapes=criteria.get('grapes'),
+            min_rating=criteria.get('min_rating'),
+            max_price=criteria.get('max_price'),
+            wine_type=criteria.get('wine_type')
         )
+
+    def _resolve_ids(self, wines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in catalog IDs the LLM left out by looking wines up by name and winery."""
+        for wine in wines:
+            if wine.get('id') is None and wine.get('name'):
+                wine_id = self.db.find_wine_id(wine['name'], wine.get('winery'))
+                if wine_id is not None:
+                    wine['id'] = wine_id
         return wines
 
+    def _exclude_shipped(self, wines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Remove wines already shipped to the current club (wines without an ID can't be checked)."""
+        if not self.club:
+            return wines
+
+        unknown = sum(1 for w in wines if w.get('id') is None)
+        if unknown:
+            print(f"Warning: {unknown} selected wines aren't in the catalog; not checked against {self.club}'s history")
+        return [w for w in wines if w.get('id') is None or not self.history.was_shipped(self.club, w['id'])]
+
+    def _tiebreak(self, wine: Dict[str, Any]) -> int:
+        """Stable pseudo-random rank of a wine for the current seed."""
+        return zlib.crc32(f"{self.seed}:{wine.get('id')}".encode())
+
+    def record_shipment(self, wines: List[Dict[str, Any]], theme: Optional[Theme] = None) -> int:
+        """Add a selection to the current club's history so later selections skip it."""
+        if not self.club:
+            raise ValueError("record_shipment needs a club")
+
+        try:
+            # Wines without a catalog ID can't be recognised later, so aren't recorded
+            wine_ids = [w['id'] for w in wines if w.get('id') is not None]
+            return self.history.record(self.club, wine_ids, theme.name if theme else None)
+        finally:
+            self.db.close()
+
+    def _matches_criteria(self, wine: Dict[str, Any], criteria: Dict[str, Any]) -> bool:
+        """Python mirror of the search_wines filters (substring match on text fields)."""
+        for field in ('country', 'region', 'grapes'):
+            wanted = criteria.get(field)
+            if wanted and wanted.lower() not in (wine.get(field) or '').lower():
+                return False
+
+        if criteria.get('wine_type') and wine.get('wine_type') != criteria['wine_type']:
+            return False
+
+        min_rating = criteria.get('min_rating')
+        if min_rating is not None and (wine.get('rating') is None or wine['rating'] < min_rating):
+            return False
+
+        max_price = criteria.get('max_price')
+        if max_price is not None and (wine.get('price_usd') is None or wine['price_usd'] > max_price):
+            return False
+
+        return True
+
     def _apply_diversity(
         self,
         wines: List[Dict[str, Any]],
         count: int,
-        rules: Dict[str, Any]
+        rules: Dict[str, Any],
+        ranked: bool = False,
+        order_by: str = 'rating'
     ) -> List[Dict[str, Any]]:
         """
         Apply diversity rules to select varied wines.
 
+        Wines are considered best first by order_by ('rating', or 'value' and
+        'availability' then rating), or in the given order when `ranked`
+        (candidates already ordered by similarity or score). With a seed,
+        equal wines are ordered pseudo-randomly per seed instead of by review
+        count, so e.g. a monthly seed rotates among ties.
+
         Diversity rules can include:
         - vary_region: Prefer different regions
         - vary_winery: Prefer different wineries
@@ -125,10 +507,15 @@ class WineAgent:
         seen_types = set()
         seen_grapes = set()
 
-        # Sort wines by rating (best first)
-        wines_sorted = sorted(
+        # Sort wines by the theme's order (best first)
+        if self.seed is None:
+            tiebreak = lambda w: w.get('num_reviews') or 0
+        else:
+            tiebreak = self._tiebreak
+        column = ORDER_COLUMNS[order_by]
+        wines_sorted = list(wines) if ranked else sorted(
             wines,
-            key=lambda w: (w.get('rating') or 0, w.get('num_reviews') or 0),
+            key=lambda w: (w.get(column) or 0, w.get('rating') or 0, tiebreak(w)),
             reverse=True
         )
 
@@ -259,12 +646,45 @@ class WineAgent:
         min_rating: Optional[float] = None,
         max_price: Optional[float] = None,
         wine_type: Optional[str] = None,
-        limit: int = 20
+        limit: int = 20,
+        order_by: Optional[str] = None,
+        query: Optional[str] = None,
+        explain: bool = False,
+        **derived_filters
     ) -> List[Dict[str, Any]]:
-        """Search wines with filters."""
+        """
+        Search wines with filters (see WineDatabase.search_wines for order_by
+        and derived filters, including notes). A text query without order_by
+        is ranked by WineDatabase.search_ranked and carries snippets, and a
+        notes query alone is ranked by WineDatabase.search_notes; with
+        order_by it is a planned filtered search whose plan is kept in
+        last_search_plan. last_search_any_term records whether a ranked
+        search fell back to matching any word.
+        """
         self.db.connect()
+        self.last_search_plan = None
+        self.last_search_any_term = False
 
         try:
+            if order_by is None and (query or derived_filters.get('notes')):
+                if query:
+                    ranked_search, text = self.db.search_ranked, query
+                else:
+                    ranked_search, text = self.db.search_notes, derived_filters.pop('notes')
+                wines = ranked_search(
+                    text,
+                    limit=limit,
+                    country=country,
+                    region=region,
+                    grapes=grapes,
+                    min_rating=min_rating,
+                    max_price=max_price,
+                    wine_type=wine_type,
+                    **derived_filters
+                )
+                self.last_search_any_term = self.db.last_ranked_any_term
+                return wines
+
             wines = self.db.search_wines(
                 country=country,
                 region=region,
@@ -272,13 +692,49 @@ class WineAgent:
                 min_rating=min_rating,
                 max_price=max_price,
                 wine_type=wine_type,
-                limit=limit
+                limit=limit,
+                order_by=order_by or 'rating',
+                query=query,
+                explain=explain,
+                **derived_filters
             )
+            self.last_search_plan = self.db.last_plan
             return wines
 
         finally:
             self.db.close()
 
+    def facet_counts(
+        self,
+        facets: List[str],
+        limit: int = 20,
+        query: Optional[str] = None,
+        any_term: bool = False,
+        **filters
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Facet counts for a search's query and filters (see
+        WineDatabase.facet_counts); pass last_search_any_term as any_term so
+        they count the wines search listed.
+        """
+        self.db.connect()
+
+        try:
+            return self.db.facet_counts(facets, limit=limit, query=query, any_term=any_term, **filters)
+
+        finally:
+            self.db.close()
+
+    def get_wines_details(self, wine_ids: List[int]) -> List[Dict[str, Any]]:
+        """Get details for many wines in one query, in the given order."""
+        self.db.connect()
+
+        try:
+            return self.db.get_wines_by_ids(wine_ids)
+
+        finally:
+            self.db.close()
+
     def get_wine_details(self, wine_id: int) -> Optional[Dict[str, Any]]:
         """Get details for a specific wine."""
         self.db.connect()
@@ -0,0 +1,161 @@
+"""Compact encoding of tool results for LLM context."""
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+
+# Fields sent to the model when it doesn't ask for a projection. `id` stays so
+# the model can refer back to wines; bookkeeping columns (wine_id, source,
+# created_at) never leave the database.
+DEFAULT_FIELDS = [
+    'id', 'name', 'winery', 'region', 'country', 'vintage',
+    'rating', 'price_usd', 'wine_type', 'grapes'
+]
+
+ALLOWED_FIELDS = DEFAULT_FIELDS + ['num_reviews', 'value_score', 'availability_score', 'price_band', 'snippet', 'match_score', 'tasting_note']
+
+# Columns whose repeated values are replaced by an index into a shared table
+DICTIONARY_FIELDS = {'winery', 'region', 'country', 'wine_type', 'grapes'}
+
+DEFAULT_TOKEN_BUDGET = 1500
+
+PRUNED_PREFIX = "[earlier result pruned"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/JSON)."""
+    return (len(text) + 3) // 4
+
+
+def project_fields(fields: Optional[Sequence[str]]) -> List[str]:
+    """Validate a model-requested projection, falling back to the defaults."""
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    projected = [f for f in fields if f in ALLOWED_FIELDS]
+    if 'id' not in projected:
+        projected.insert(0, 'id')
+    return projected
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def encode_results(
+    rows: List[Dict[str, Any]],
+    fields: Optional[Sequence[str]] = None,
+    max_tokens: int = DEFAULT_TOKEN_BUDGET
+) -> str:
+    """
+    Encode rows as columnar JSON within a token budget.
+
+    Output shape::
+
+        {"cols": [...], "dicts": {"country": ["France", ...]},
+         "rows": [[...], ...], "total": 50, "shown": 20}
+
+    Values of columns listed in ``dicts`` are indexes into that column's
+    table. Rows are dropped from the end (lowest ranked) until the encoding
+    fits ``max_tokens``.
+    """
+    cols = project_fields(fields)
+    dict_cols = [c for c in cols if c in DICTIONARY_FIELDS]
+
+    tables: Dict[str, List[str]] = {c: [] for c in dict_cols}
+    lookups: Dict[str, Dict[str, int]] = {c: {} for c in dict_cols}
+
+    encoded_rows = []
+    for row in rows:
+        encoded = []
+        for col in cols:
+            value = row.get(col)
+            if col in lookups and value is not None:
+                lookup = lookups[col]
+                if value not in lookup:
+                    lookup[value] = len(tables[col])
+                    tables[col].append(value)
+                value = lookup[value]
+            elif isinstance(value, float):
+                value = round(value, 2)
+            encoded.append(value)
+        encoded_rows.append(encoded)
+
+    def render(n: int) -> str:
+        shown = encoded_rows[:n]
+        # Only ship the dictionary entries the shown rows reference
+        used = {c: set() for c in dict_cols}
+        for encoded in shown:
+            for i, col in enumerate(cols):
+                if col in used and encoded[i] is not None:
+                    used[col].add(encoded[i])
+        remap = {c: {old: new for new, old in enumerate(sorted(used[c]))} for c in dict_cols}
+        out_rows = [
+            [remap[col][v] if col in remap and v is not None else v for col, v in zip(cols, encoded)]
+            for encoded in shown
+        ]
+        return _dumps({
+            'cols': cols,
+            'dicts': {c: [tables[c][i] for i in sorted(used[c])] for c in dict_cols},
+            'rows': out_rows,
+            'total': len(rows),
+            'shown': n,
+        })
+
+    # Binary search for the largest prefix that fits the budget
+    lo, hi = 0, len(encoded_rows)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(render(mid)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+
+    return render(lo)
+
+
+def decode_results(text: str) -> List[Dict[str, Any]]:
+    """Expand an encode_results payload back into row dicts."""
+    payload = json.loads(text)
+    cols = payload['cols']
+    dicts = payload.get('dicts', {})
+    rows = []
+    for encoded in payload['rows']:
+        row = {}
+        for col, value in zip(cols, encoded):
+            if col in dicts and value is not None:
+                value = dicts[col][value]
+            row[col] = value
+        rows.append(row)
+    return rows
+
+
+def summarize_result(text: str) -> str:
+    """One-line stand-in for an older tool result that has been pruned."""
+    try:
+        payload = json.loads(text)
+        ids = [r[payload['cols'].index('id')] for r in payload['rows']]
+    except (ValueError, KeyError, TypeError):
+        return f"{PRUNED_PREFIX}]"
+    return (
+        f"{PRUNED_PREFIX}: {payload.get('shown', len(ids))} of "
+        f"{payload.get('total', len(ids))} wines, ids {','.join(str(i) for i in ids)}]"
+    )
+
+
+def prune_history(messages: List[Dict[str, Any]], keep_last: int = 1) -> int:
+    """
+    Replace tool results older than the last ``keep_last`` tool turns with summaries.
+
+    Mutates ``messages`` in place and returns the number of results pruned.
+    """
+    tool_turns = [
+        m for m in messages
+        if m.get('role') == 'user' and isinstance(m.get('content'), list)
+    ]
+    pruned = 0
+    for message in tool_turns[:max(0, len(tool_turns) - keep_last)]:
+        for block in message['content']:
+            if block.get('type') != 'tool_result' or block.get('content', '').startswith(PRUNED_PREFIX):
+                continue
+            block['content'] = summarize_result(block['content'])
+            pruned += 1
+    return pruned
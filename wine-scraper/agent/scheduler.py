@@ -0,0 +1,322 @@
+"""Rate-limit-aware scheduling of LLM requests."""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from agent.encoding import estimate_tokens
+
+
+# Priorities: lower runs first
+INTERACTIVE = 0
+BATCH = 1
+
+# Share of each bucket that batch work may not dip into, so interactive
+# requests still find capacity while a bulk curation run is going
+BATCH_RESERVE = 0.2
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class TokenBucket:
+    """In-process token bucket holding up to `capacity`, refilled at `rate` per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float, reserve: float = 0.0) -> float:
+        """Take amount if at least `reserve` would remain; else return seconds to wait."""
+        amount = min(amount, self.capacity * (1 - reserve))
+        with self._lock:
+            self._refill(time.monotonic())
+            floor = reserve * self.capacity
+            if self._level - amount >= floor:
+                self._level -= amount
+                return 0.0
+            return (amount + floor - self._level) / self.rate
+
+    def adjust(self, delta: float):
+        """Return (positive) or charge (negative) tokens after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + delta)
+
+    def penalize(self, seconds: float):
+        """Empty the bucket so nothing is admitted for roughly `seconds`."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self._level, -seconds * self.rate)
+
+
+class SqliteTokenBucket(TokenBucket):
+    """
+    Token bucket stored in a SQLite file so several processes share one budget.
+
+    Each operation is a short IMMEDIATE transaction; wall-clock time is used
+    because monotonic clocks aren't comparable across processes.
+    """
+
+    def __init__(self, path: str, name: str, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.name = name
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                level REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+            (name, capacity, time.time())
+        )
+
+    def _transact(self, fn) -> Any:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                level, updated = self._conn.execute(
+                    "SELECT level, updated FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                level = min(self.capacity, level + max(0.0, now - updated) * self.rate)
+                level, result = fn(level)
+                self._conn.execute(
+                    "UPDATE buckets SET level = ?, updated = ? WHERE name = ?",
+                    (level, now, self.name)
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, amount: float, reserve: float = 0.0) -> float:
+        amount = min(amount, self.capacity * (1 - reserve))
+        floor = reserve * self.capacity
+
+        def take(level):
+            if level - amount >= floor:
+                return level - amount, 0.0
+            return level, (amount + floor - level) / self.rate
+
+        return self._transact(take)
+
+    def adjust(self, delta: float):
+        self._transact(lambda level: (min(self.capacity, level + delta), None))
+
+    def penalize(self, seconds: float):
+        self._transact(lambda level: (min(level, -seconds * self.rate), None))
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    return getattr(error, 'status_code', None)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the error carries one."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, overload, 5xx, timeouts and dropped connections are worth retrying."""
+    if _status_code(error) in RETRYABLE_STATUS:
+        return True
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    try:
+        import anthropic
+        return isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError))
+    except ImportError:
+        return False
+
+
+class ScheduledClient:
+    """Drop-in for an Anthropic client whose messages.create goes through a scheduler."""
+
+    def __init__(self, scheduler: 'LLMScheduler', priority: int):
+        self.messages = self
+        self._scheduler = scheduler
+        self._priority = priority
+
+    async def create(self, **kwargs):
+        return await self._scheduler.create(priority=self._priority, **kwargs)
+
+
+class LLMScheduler:
+    """
+    Admit messages.create calls under request/token budgets and a max-in-flight cap.
+
+    Waiting calls are served in priority order (INTERACTIVE before BATCH,
+    FIFO within a priority). Retryable failures back off with full jitter;
+    a 429 also drains the request bucket for the Retry-After period so that
+    every caller sharing the budget pauses instead of retrying at once.
+
+    With bucket_path set, the request and token buckets live in a SQLite
+    file shared by every process using the same path.
+
+    One scheduler may serve several event loops (threads that each call
+    asyncio.run): the wait queue and the in-flight count are shared, and a
+    waiter is woken on its own loop.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: float = 50,
+        tokens_per_minute: float = 40000,
+        max_in_flight: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        bucket_path: Optional[str] = None
+    ):
+        self._client = client
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        if bucket_path:
+            self.requests = SqliteTokenBucket(bucket_path, 'requests', requests_per_minute, requests_per_minute / 60)
+            self.tokens = SqliteTokenBucket(bucket_path, 'tokens', tokens_per_minute, tokens_per_minute / 60)
+        else:
+            self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+            self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0}
+
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._in_flight = 0
+
+    @classmethod
+    def from_env(cls, client, **overrides) -> 'LLMScheduler':
+        """Build a scheduler from WINE_AGENT_* environment variables."""
+        settings = {
+            'requests_per_minute': float(os.environ.get('WINE_AGENT_RPM', 50)),
+            'tokens_per_minute': float(os.environ.get('WINE_AGENT_TPM', 40000)),
+            'max_in_flight': int(os.environ.get('WINE_AGENT_MAX_IN_FLIGHT', 8)),
+            'bucket_path': os.environ.get('WINE_AGENT_RATE_LIMIT_DB') or None,
+        }
+        settings.update(overrides)
+        return cls(client, **settings)
+
+    def client(self, priority: int = BATCH) -> ScheduledClient:
+        """Client facade whose calls are scheduled at the given priority."""
+        return ScheduledClient(self, priority)
+
+    def _estimate_tokens(self, kwargs: Dict[str, Any]) -> int:
+        return estimate_tokens(json.dumps({
+            'system': kwargs.get('system'),
+            'tools': kwargs.get('tools'),
+            'messages': kwargs.get('messages'),
+        }, default=str))
+
+    def _wake_all(self):
+        """Have every waiter re-check its turn (call with self._lock held)."""
+        for _, _, loop, event in self._waiting:
+            loop.call_soon_threadsafe(event.set)
+
+    async def _admit(self, priority: int, tokens: int):
+        event = asyncio.Event()
+        entry = (priority, next(self._seq), asyncio.get_running_loop(), event)
+        reserve = BATCH_RESERVE if priority >= BATCH else 0.0
+
+        with self._lock:
+            heapq.heappush(self._waiting, entry)
+        try:
+            while True:
+                # Cleared before checking, so a wake-up in between isn't lost
+                event.clear()
+                with self._lock:
+                    turn = self._waiting[0] is entry and self._in_flight < self.max_in_flight
+                if not turn:
+                    await event.wait()
+                    continue
+
+                wait = self.requests.try_acquire(1, reserve)
+                if wait == 0:
+                    wait = self.tokens.try_acquire(tokens, reserve)
+                    if wait:
+                        self.requests.adjust(1)
+                if wait == 0:
+                    with self._lock:
+                        self._in_flight += 1
+                    return
+
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._wake_all()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._wake_all()
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def create(self, priority: int = BATCH, **kwargs):
+        """Schedule one client.messages.create call, retrying retryable failures."""
+        estimated = self._estimate_tokens(kwargs)
+
+        for attempt in range(self.max_retries + 1):
+            await self._admit(priority, estimated)
+            try:
+                self.stats['calls'] += 1
+                response = await self._client.messages.create(**kwargs)
+            except Exception as e:
+                # The request never produced tokens; give the estimate back
+                self.tokens.adjust(estimated)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self.stats['failures'] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                if _status_code(e) == 429:
+                    self.stats['rate_limited'] += 1
+                    self.requests.penalize(delay)
+                self.stats['retries'] += 1
+            else:
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    actual = (getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'output_tokens', 0) or 0)
+                    self.tokens.adjust(estimated - actual)
+                return response
+            finally:
+                self._release()
+
+            await asyncio.sleep(delay)
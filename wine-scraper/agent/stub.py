@@ -0,0 +1,104 @@
+"""Local stand-in for the Anthropic async client that replays canned responses."""
+import asyncio
+import copy
+import itertools
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class StubBlock:
+    """Content block shaped like anthropic's TextBlock / ToolUseBlock."""
+    type: str
+    text: Optional[str] = None
+    id: Optional[str] = None
+    name: Optional[str] = None
+    input: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class StubUsage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class StubResponse:
+    content: List[StubBlock]
+    stop_reason: str
+    usage: StubUsage
+
+
+class _StubMessages:
+    def __init__(self, client: 'StubClient'):
+        self._client = client
+
+    async def create(self, **kwargs) -> StubResponse:
+        return await self._client._create(**kwargs)
+
+
+class StubClient:
+    """
+    Replay a scripted conversation without touching the network.
+
+    Each turn in ``script`` is either ``{"tool_calls": [{"name": ..., "input": {...}}]}``
+    or ``{"text": "..."}``. The turn to replay is picked from the number of
+    assistant messages already in the request, so one stub can serve many
+    concurrent conversations. ``latency`` simulates model time per call.
+    """
+
+    def __init__(self, script: List[Dict[str, Any]], latency: float = 0.0):
+        self.script = script
+        self.latency = latency
+        self.calls: List[Dict[str, Any]] = []
+        self.messages = _StubMessages(self)
+        self._ids = itertools.count(1)
+
+    async def _create(self, **kwargs) -> StubResponse:
+        # Snapshot the request: callers keep mutating their messages list
+        self.calls.append(copy.deepcopy(kwargs))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        messages = kwargs.get('messages', [])
+        turn = sum(1 for m in messages if m.get('role') == 'assistant')
+        spec = self.script[min(turn, len(self.script) - 1)]
+
+        if 'tool_calls' in spec:
+            blocks = [
+                StubBlock(
+                    type='tool_use',
+                    id=f"toolu_stub_{next(self._ids)}",
+                    name=call['name'],
+                    input=call.get('input', {})
+                )
+                for call in spec['tool_calls']
+            ]
+            stop_reason = 'tool_use'
+        else:
+            blocks = [StubBlock(type='text', text=spec['text'])]
+            stop_reason = 'end_turn'
+
+        prompt_chars = len(json.dumps(messages, default=str)) + len(kwargs.get('system', ''))
+        output_chars = sum(len(json.dumps(b.input)) + len(b.text or '') for b in blocks)
+        usage = StubUsage(input_tokens=prompt_chars // 4, output_tokens=output_chars // 4)
+
+        return StubResponse(content=blocks, stop_reason=stop_reason, usage=usage)
+
+
+def curation_script(wine_ids: List[int], searches: int = 2) -> List[Dict[str, Any]]:
+    """Canned conversation: a few parallel searches, then a final selection."""
+    turns = [
+        {'tool_calls': [
+            {'name': 'search_wines', 'input': {'country': 'France', 'limit': 20}},
+            {'name': 'search_wines', 'input': {'country': 'Italy', 'limit': 20}},
+            {'name': 'search_wines', 'input': {'min_rating': 4.0, 'limit': 20}},
+        ]}
+        for _ in range(searches)
+    ]
+    turns.append({'text': json.dumps({
+        'wines': [{'id': wine_id} for wine_id in wine_ids],
+        'reasoning': 'stub selection'
+    })})
+    return turns
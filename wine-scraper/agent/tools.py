@@ -6,7 +6,8 @@ import os
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from data.db import WineDatabase
+from data.db import SAMPLE_STRATA, SEARCH_ORDERS, WineDatabase
+from data.derived import PRICE_BANDS, availability_reasons, availability_tier
 
 
 # Global database instance
@@ -24,6 +25,13 @@ def search_wines_tool(args: Dict[str, Any]) -> Dict[str, Any]:
         min_rating: Optional minimum rating (0-5)
         max_price: Optional max price USD
         wine_type: Optional red/white/rosé/sparkling
+        price_band: Optional price band (under_15, 15-30, 30-60, 60-100, 100+)
+        min_value: Optional minimum rating per dollar
+        sort: rating (default), value or availability
+        query: Optional free text; without sort, results are ranked by
+            relevance blended with rating and popularity, with snippets
+        notes: Optional tasting-note words (e.g. smoky, food-friendly);
+            alone (no query or sort) results are ranked by note relevance
         limit: Max results (default 20)
 
     Returns:
@@ -32,6 +40,37 @@ def search_wines_tool(args: Dict[str, Any]) -> Dict[str, Any]:
     try:
         db.connect()
 
+        if args.get('query') and not args.get('sort'):
+            wines = db.search_ranked(
+                args['query'],
+                limit=args.get('limit', 20),
+                price_band=args.get('price_band'),
+                min_value=args.get('min_value'),
+                **_filter_args(args)
+            )
+            db.close()
+            return {
+                'success': True,
+                'count': len(wines),
+                'wines': wines
+            }
+
+        if args.get('notes') and not args.get('sort'):
+            filters = _filter_args(args)
+            wines = db.search_notes(
+                filters.pop('notes'),
+                limit=args.get('limit', 20),
+                price_band=args.get('price_band'),
+                min_value=args.get('min_value'),
+                **filters
+            )
+            db.close()
+            return {
+                'success': True,
+                'count': len(wines),
+                'wines': wines
+            }
+
         wines = db.search_wines(
             country=args.get('country'),
             region=args.get('region'),
@@ -39,6 +78,11 @@ def search_wines_tool(args: Dict[str, Any]) -> Dict[str, Any]:
             min_rating=args.get('min_rating'),
             max_price=args.get('max_price'),
             wine_type=args.get('wine_type'),
+            price_band=args.get('price_band'),
+            min_value=args.get('min_value'),
+            notes=args.get('notes'),
+            query=args.get('query'),
+            order_by=args.get('sort', 'rating'),
             limit=args.get('limit', 20)
         )
 
@@ -59,37 +103,48 @@ def search_wines_tool(args: Dict[str, Any]) -> Dict[str, Any]:
 
 def get_wine_details_tool(args: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Get full details for a specific wine.
+    Get full details for one or many wines in a single query.
 
     Args:
-        wine_id: Wine ID in database
+        wine_ids: Wine IDs in database
+        wine_id: Single wine ID (older form; the result is then {'wine': ...})
 
     Returns:
-        Wine details with all fields
+        Wine details with all fields, in the order requested; IDs not in
+        the database are listed as missing
     """
     try:
-        wine_id = args.get('wine_id')
-        if not wine_id:
+        wine_ids = args.get('wine_ids') or ([args['wine_id']] if args.get('wine_id') else [])
+        if not wine_ids:
             return {
                 'success': False,
-                'error': 'wine_id is required'
+                'error': 'wine_ids is required'
             }
 
+        wine_ids = [int(wine_id) for wine_id in wine_ids]
         db.connect()
-        wine = db.get_wine_by_id(int(wine_id))
+        wines = db.get_wines_by_ids(wine_ids)
         db.close()
 
-        if wine:
+        if 'wine_ids' not in args:
+            if not wines:
+                return {
+                    'success': False,
+                    'error': f'Wine with ID {wine_ids[0]} not found'
+                }
             return {
                 'success': True,
-                'wine': wine
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'Wine with ID {wine_id} not found'
+                'wine': wines[0]
             }
 
+        found = {wine['id'] for wine in wines}
+        return {
+            'success': True,
+            'count': len(wines),
+            'wines': wines,
+            'missing': [wine_id for wine_id in wine_ids if wine_id not in found]
+        }
+
     except Exception as e:
         return {
             'success': False,
@@ -99,82 +154,58 @@ def get_wine_details_tool(args: Dict[str, Any]) -> Dict[str, Any]:
 
 def verify_availability_tool(args: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Check if wine is likely available in US.
+    Check if wines are likely available in US.
 
-    Heuristic based on price, region, popularity.
+    Reads the availability score precomputed at ingest (a heuristic on price,
+    popularity and rating, see data/derived.py) for many wines in one query.
 
     Args:
-        wine_id: Wine ID in database
+        wine_ids: Wine IDs in database
+        wine_id: Single wine ID (older form; the result is then flat)
 
     Returns:
-        Availability estimate: "confirmed" | "likely" | "unlikely" | "unknown"
+        Per wine: availability "likely" | "possible" | "unknown" | "unlikely",
+        confidence and reasons; IDs not in the database are listed as missing
     """
     try:
-        wine_id = args.get('wine_id')
-        if not wine_id:
+        wine_ids = args.get('wine_ids') or ([args['wine_id']] if args.get('wine_id') else [])
+        if not wine_ids:
             return {
                 'success': False,
-                'error': 'wine_id is required'
+                'error': 'wine_ids is required'
             }
 
+        wine_ids = [int(wine_id) for wine_id in wine_ids]
         db.connect()
-        wine = db.get_wine_by_id(int(wine_id))
+        wines = db.get_wines_by_ids(wine_ids)
         db.close()
 
-        if not wine:
-            return {
-                'success': False,
-                'error': f'Wine with ID {wine_id} not found'
+        results = [
+            {
+                'wine_id': wine['id'],
+                'wine_name': wine.get('name'),
+                'availability': availability_tier(wine.get('availability_score') or 0.0),
+                'confidence': wine.get('availability_score') or 0.0,
+                'reasons': availability_reasons(wine)
             }
-
-        # Heuristic availability scoring
-        availability = "unknown"
-        confidence = 0.0
-        reasons = []
-
-        # Check price range (reasonable prices more likely available)
-        price = wine.get('price_usd')
-        if price:
-            if 10 <= price <= 100:
-                confidence += 0.3
-                reasons.append("Price in common retail range")
-            elif price > 200:
-                confidence -= 0.2
-                reasons.append("High price may limit availability")
-
-        # Check popularity (high reviews = more available)
-        num_reviews = wine.get('num_reviews')
-        if num_reviews:
-            if num_reviews > 1000:
-                confidence += 0.3
-                reasons.append("High number of reviews")
-            elif num_reviews > 100:
-                confidence += 0.1
-                reasons.append("Moderate number of reviews")
-
-        # Check rating (higher ratings from popular wines more available)
-        rating = wine.get('rating')
-        if rating and rating > 4.5 and num_reviews and num_reviews > 500:
-            confidence += 0.2
-            reasons.append("Highly rated popular wine")
-
-        # Determine availability tier
-        if confidence >= 0.5:
-            availability = "likely"
-        elif confidence >= 0.3:
-            availability = "possible"
-        elif confidence < 0:
-            availability = "unlikely"
-        else:
-            availability = "unknown"
+            for wine in wines
+        ]
+        found = {wine['id'] for wine in wines}
+        missing = [wine_id for wine_id in wine_ids if wine_id not in found]
+
+        if 'wine_ids' not in args:
+            if not results:
+                return {
+                    'success': False,
+                    'error': f'Wine with ID {wine_ids[0]} not found'
+                }
+            return {'success': True, **results[0]}
 
         return {
             'success': True,
-            'wine_id': wine_id,
-            'wine_name': wine.get('name'),
-            'availability': availability,
-            'confidence': round(confidence, 2),
-            'reasons': reasons
+            'count': len(results),
+            'wines': results,
+            'missing': missing
         }
 
     except Exception as e:
@@ -208,6 +239,184 @@ def get_database_stats_tool(args: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def _filter_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the search filters shared by search and aggregate tools."""
+    return {
+        'country': args.get('country'),
+        'region': args.get('region'),
+        'grapes': args.get('grapes'),
+        'min_rating': args.get('min_rating'),
+        'max_price': args.get('max_price'),
+        'wine_type': args.get('wine_type'),
+        'notes': args.get('notes'),
+    }
+
+
+def facet_counts_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Count wines per facet value for the given filters.
+
+    Args:
+        facets: List of country, region, grapes, wine_type, price_band
+        limit: Max values per facet (default 20)
+        (plus the search_wines filters)
+
+    Returns:
+        Facet name -> list of {value, count}, most common first
+    """
+    try:
+        facets = args.get('facets') or ['country']
+
+        db.connect()
+        counts = db.facet_counts(facets, limit=args.get('limit', 20), **_filter_args(args))
+        db.close()
+
+        return {
+            'success': True,
+            'facets': counts
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def rating_histogram_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Count wines per rating bucket for the given filters.
+
+    Args:
+        bin_width: Bucket width on the 0-5 scale (default 0.5)
+        (plus the search_wines filters)
+
+    Returns:
+        List of {min_rating, max_rating, count}
+    """
+    try:
+        db.connect()
+        histogram = db.rating_histogram(bin_width=args.get('bin_width', 0.5), **_filter_args(args))
+        db.close()
+
+        return {
+            'success': True,
+            'histogram': histogram
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def distinct_regions_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    List distinct regions matching a substring.
+
+    Args:
+        match: Substring to look for in region names
+        country: Optional country filter
+        limit: Max regions (default 50)
+
+    Returns:
+        List of {region, country, count}
+    """
+    try:
+        match = args.get('match')
+        if not match:
+            return {
+                'success': False,
+                'error': 'match is required'
+            }
+
+        db.connect()
+        regions = db.distinct_regions(match, country=args.get('country'), limit=args.get('limit', 50))
+        db.close()
+
+        return {
+            'success': True,
+            'count': len(regions),
+            'regions': regions
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def sample_wines_tool(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Random sample of matching wines, reproducible by seed.
+
+    Args:
+        n: Number of wines (default 20)
+        stratify: Optional country, wine_type or price_band to spread the sample over
+        seed: Optional seed; the same seed gives the same sample
+        (plus the search_wines filters)
+
+    Returns:
+        List of wines with all fields (plus 'stratum' when stratified)
+    """
+    try:
+        db.connect()
+        wines = db.sample_wines(
+            args.get('n', 20),
+            seed=args.get('seed'),
+            stratify=args.get('stratify'),
+            **_filter_args(args)
+        )
+        db.close()
+
+        return {
+            'success': True,
+            'count': len(wines),
+            'wines': wines
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+# Filter parameters shared by the search and aggregate tools
+FILTER_PARAMETERS = {
+    'country': {
+        'type': 'string',
+        'description': 'Filter by country (e.g., France, Italy, United States)'
+    },
+    'region': {
+        'type': 'string',
+        'description': 'Filter by region (e.g., Burgundy, Napa Valley)'
+    },
+    'grapes': {
+        'type': 'string',
+        'description': 'Filter by grape varietals (e.g., Pinot Noir, Chardonnay)'
+    },
+    'min_rating': {
+        'type': 'number',
+        'description': 'Minimum rating (0-5 scale)'
+    },
+    'max_price': {
+        'type': 'number',
+        'description': 'Maximum price in USD'
+    },
+    'wine_type': {
+        'type': 'string',
+        'description': 'Wine type: red, white, rosé, sparkling'
+    },
+    'notes': {
+        'type': 'string',
+        'description': 'Words that must appear in the tasting notes (e.g., smoky, food-friendly, natural)'
+    },
+}
+
+
 # Tool definitions for Claude Agent SDK
 TOOLS = [
     {
@@ -216,29 +425,25 @@ TOOLS = [
         'parameters': {
             'type': 'object',
             'properties': {
-                'country': {
+                **FILTER_PARAMETERS,
+                'query': {
                     'type': 'string',
-                    'description': 'Filter by country (e.g., France, Italy, United States)'
+                    'description': 'Free text over name, winery, region and grapes; without sort, ranks by relevance, rating and popularity'
                 },
-                'region': {
+                'price_band': {
                     'type': 'string',
-                    'description': 'Filter by region (e.g., Burgundy, Napa Valley)'
+                    'enum': [label for label, _, _ in PRICE_BANDS],
+                    'description': 'Price band'
                 },
-                'grapes': {
-                    'type': 'string',
-                    'description': 'Filter by grape varietals (e.g., Pinot Noir, Chardonnay)'
-                },
-                'min_rating': {
-                    'type': 'number',
-                    'description': 'Minimum rating (0-5 scale)'
-                },
-                'max_price': {
+                'min_value': {
                     'type': 'number',
-                    'description': 'Maximum price in USD'
+                    'description': 'Minimum rating per dollar'
                 },
-                'wine_type': {
+                'sort': {
                     'type': 'string',
-                    'description': 'Wine type: red, white, rosé, sparkling'
+                    'enum': list(SEARCH_ORDERS),
+                    'description': 'Order by rating (default), value (rating per dollar) or availability',
+                    'default': 'rating'
                 },
                 'limit': {
                     'type': 'integer',
@@ -251,31 +456,33 @@ TOOLS = [
     },
     {
         'name': 'get_wine_details',
-        'description': 'Get full details for a specific wine by ID',
+        'description': 'Get full details for wines by ID, many at once',
         'parameters': {
             'type': 'object',
             'properties': {
-                'wine_id': {
-                    'type': 'integer',
-                    'description': 'Wine ID in database'
+                'wine_ids': {
+                    'type': 'array',
+                    'items': {'type': 'integer'},
+                    'description': 'Wine IDs in database'
                 }
             },
-            'required': ['wine_id']
+            'required': ['wine_ids']
         },
         'handler': get_wine_details_tool
     },
     {
         'name': 'verify_availability',
-        'description': 'Check if wine is likely available in US (heuristic)',
+        'description': 'Check if wines are likely available in US (heuristic), many at once',
         'parameters': {
             'type': 'object',
             'properties': {
-                'wine_id': {
-                    'type': 'integer',
-                    'description': 'Wine ID in database'
+                'wine_ids': {
+                    'type': 'array',
+                    'items': {'type': 'integer'},
+                    'description': 'Wine IDs in database'
                 }
             },
-            'required': ['wine_id']
+            'required': ['wine_ids']
         },
         'handler': verify_availability_tool
     },
@@ -287,5 +494,95 @@ TOOLS = [
             'properties': {}
         },
         'handler': get_database_stats_tool
+    },
+    {
+        'name': 'facet_counts',
+        'description': 'Count matching wines per country, region, grapes, wine_type or price_band',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                **FILTER_PARAMETERS,
+                'facets': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'string',
+                        'enum': ['country', 'region', 'grapes', 'wine_type', 'price_band']
+                    },
+                    'description': 'Facets to count'
+                },
+                'limit': {
+                    'type': 'integer',
+                    'description': 'Maximum values per facet (default 20)',
+                    'default': 20
+                }
+            },
+            'required': ['facets']
+        },
+        'handler': facet_counts_tool
+    },
+    {
+        'name': 'rating_histogram',
+        'description': 'Count matching wines per rating bucket',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                **FILTER_PARAMETERS,
+                'bin_width': {
+                    'type': 'number',
+                    'description': 'Bucket width on the 0-5 scale (default 0.5)',
+                    'default': 0.5
+                }
+            }
+        },
+        'handler': rating_histogram_tool
+    },
+    {
+        'name': 'distinct_regions',
+        'description': 'List distinct regions whose name contains a string, with wine counts',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'match': {
+                    'type': 'string',
+                    'description': 'Substring to match in region names (e.g., Valley)'
+                },
+                'country': {
+                    'type': 'string',
+                    'description': 'Filter by country'
+                },
+                'limit': {
+                    'type': 'integer',
+                    'description': 'Maximum number of regions (default 50)',
+                    'default': 50
+                }
+            },
+            'required': ['match']
+        },
+        'handler': distinct_regions_tool
+    },
+    {
+        'name': 'sample_wines',
+        'description': 'Random sample of matching wines, optionally spread across countries, wine types or price bands',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                **FILTER_PARAMETERS,
+                'n': {
+                    'type': 'integer',
+                    'description': 'Number of wines (default 20)',
+                    'default': 20
+                },
+                'stratify': {
+                    'type': 'string',
+                    'enum': SAMPLE_STRATA,
+                    'description': 'Spread the sample evenly over this column'
+                },
+                'seed': {
+                    'type': 'integer',
+                    'description': 'Seed for a reproducible sample'
+                }
+            }
+        },
+        'handler': sample_wines_tool
     }
 ]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tail latency of cheap requests (/api/wine/<id>, /api/suggest) while a spike
+of expensive ones (/theme/<name> in agentic mode, streamed and large
+/api/search) hits the production server, with and without admission control.
+Uses the stub LLM client, so no network access is needed.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import quote
+
+import aiohttp
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.stub import StubClient, curation_script
+from data.db import WineDatabase
+from themes.presets import get_all_themes
+from web.app import ADMISSION_LIMITS
+
+PREFIXES = ['ch', 'bo', 'sa', 'ma', 'ri', 'to', 'pi', 'ca']
+
+
+def run_server(db_path, port, latency, threads, admission):
+    from web.server import serve
+    client = StubClient(curation_script([1, 2, 3]), latency=latency)
+    limits = None if admission else {name: None for name in ADMISSION_LIMITS}
+    serve(db_path, host='127.0.0.1', port=port, workers=1, threads=threads, llm_client=client,
+          response_cache_size=0, admission_limits=limits)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else float('nan')
+
+
+async def wait_ready(session, base):
+    for _ in range(200):
+        try:
+            async with session.get(f"{base}/api/stats") as response:
+                await response.read()
+                return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def run(base, args, max_id):
+    # /theme/<name> can't route names containing a slash
+    themes = [quote(t.name) for t in get_all_themes() if '/' not in t.name]
+    cheap = {'baseline': [], 'spike': []}
+    expensive = {'ok': 0, 'shed': 0, 'error': 0}
+    phase = 'baseline'
+    stop = False
+
+    async def request(session, path):
+        start = time.perf_counter()
+        async with session.get(base + path) as response:
+            await response.read()
+            return response.status, (time.perf_counter() - start) * 1000
+
+    async def cheap_client(session, rng):
+        while not stop:
+            if rng.random() < 0.7:
+                path = f"/api/wine/{rng.randint(1, max_id)}"
+            else:
+                path = f"/api/suggest?field=winery&prefix={rng.choice(PREFIXES)}"
+            try:
+                status, ms = await request(session, path)
+            except aiohttp.ClientError:
+                continue
+            cheap[phase].append(ms)
+            # Steady traffic: roughly args.rate requests/s per client
+            await asyncio.sleep(rng.expovariate(args.rate))
+
+    async def spike_client(session, rng):
+        while not stop:
+            if rng.random() < 0.5:
+                path = f"/theme/{rng.choice(themes)}?fresh=1"
+            elif rng.random() < 0.5:
+                path = "/api/search?format=ndjson&limit=100000"
+            else:
+                path = f"/api/search?min_rating={rng.uniform(3, 4):.2f}&limit=1000"
+            try:
+                status, _ = await request(session, path)
+            except aiohttp.ClientError:
+                expensive['error'] += 1
+                continue
+            if status == 503:
+                expensive['shed'] += 1
+                await asyncio.sleep(0.1)
+            elif status < 400:
+                expensive['ok'] += 1
+            else:
+                expensive['error'] += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, base)
+        rng = random.Random(1)
+        tasks = [asyncio.ensure_future(cheap_client(session, random.Random(rng.random())))
+                 for _ in range(args.cheap_clients)]
+        await asyncio.sleep(args.duration)
+        phase = 'spike'
+        tasks += [asyncio.ensure_future(spike_client(session, random.Random(rng.random())))
+                  for _ in range(args.spike_clients)]
+        await asyncio.sleep(args.duration)
+        stop = True
+        await asyncio.gather(*tasks)
+    return cheap, expensive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--duration', type=float, default=8.0, help='Seconds of baseline, then of spike')
+    parser.add_argument('--cheap-clients', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=20.0, help='Cheap requests/s per cheap client')
+    parser.add_argument('--spike-clients', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16, help='Server request threads')
+    parser.add_argument('--latency', type=float, default=1.0, help='Simulated seconds per LLM call')
+    parser.add_argument('--port', type=int, default=8775)
+    args = parser.parse_args()
+
+    db = WineDatabase(args.db)
+    db.connect()
+    max_id = db.conn.execute("SELECT MAX(id) FROM wines").fetchone()[0]
+    db.close()
+
+    print(f"{args.cheap_clients} cheap clients at ~{args.rate:.0f} req/s each; then {args.spike_clients} "
+          f"clients of theme pages and bulk searches for {args.duration:.0f}s; {args.threads} threads\n")
+    context = multiprocessing.get_context('fork')
+    for offset, admission in enumerate((False, True)):
+        port = args.port + offset
+        process = context.Process(target=run_server, args=(args.db, port, args.latency, args.threads, admission))
+        process.start()
+        try:
+            cheap, expensive = asyncio.run(run(f"http://127.0.0.1:{port}", args, max_id))
+        finally:
+            process.terminate()
+            process.join()
+
+        print(f"admission control {'on' if admission else 'off'}:")
+        for phase, values in cheap.items():
+            print(f"    cheap {phase:<9} n={len(values):>5}  p50 {statistics.median(values):7.1f} ms"
+                  f"  p99 {percentile(values, 0.99):7.1f} ms")
+        print(f"    expensive: {expensive['ok']} served, {expensive['shed']} shed with 503, "
+              f"{expensive['error']} errors")
+
+
+if __name__ == '__main__':
+    main()
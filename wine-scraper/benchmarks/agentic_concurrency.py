@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Benchmark serial vs concurrent agentic curation against the local stub client."""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.agentic import curate_themes_async
+from agent.stub import StubClient, curation_script
+from themes.presets import get_all_themes
+
+
+def run(themes, concurrency, latency, db_path):
+    client = StubClient(curation_script([1, 2, 3]), latency=latency)
+    start = time.perf_counter()
+    results = asyncio.run(curate_themes_async(themes, max_concurrency=concurrency, client=client, db_path=db_path))
+    elapsed = time.perf_counter() - start
+    return elapsed, len(client.calls), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--themes', type=int, default=20, help='Number of themes to curate')
+    parser.add_argument('--latency', type=float, default=0.2, help='Simulated seconds per LLM call')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent themes')
+    args = parser.parse_args()
+
+    themes = get_all_themes()[:args.themes]
+
+    serial, calls, _ = run(themes, 1, args.latency, args.db)
+    concurrent, _, results = run(themes, args.concurrency, args.latency, args.db)
+
+    print(f"Themes: {len(themes)} | LLM calls: {calls} | latency/call: {args.latency}s")
+    print(f"  serial:               {serial:.2f}s")
+    print(f"  concurrency={args.concurrency:<3}       {concurrent:.2f}s")
+    print(f"  speedup:              {serial / concurrent:.1f}x")
+    print(f"  themes with results:  {sum(1 for w in results.values() if w)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Measure LLM request bytes and tokens per curation session, legacy vs compact tool results."""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.agentic import MAX_ITERATIONS, select_wines_agentic_async
+from agent.encoding import estimate_tokens
+from agent.stub import StubClient, curation_script
+from themes.presets import get_all_themes
+
+
+def measure(theme, compact, searches, db_path):
+    client = StubClient(curation_script([1, 2, 3], searches=searches))
+    asyncio.run(select_wines_agentic_async(
+        theme.name, theme.description, theme.wine_count,
+        client=client, db_path=db_path, compact=compact
+    ))
+
+    sizes, tokens = [], []
+    for call in client.calls:
+        request = json.dumps({
+            'system': call['system'],
+            'tools': call['tools'],
+            'messages': call['messages'],
+        }, default=str)
+        sizes.append(len(request.encode('utf-8')))
+        tokens.append(estimate_tokens(request))
+
+    return {
+        'calls': len(sizes),
+        'bytes': sum(sizes),
+        'tokens': sum(tokens),
+        'last_request_bytes': sizes[-1] if sizes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--themes', type=int, default=5, help='Number of themes (sessions) to measure')
+    parser.add_argument('--searches', type=int, default=MAX_ITERATIONS - 1, help='Tool-use turns per session')
+    args = parser.parse_args()
+
+    totals = {False: {'bytes': 0, 'tokens': 0}, True: {'bytes': 0, 'tokens': 0}}
+    print(f"{'theme':<42} {'mode':<8} {'calls':>5} {'bytes':>10} {'~tokens':>9} {'last req':>10}")
+
+    for theme in get_all_themes()[:args.themes]:
+        for compact in (False, True):
+            m = measure(theme, compact, args.searches, args.db)
+            totals[compact]['bytes'] += m['bytes']
+            totals[compact]['tokens'] += m['tokens']
+            print(f"{theme.name[:42]:<42} {'compact' if compact else 'legacy':<8} "
+                  f"{m['calls']:>5} {m['bytes']:>10,} {m['tokens']:>9,} {m['last_request_bytes']:>10,}")
+
+    sessions = args.themes
+    before, after = totals[False], totals[True]
+    print()
+    print(f"Per session (avg of {sessions}):")
+    print(f"  legacy:  {before['bytes'] // sessions:>10,} bytes  {before['tokens'] // sessions:>9,} tokens")
+    print(f"  compact: {after['bytes'] // sessions:>10,} bytes  {after['tokens'] // sessions:>9,} tokens")
+    if before['bytes']:
+        print(f"  reduction: {100 * (1 - after['bytes'] / before['bytes']):.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Facet count latency per strategy, the planner's pick and the cache, against a per-value search_wines loop."""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data.db
+from data.db import WineDatabase
+
+FACETS = ['country', 'wine_type', 'price_band']
+
+# (label, full-text query, filters)
+CASES = [
+    ('whole catalog', None, {}),
+    ('broad country', None, {'country': 'France'}),
+    ('wine type', None, {'wine_type': 'red'}),
+    ('narrow region + price', None, {'region': 'Burgundy', 'max_price': 30}),
+    ('text query + country', '17', {'country': 'France'}),
+]
+
+# The planner's pick may be this much slower than the best strategy
+TOLERANCE = 1.5
+PLANNING_MS = 1.0
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def uncached(db, query, filters, limit):
+    data.db._facet_cache.clear()
+    return db.facet_counts(FACETS, limit=limit, query=query, **filters)
+
+
+def search_loop(db, query, filters, facet_values):
+    """The old way: one search_wines call per facet value, counting the rows returned."""
+    for facet, values in facet_values.items():
+        for value in values:
+            if facet in filters:
+                continue
+            db.search_wines(query=query, limit=1_000_000, **{**filters, facet: value})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--limit', type=int, default=20, help='Values per facet')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loop', action='store_true', help='Also time the per-value search_wines loop (slow)')
+    args = parser.parse_args()
+
+    db = WineDatabase(args.db)
+    db.connect()
+    print(f"{db.planner.total_rows():,} wines; facets {', '.join(FACETS)}; median of {args.repeat} runs\n")
+
+    regressions = 0
+    for label, query, filters in CASES:
+        conditions, params = db._build_filters(**filters)
+        if query:
+            conditions.append("wines.id IN (SELECT rowid FROM wines_fts WHERE wines_fts MATCH ?)")
+            params.append(query)
+
+        results = {
+            'group_by': timed(lambda: db._facet_counts_grouped(FACETS, args.limit, conditions, params), args.repeat),
+            'single_pass': timed(lambda: db._facet_counts_single_pass(FACETS, args.limit, conditions, params),
+                                 args.repeat),
+        }
+        planned = timed(lambda: uncached(db, query, filters, args.limit), args.repeat)
+        plan = db.last_facet_plan
+        cached = timed(lambda: db.facet_counts(FACETS, limit=args.limit, query=query, **filters), args.repeat)
+
+        best = min(results.values())
+        ok = planned <= best * TOLERANCE + PLANNING_MS
+        regressions += not ok
+        print(f"{label}: {query!r} {filters}")
+        for strategy, ms in results.items():
+            print(f"  {strategy:<12} {ms:>9.1f} ms")
+        print(f"  {'planner':<12} {planned:>9.1f} ms  ({plan['strategy']}) {'ok' if ok else 'REGRESSION'}")
+        print(f"  {'cached':<12} {cached:>9.3f} ms")
+        if args.loop:
+            values = {facet: [c['value'] for c in counts]
+                      for facet, counts in db.facet_counts(FACETS, limit=args.limit, query=query, **filters).items()
+                      if facet != 'price_band'}
+            print(f"  {'search loop':<12} {timed(lambda: search_loop(db, query, filters, values), 1):>9.1f} ms")
+        print()
+
+    db.close()
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Local fake of the Anthropic Messages API that injects latency and 429s."""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+from aiohttp import web
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.stub import curation_script
+
+
+class FakeLLMServer:
+    """
+    Serve POST /v1/messages, replaying the stub curation script.
+
+    Requests beyond `requests_per_minute` in a sliding 60s window get a 429
+    with Retry-After, as does a random `error_rate` fraction of the rest.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        error_rate: float = 0.0,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        script=None
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.script = script or curation_script([1, 2, 3], searches=1)
+        self.stats = collections.Counter()
+        self._window = collections.deque()
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/v1/messages', self.handle_messages)
+        return app
+
+    def _rate_limited(self) -> bool:
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 60:
+            self._window.popleft()
+        if len(self._window) >= self.requests_per_minute:
+            return True
+        self._window.append(now)
+        return False
+
+    def _error(self, status: int, kind: str, message: str, retry_after: float = None):
+        headers = {'retry-after': f"{retry_after:.0f}"} if retry_after is not None else {}
+        return web.json_response(
+            {'type': 'error', 'error': {'type': kind, 'message': message}},
+            status=status,
+            headers=headers
+        )
+
+    async def handle_messages(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        body = await request.json()
+
+        if self._rate_limited():
+            self.stats['429_rate'] += 1
+            oldest = self._window[0] if self._window else time.monotonic()
+            return self._error(429, 'rate_limit_error', 'rate limited', max(1, 60 - (time.monotonic() - oldest)))
+        if random.random() < self.error_rate:
+            self.stats['429_injected'] += 1
+            return self._error(429, 'rate_limit_error', 'injected rate limit', 1)
+
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        messages = body.get('messages', [])
+        turn = sum(1 for m in messages if m.get('role') == 'assistant')
+        spec = self.script[min(turn, len(self.script) - 1)]
+
+        if 'tool_calls' in spec:
+            content = [
+                {'type': 'tool_use', 'id': f"toolu_fake_{next(self._ids)}", 'name': c['name'], 'input': c.get('input', {})}
+                for c in spec['tool_calls']
+            ]
+            stop_reason = 'tool_use'
+        else:
+            content = [{'type': 'text', 'text': spec['text']}]
+            stop_reason = 'end_turn'
+
+        self.stats['ok'] += 1
+        return web.json_response({
+            'id': f"msg_fake_{next(self._ids)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': content,
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': {
+                'input_tokens': len(json.dumps(messages)) // 4,
+                'output_tokens': len(json.dumps(content)) // 4,
+            },
+        })
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Start serving in the current event loop and return the base URL."""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        actual_port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{actual_port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--rpm', type=float, default=60, help='Requests per minute before 429s')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Fraction of random 429s')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds per response')
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.rpm, args.error_rate, args.latency)
+    print(f"Fake Anthropic API on http://127.0.0.1:{args.port} (set ANTHROPIC_BASE_URL)")
+    web.run_app(server.app(), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
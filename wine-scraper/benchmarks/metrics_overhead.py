@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Cost of the metrics instrumentation: raw observations, instrumented vs bare DB calls, and a /metrics scrape."""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import WineDatabase
+from data.metrics import Histogram
+from web.app import create_app
+
+
+def per_call_us(fn, n):
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        timings.append((time.perf_counter() - start) / n * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--n', type=int, default=20000, help='Calls per timing')
+    args = parser.parse_args()
+
+    histogram = Histogram('bench_seconds', 'Benchmark histogram.', ['method'])
+    observe = per_call_us(lambda: histogram.observe(0.003, method='get_wine_by_id'), args.n)
+    print(f"Histogram.observe:                 {observe:6.2f} us")
+
+    db = WineDatabase(args.db)
+    db.connect()
+    bare = WineDatabase.get_wine_by_id.__wrapped__
+    raw = per_call_us(lambda: bare(db, 1), args.n)
+    wrapped = per_call_us(lambda: db.get_wine_by_id(1), args.n)
+    print(f"get_wine_by_id bare:               {raw:6.2f} us")
+    print(f"get_wine_by_id instrumented:       {wrapped:6.2f} us (+{wrapped - raw:.2f} us)")
+    db.close()
+
+    http = create_app(args.db).test_client()
+    for _ in range(200):
+        http.get('/api/wine/1').close()
+    request = per_call_us(lambda: http.get('/api/wine/1').close(), args.n // 20)
+    scrape = per_call_us(lambda: http.get('/metrics').close(), 200)
+    print(f"/api/wine/<id> (cached) request:   {request:6.0f} us")
+    print(f"/metrics scrape:                   {scrape:6.0f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Tasting-note index size and query latency against catalog size, on synthetic catalogs or a local database."""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import WineDatabase
+
+# Synthetic tasting-note vocabulary: a few very common words, many rarer ones
+COMMON_WORDS = ['fruit', 'palate', 'finish', 'aromas', 'acidity', 'tannins', 'flavors', 'notes']
+RARE_WORDS = ['smoky', 'earthy', 'natural', 'unfiltered', 'mineral', 'citrus', 'floral', 'oak', 'leather',
+              'tobacco', 'cassis', 'graphite', 'petrol', 'saline', 'honeyed', 'peppery', 'violet', 'brioche']
+
+QUERIES = ['smoky', 'food friendly', 'fruit', 'natural unfiltered']
+
+
+def synthetic_note(rng):
+    words = rng.choices(COMMON_WORDS, k=12) + rng.choices(RARE_WORDS, k=4) + ['food-friendly'] * (rng.random() < 0.1)
+    rng.shuffle(words)
+    return ' '.join(words).capitalize() + '.'
+
+
+def build_catalog(path, size, seed=1):
+    rng = random.Random(seed)
+    db = WineDatabase(path)
+    db.initialize_schema()
+    for start in range(0, size, 5000):
+        db.insert_wines([{
+            'wine_id': str(i),
+            'name': f'Winery {i % 900} Cuvée {i}',
+            'winery': f'Winery {i % 900}',
+            'country': rng.choice(['France', 'Italy', 'US', 'Spain']),
+            'rating': round(rng.uniform(3, 5), 1),
+            'num_reviews': rng.randint(1, 2000),
+            'price_usd': round(rng.uniform(8, 120), 2),
+            'designation': rng.choice([None, 'Reserve', 'Estate', 'Vieilles Vignes']),
+            'description': synthetic_note(rng),
+        } for i in range(start, min(start + 5000, size))], source='synthetic')
+    return db
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def report(db, repeat):
+    wines, = db.conn.execute("SELECT COUNT(*) FROM wines").fetchone()
+    noted, = db.conn.execute("SELECT COUNT(*) FROM wine_notes").fetchone()
+    sizes = db.fts_index_sizes()
+    notes_bytes = sizes.get('notes_fts', 0)
+    print(f"{wines:>10,} wines, {noted:,} with notes: notes_fts {notes_bytes / 1e6:.1f} MB "
+          f"({notes_bytes / max(noted, 1):.0f} B/note), wine_notes {sizes.get('wine_notes', 0) / 1e6:.1f} MB, "
+          f"wines_fts {sizes.get('wines_fts', 0) / 1e6:.1f} MB")
+    for text in QUERIES:
+        ranked = timed(lambda: db.search_notes(text, limit=20), repeat)
+        filtered = timed(lambda: db.search_wines(notes=text, country='France', limit=20), repeat)
+        print(f"    {text!r:<22} search_notes {ranked:>7.1f} ms   search_wines(notes=, country=) {filtered:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', help='Report on this database instead of building synthetic ones')
+    parser.add_argument('--sizes', default='10000,50000,200000', help='Synthetic catalog sizes')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.db:
+        db = WineDatabase(args.db)
+        db.connect()
+        report(db, args.repeat)
+        db.close()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(',')):
+            db = build_catalog(os.path.join(tmp, f'notes_{size}.db'), size)
+            report(db, args.repeat)
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
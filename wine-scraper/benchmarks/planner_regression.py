@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Time each search_wines strategy for FTS + filter queries and check the planner picks the fast one.
+
+Also checks that ranked search applies filters on columns wines_fts shares with wines."""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import SEARCH_ORDERS, WineDatabase, fts_query
+
+# Regression cases: (a) a rare term with a broad country filter, where
+# walking the few FTS matches wins, and (b) a common term with a narrow price
+# range, where walking the price index and probing FTS per row wins
+CASES = [
+    ('rare term, broad country', 'rare', lambda db: {'country': 'France'}),
+    ('common term, narrow price', 'common', lambda db: narrow_price(db)),
+]
+
+# A plan counts as a regression if it is this much slower than the best
+# strategy, plus a fixed allowance for planning itself
+TOLERANCE = 1.5
+PLANNING_MS = 1.0
+
+
+def pick_terms(db):
+    """A rare (~0.1% of wines) and the most common term from the FTS vocabulary."""
+    rows = db.planner.total_rows()
+    terms = "SELECT value FROM column_stats WHERE column_name = '_term'"
+    rare = db.conn.execute(
+        f"{terms} AND count BETWEEN ? AND ? ORDER BY count DESC LIMIT 1",
+        (max(1, rows // 2000), max(10, rows // 500))
+    ).fetchone()
+    common = db.conn.execute(f"{terms} ORDER BY count DESC LIMIT 1").fetchone()
+    return {'rare': rare[0] if rare else common[0], 'common': common[0]}
+
+
+def narrow_price(db):
+    """A price range around the median holding roughly 0.2% of wines."""
+    count = db.planner.total_rows()
+    low, = db.conn.execute(
+        "SELECT price_usd FROM wines WHERE price_usd IS NOT NULL ORDER BY price_usd LIMIT 1 OFFSET ?",
+        (count // 2,)
+    ).fetchone()
+    high, = db.conn.execute(
+        "SELECT price_usd FROM wines WHERE price_usd >= ? ORDER BY price_usd LIMIT 1 OFFSET ?",
+        (low, max(1, count // 500))
+    ).fetchone()
+    return {'min_price': low, 'max_price': high}
+
+
+def strategy_sql(db, strategy, term, filters, limit):
+    """SQL and parameters for one fixed strategy (legacy is the pre-planner IN-subquery shape)."""
+    conditions, params = db._build_filters(**filters)
+    order = SEARCH_ORDERS['rating']
+    if strategy == 'legacy':
+        conditions.insert(0, "wines.id IN (SELECT rowid FROM wines_fts WHERE wines_fts MATCH ?)")
+        params.insert(0, term)
+        source = "wines"
+    elif strategy == 'fts_first':
+        source = ("(SELECT rowid AS fts_id FROM wines_fts WHERE wines_fts MATCH ?) AS m "
+                  "CROSS JOIN wines ON wines.id = m.fts_id")
+        params.insert(0, term)
+    else:
+        source = f"wines INDEXED BY {strategy}"
+        conditions.append(
+            "EXISTS (SELECT 1 FROM wines_fts WHERE wines_fts MATCH ? AND wines_fts.rowid = wines.id)"
+        )
+        params.append(term)
+    sql = f"SELECT wines.* FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?"
+    return sql, params + [limit]
+
+
+def check_ranked_filters(db, term, limit):
+    """Run search_ranked filtered by region and grapes (also wines_fts columns); True if every row passes."""
+    row = db.conn.execute(
+        "SELECT region, grapes FROM wines "
+        "WHERE id IN (SELECT rowid FROM wines_fts WHERE wines_fts MATCH ?) "
+        "AND region IS NOT NULL AND grapes IS NOT NULL LIMIT 1",
+        (fts_query(term),)
+    ).fetchone()
+    if row is None:
+        print(f"ranked search with filters: no '{term}' wine has a region and grapes, skipped\n")
+        return True
+
+    region, grapes = row
+    rows = db.search_ranked(term, limit=limit, region=region, grapes=grapes)
+    ok = bool(rows) and all(
+        region.lower() in r['region'].lower() and grapes.lower() in r['grapes'].lower() for r in rows
+    )
+    print(f"ranked search with filters: '{term}' region={region!r} grapes={grapes!r}: "
+          f"{len(rows)} rows {'ok' if ok else 'FAILED'}\n")
+    return ok
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db = WineDatabase(args.db)
+    db.connect()
+    terms = pick_terms(db)
+    print(f"{db.planner.total_rows():,} wines; rare term '{terms['rare']}', "
+          f"common term '{terms['common']}'; median of {args.repeat} runs\n")
+
+    regressions = 0
+    for name, which, make_filters in CASES:
+        term, filters = terms[which], make_filters(db)
+        db.search_wines(query=term, limit=args.limit, **filters)
+        plan = db.last_plan
+        index = plan['index'] or ('idx_price' if 'min_price' in filters else None)
+
+        results = {}
+        for strategy in ['legacy', 'fts_first'] + ([index] if index else []):
+            sql, params = strategy_sql(db, strategy, term, filters, args.limit)
+            results[strategy] = timed(lambda: db.conn.execute(sql, params).fetchall(), args.repeat)
+        planned = timed(lambda: db.search_wines(query=term, limit=args.limit, **filters), args.repeat)
+
+        best = min(v for k, v in results.items() if k != 'legacy')
+        ok = planned <= best * TOLERANCE + PLANNING_MS
+        regressions += not ok
+        print(f"{name}: '{term}' {filters}")
+        for strategy, ms in results.items():
+            print(f"  {strategy:<16} {ms:>9.1f} ms")
+        print(f"  {'planner':<16} {planned:>9.1f} ms  "
+              f"({plan['strategy']}{' via ' + plan['index'] if plan['index'] else ''}) "
+              f"{'ok' if ok else 'REGRESSION'}\n")
+
+    regressions += not check_ranked_filters(db, terms['common'], args.limit)
+
+    db.close()
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Time WineDatabase.sample_wines against ORDER BY RANDOM() on a local database."""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import WineDatabase
+
+
+CASES = [
+    ('uniform', {}),
+    ('uniform, rating >= 4', {'min_rating': 4.0}),
+    ('by country', {'stratify': 'country'}),
+    ('by wine_type, under $40', {'stratify': 'wine_type', 'max_price': 40.0}),
+    ('by price_band, France', {'stratify': 'price_band', 'country': 'France'}),
+]
+
+
+def timed(fn, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--n', type=int, default=50, help='Sample size')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    db = WineDatabase(args.db)
+    db.connect()
+    print(f"{db.planner.total_rows():,} wines, sample of {args.n}, median of {args.repeat} runs")
+    print(f"{'case':<28} {'sample_wines':>13} {'ORDER BY RANDOM()':>18}")
+
+    for name, kwargs in CASES:
+        filters = {k: v for k, v in kwargs.items() if k != 'stratify'}
+        conditions, params = db._build_filters(**filters)
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+        probe_ms = timed(lambda i: db.sample_wines(args.n, seed=i, **kwargs), args.repeat)
+        random_ms = timed(lambda i: db.conn.execute(
+            f"SELECT * FROM wines WHERE {where_clause} ORDER BY RANDOM() LIMIT ?", params + [args.n]
+        ).fetchall(), args.repeat)
+        print(f"{name:<28} {probe_ms:>10.1f} ms {random_ms:>15.1f} ms")
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Bulk curation against the fake API server: naive SDK retries vs the LLM scheduler."""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import anthropic
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.agentic import curate_themes_async, select_wines_agentic_async
+from agent.scheduler import BATCH, INTERACTIVE, LLMScheduler
+from benchmarks.fake_llm_server import FakeLLMServer
+from themes.presets import get_all_themes
+
+
+async def run(mode, args):
+    server = FakeLLMServer(requests_per_minute=args.server_rpm, error_rate=args.error_rate, latency=args.latency)
+    base_url = await server.start()
+    themes = get_all_themes()[:args.themes]
+
+    if mode == 'naive':
+        # What we had: every caller retries on its own schedule
+        sdk = anthropic.AsyncAnthropic(base_url=base_url, api_key='fake', max_retries=args.max_retries)
+        batch_client = interactive_client = sdk
+        scheduler = None
+    else:
+        sdk = anthropic.AsyncAnthropic(base_url=base_url, api_key='fake', max_retries=0)
+        scheduler = LLMScheduler(
+            sdk,
+            requests_per_minute=args.server_rpm * 0.9,
+            tokens_per_minute=10_000_000,
+            max_in_flight=args.concurrency,
+            max_retries=args.max_retries,
+            base_delay=0.5
+        )
+        batch_client = scheduler.client(BATCH)
+        interactive_client = scheduler.client(INTERACTIVE)
+
+    async def interactive_probe():
+        # A web user asking for one theme every second while the batch runs
+        latencies = []
+        for theme in themes[:args.probes]:
+            await asyncio.sleep(1.0)
+            start = time.perf_counter()
+            try:
+                await select_wines_agentic_async(
+                    theme.name, theme.description, theme.wine_count,
+                    client=interactive_client, db_path=args.db
+                )
+            except Exception as e:
+                print(f"Interactive request failed: {e}")
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    results, latencies = await asyncio.gather(
+        curate_themes_async(themes, max_concurrency=args.concurrency, client=batch_client, db_path=args.db),
+        interactive_probe()
+    )
+    elapsed = time.perf_counter() - start
+    await server.stop()
+
+    return {
+        'mode': mode,
+        'elapsed': elapsed,
+        'completed': sum(1 for wines in results.values() if wines),
+        'http_requests': server.stats['requests'],
+        'http_429': server.stats['429_rate'] + server.stats['429_injected'],
+        'interactive_p50': statistics.median(latencies) if latencies else 0.0,
+        'interactive_max': max(latencies) if latencies else 0.0,
+        'scheduler': scheduler.stats if scheduler else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--themes', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--server-rpm', type=float, default=120, help='Fake server request limit per minute')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Fraction of random 429s')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake server seconds per response')
+    parser.add_argument('--max-retries', type=int, default=4)
+    parser.add_argument('--probes', type=int, default=5, help='Interactive requests during the batch')
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'time':>7} {'done':>6} {'http reqs':>10} {'429s':>6} {'interactive p50/max':>21}")
+    for mode in ('naive', 'scheduled'):
+        r = asyncio.run(run(mode, args))
+        print(f"{r['mode']:<10} {r['elapsed']:>6.1f}s {r['completed']:>3}/{args.themes:<2} "
+              f"{r['http_requests']:>10} {r['http_429']:>6} "
+              f"{r['interactive_p50']:>9.2f}s / {r['interactive_max']:.2f}s")
+        if r['scheduler']:
+            print(f"           scheduler: {r['scheduler']}")
+
+
+if __name__ == '__main__':
+    main()
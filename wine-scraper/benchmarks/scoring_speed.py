@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Time soft-criteria scoring + top-k over a synthetic catalog (default 1M rows)."""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.scoring import score_catalog, top_k
+from data.arrays import CatalogArrays
+from themes.presets import get_all_themes
+
+
+def synthetic_catalog(n: int, seed: int = 0) -> CatalogArrays:
+    rng = np.random.default_rng(seed)
+    arrays = CatalogArrays()
+    arrays.ids = np.arange(1, n + 1, dtype=np.int64)
+
+    price = rng.lognormal(3.3, 0.8, n).astype(np.float32)
+    price[rng.random(n) < 0.1] = np.inf
+    arrays.numeric = {
+        'price_usd': price,
+        'rating': np.clip(rng.normal(3.0, 0.8, n), 0, 5).astype(np.float32),
+        'num_reviews': rng.integers(1, 5000, n).astype(np.float32),
+    }
+
+    arrays.add_derived()
+
+    sizes = {'country': 40, 'region': 1500, 'wine_type': 5}
+    for column, size in sizes.items():
+        arrays.categories[column] = [f"{column} {i}" for i in range(size)]
+        arrays.codes[column] = rng.integers(-1, size, n).astype(np.int32)
+    arrays.categories['wine_type'] = ['red', 'white', 'rosé', 'sparkling', 'dessert']
+    arrays.categories['country'][:3] = ['France', 'Italy', 'Spain']
+    return arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--k', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    arrays = synthetic_catalog(args.rows)
+    specs = {t.name: t.scoring for t in get_all_themes() if t.scoring}
+    specs['(all terms)'] = {
+        'price': {'target': 30.0, 'tolerance': 10.0, 'weight': 1.0},
+        'rating': {'weight': 2.0},
+        'reviews': {'weight': 0.5},
+        'country': {'weights': {'France': 1.0, 'Italy': 0.5}, 'weight': 1.0},
+        'region': {'weights': {'region 1': 1.0}, 'weight': 0.5},
+        'wine_type': {'weights': {'red': 0.6, 'white': 0.4}, 'weight': 0.5},
+        'filters': {'max_price': 150.0, 'min_rating': 2.0},
+    }
+
+    print(f"{args.rows:,} rows, top {args.k}, median of {args.repeat} runs")
+    for name, spec in specs.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            top_k(score_catalog(arrays, spec), args.k)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"  {name:<32} {np.median(timings):7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Peak Python memory of /api/search as JSON vs streamed NDJSON, for growing result sizes."""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.app import create_app
+
+# Streamed peaks may grow by this factor from the smallest to the largest limit
+FLAT_TOLERANCE = 1.5
+
+
+def measure(http, url, headers=None):
+    """Consume the response chunk by chunk; returns (rows, bytes, peak MB, seconds)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = http.get(url, headers=headers or {}, buffered=False)
+    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS) if response.content_encoding == 'gzip' else None
+    size = newlines = 0
+    for chunk in response.response:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        size += len(chunk)
+        newlines += (gunzip.decompress(chunk) if gunzip else chunk).count(b'\n')
+    response.close()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return newlines, size, peak / 1e6, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--limits', default='1000,10000,100000', help='Result sizes to request')
+    parser.add_argument('--filters', default='', help="Extra query string, e.g. 'country=France'")
+    args = parser.parse_args()
+
+    limits = [int(n) for n in args.limits.split(',')]
+    app = create_app(args.db, response_cache_size=0, search_limits={'json': max(limits)})
+    http = app.test_client()
+    query = f"&{args.filters}" if args.filters else ''
+
+    streamed = []
+    print(f"{'limit':>8}  {'format':<12} {'rows':>8} {'MB sent':>8} {'peak MB':>8} {'seconds':>8}")
+    for limit in limits:
+        for label, url, headers in [
+            ('json', f'/api/search?limit={limit}{query}', None),
+            ('ndjson', f'/api/search?format=ndjson&limit={limit}{query}', None),
+            ('ndjson+gzip', f'/api/search?format=ndjson&limit={limit}{query}', {'Accept-Encoding': 'gzip'}),
+        ]:
+            rows, size, peak, elapsed = measure(http, url, headers)
+            if label == 'json':
+                rows = limit if size else 0  # one JSON document, not lines
+            print(f"{limit:>8,}  {label:<12} {rows:>8,} {size / 1e6:>8.1f} {peak:>8.1f} {elapsed:>8.2f}")
+            if label == 'ndjson':
+                streamed.append(peak)
+
+    growth = streamed[-1] / streamed[0]
+    print(f"\nstreamed peak grew {growth:.2f}x from {limits[0]:,} to {limits[-1]:,} rows (limit {FLAT_TOLERANCE}x)")
+    if growth > FLAT_TOLERANCE:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
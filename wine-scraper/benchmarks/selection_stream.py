@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Time to first progress event vs full selection over the SSE endpoint, against the local stub client."""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.stub import StubClient, curation_script
+from web.app import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--theme', default='Blind Tasting Challenge')
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated seconds per LLM call')
+    parser.add_argument('--searches', type=int, default=3, help='Tool-use turns before the final answer')
+    args = parser.parse_args()
+
+    client = StubClient(curation_script([1, 2, 3], searches=args.searches), latency=args.latency)
+    app = create_app(args.db, llm_client=client, response_cache_size=0)
+    http = app.test_client()
+
+    start = time.perf_counter()
+    job = http.post('/api/selections', json={'theme': args.theme}).get_json()['job']
+    response = http.get(f"/api/selections/{job['id']}/events", buffered=False)
+
+    first_tool = None
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        elapsed = time.perf_counter() - start
+        for line in text.splitlines():
+            if not line.startswith('data: '):
+                continue
+            event = json.loads(line[len('data: '):])
+            if event['event'] == 'tool_call' and first_tool is None:
+                first_tool = elapsed
+            detail = event.get('tool') or event.get('status') or event.get('iteration', '')
+            print(f"  {elapsed * 1000:>7.0f} ms  {event['event']:<11} {detail}")
+
+    total = time.perf_counter() - start
+    print(f"\nfirst tool result after {first_tool * 1000:.0f} ms; selection done after {total * 1000:.0f} ms "
+          f"({args.searches + 1} LLM calls at {args.latency}s)")
+    app.extensions['selection_jobs'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Requests/sec and tail latency of the Flask dev server (wine_agent.py web) vs
+the production server (wine_agent.py serve) under the same local load, with
+the stub LLM client for selections.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+import aiohttp
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.stub import StubClient, curation_script
+from data.db import WineDatabase
+from themes.presets import get_all_themes
+
+COUNTRIES = ['France', 'Italy', 'Spain', 'US', 'Argentina', 'Portugal', 'Germany', 'Chile']
+
+# Request mix: (kind, weight)
+MIX = [('wine', 50), ('search', 20), ('suggest', 20), ('stats', 5), ('selection', 5)]
+PREFIXES = ['ch', 'bo', 'sa', 'ma', 'ri', 'to', 'pi', 'ca']
+
+
+def run_dev_server(db_path, port, latency, cache_size):
+    from web.app import create_app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    client = StubClient(curation_script([1, 2, 3]), latency=latency)
+    app = create_app(db_path, llm_client=client, response_cache_size=cache_size)
+    app.run(host='127.0.0.1', port=port, threaded=True)
+
+
+def run_production_server(db_path, port, latency, cache_size, workers, threads):
+    from web.server import serve
+    client = StubClient(curation_script([1, 2, 3]), latency=latency)
+    serve(db_path, host='127.0.0.1', port=port, workers=workers, threads=threads,
+          llm_client=client, response_cache_size=cache_size)
+
+
+def next_request(rng, max_id, themes):
+    kind = rng.choices([k for k, _ in MIX], weights=[w for _, w in MIX])[0]
+    if kind == 'wine':
+        return kind, 'GET', f"/api/wine/{rng.randint(1, max_id)}", None
+    if kind == 'search':
+        rating = round(rng.uniform(3.0, 4.8), 1)
+        return kind, 'GET', f"/api/search?country={rng.choice(COUNTRIES)}&min_rating={rating}&limit=20", None
+    if kind == 'suggest':
+        return kind, 'GET', f"/api/suggest?field=winery&prefix={rng.choice(PREFIXES)}{rng.choice('aeiou')}", None
+    if kind == 'stats':
+        return kind, 'GET', "/api/stats", None
+    return kind, 'POST', "/api/selections", {'theme': rng.choice(themes)}
+
+
+async def wait_ready(session, base):
+    for _ in range(200):
+        try:
+            async with session.get(f"{base}/api/stats") as response:
+                await response.read()
+                return
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"server at {base} did not start")
+
+
+async def load(base, duration, concurrency, max_id, seed):
+    themes = [t.name for t in get_all_themes()]
+    latencies = {kind: [] for kind, _ in MIX}
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session, base)
+        deadline = time.perf_counter() + duration
+
+        async def client(i):
+            nonlocal errors
+            rng = random.Random(seed + i)
+            while time.perf_counter() < deadline:
+                kind, method, path, body = next_request(rng, max_id, themes)
+                start = time.perf_counter()
+                try:
+                    async with session.request(method, base + path, json=body) as response:
+                        await response.read()
+                        if response.status >= 500 and response.status != 503:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return latencies, errors
+
+
+def report(label, latencies, errors, duration):
+    total = sum(len(v) for v in latencies.values())
+    print(f"{label}: {total / duration:,.0f} req/s, {errors} errors")
+    for kind, values in latencies.items():
+        if values:
+            ordered = sorted(values)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            print(f"    {kind:<10} n={len(values):>6}  p50 {statistics.median(ordered):7.1f} ms  p99 {p99:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per server')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent clients')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='Production server processes (default: up to 4, one per CPU)')
+    parser.add_argument('--threads', type=int, default=16, help='Production server threads per process')
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated seconds per LLM call')
+    parser.add_argument('--cache-size', type=int, default=0, help='Response cache entries (0: measure serving)')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    db = WineDatabase(args.db)
+    db.connect()
+    max_id = db.conn.execute("SELECT MAX(id) FROM wines").fetchone()[0]
+    db.close()
+
+    context = multiprocessing.get_context('fork')
+    servers = [
+        ('dev server (Flask, threaded)', run_dev_server, (args.db, args.port, args.latency, args.cache_size)),
+        (f'serve (workers={args.workers}, threads={args.threads})', run_production_server,
+         (args.db, args.port + 1, args.latency, args.cache_size, args.workers, args.threads)),
+    ]
+    print(f"{args.concurrency} clients for {args.duration:.0f}s each; mix "
+          f"{', '.join(f'{k} {w}%' for k, w in MIX)}; LLM calls {args.latency}s\n")
+    for offset, (label, target, target_args) in enumerate(servers):
+        process = context.Process(target=target, args=target_args, daemon=False)
+        process.start()
+        try:
+            latencies, errors = asyncio.run(
+                load(f"http://127.0.0.1:{args.port + offset}", args.duration, args.concurrency, max_id, offset))
+            report(label, latencies, errors, args.duration)
+        finally:
+            process.terminate()
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
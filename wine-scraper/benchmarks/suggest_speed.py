@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Type-ahead latency: PrefixIndex.suggest vs a LIKE 'prefix%' GROUP BY over the wines table."""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import WineDatabase
+from data.suggest import PrefixIndex
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+    return statistics.median(ordered), ordered[int(len(ordered) * 0.99)]
+
+
+def typed_prefixes(values, rng, n):
+    """Prefixes of 1-6 characters of random existing values, as a user would type them."""
+    values = list(values)
+    return [value[:rng.randint(1, 6)].lower() for value in rng.choices(values, k=n)]
+
+
+def synthetic_counts(size, rng):
+    """size distinct winery-like names with Zipf-ish popularity."""
+    syllables = ['ch', 'at', 'eau', 'do', 'mai', 'ne', 'ca', 'sa', 'ro', 'vi', 'la', 'ter', 'bo', 'mon', 'tal']
+    counts = {}
+    while len(counts) < size:
+        name = ''.join(rng.choices(syllables, k=rng.randint(2, 4))).capitalize()
+        name += ' ' + ''.join(rng.choices(string.ascii_lowercase, k=5)).capitalize()
+        counts[name] = max(1, int(10000 / (len(counts) + 1)))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default='data/wines.db', help='Database path')
+    parser.add_argument('--field', default='winery')
+    parser.add_argument('--synthetic', type=int, help='Time the index alone on this many synthetic distinct values')
+    parser.add_argument('--n', type=int, default=2000, help='Prefixes to look up')
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    db = None
+    start = time.perf_counter()
+    if args.synthetic:
+        index = PrefixIndex.from_counts({args.field: synthetic_counts(args.synthetic, rng)})
+    else:
+        db = WineDatabase(args.db)
+        db.connect()
+        index = PrefixIndex.build(db)
+    print(f"built index of {len(index):,} values in {time.perf_counter() - start:.2f}s")
+
+    prefixes = typed_prefixes((value for value, _ in index.values[args.field]), rng, args.n)
+    timings = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(args.field, prefix, 10)
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p99 = percentiles(timings)
+    print(f"PrefixIndex.suggest({args.field!r}): p50 {p50:.3f} ms, p99 {p99:.3f} ms over {len(prefixes)} prefixes")
+
+    if db is not None:
+        timings = []
+        for prefix in prefixes[:50]:
+            start = time.perf_counter()
+            db.conn.execute(f"""
+                SELECT {args.field}, COUNT(*) AS n FROM wines WHERE {args.field} LIKE ?
+                GROUP BY {args.field} ORDER BY n DESC LIMIT 10
+            """, (prefix + '%',)).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        p50, p99 = percentiles(timings)
+        print(f"LIKE 'prefix%' GROUP BY:         p50 {p50:.1f} ms, p99 {p99:.1f} ms over {len(timings)} prefixes")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Columnar NumPy snapshot of the catalog for vectorized scoring."""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .db import WineDatabase
+
+
+class CatalogArrays:
+    """
+    One array per column, aligned by row.
+
+    Numeric columns are float32. Missing values are stored so that they
+    drop out of scoring without NaN checks: price as +inf (never close to a
+    target, never under a ceiling), rating and review count as 0. Text columns
+    used for affinities (country, region, wine_type) are dictionary-encoded:
+    an int32 code per row, -1 for missing, plus the list of distinct values.
+    """
+
+    NUMERIC = ['price_usd', 'rating', 'num_reviews']
+    CATEGORICAL = ['country', 'region', 'wine_type']
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.numeric: Dict[str, np.ndarray] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.categories: Dict[str, List[str]] = {}
+        self.catalog_version: Tuple[int, int] = (0, 0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, db: WineDatabase, batch_size: int = 100_000) -> 'CatalogArrays':
+        """Read the needed columns from SQLite in batches."""
+        if not db.conn:
+            db.connect()
+
+        columns = ['id'] + cls.NUMERIC + cls.CATEGORICAL
+        cursor = db.conn.cursor()
+        cursor.execute(f"SELECT {', '.join(columns)} FROM wines ORDER BY id")
+
+        chunks = {c: [] for c in columns}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for i, column in enumerate(columns):
+                chunks[column].append([row[i] for row in rows])
+
+        arrays = cls()
+        flat = {c: [v for chunk in chunks[c] for v in chunk] for c in columns}
+        arrays.ids = np.array(flat['id'], dtype=np.int64)
+
+        missing = {'price_usd': np.inf, 'rating': 0.0, 'num_reviews': 0.0}
+        for column in cls.NUMERIC:
+            arrays.numeric[column] = np.array(
+                [missing[column] if v is None else v for v in flat[column]], dtype=np.float32
+            )
+        arrays.add_derived()
+
+        for column in cls.CATEGORICAL:
+            lookup: Dict[str, int] = {}
+            codes = np.fromiter(
+                (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in flat[column]),
+                dtype=np.int32,
+                count=len(flat[column])
+            )
+            arrays.codes[column] = codes
+            arrays.categories[column] = list(lookup)
+
+        arrays.catalog_version = db.catalog_version()
+        return arrays
+
+    def add_derived(self):
+        """Precompute columns that scoring would otherwise recompute per query."""
+        log_reviews = np.log1p(self.numeric['num_reviews'])
+        top = float(log_reviews.max()) if len(log_reviews) else 0.0
+        self.numeric['reviews_unit'] = log_reviews / np.float32(top or 1.0)
+
+    def category_weights(self, column: str, weights: Dict[str, float]) -> np.ndarray:
+        """
+        Per-row weight from a {value: weight} map; unlisted values get 0.
+
+        Keys match case-insensitively as substrings, like the search filters,
+        so {"Rhône": 1} also covers "Northern Rhône"; when several keys match,
+        the longest (most specific) wins. Negative weights act as penalties.
+        """
+        keys = sorted(weights, key=len)
+        table = np.zeros(len(self.categories[column]) + 1, dtype=np.float32)
+        for i, value in enumerate(self.categories[column]):
+            lowered = value.lower()
+            for key in keys:
+                if key.lower() in lowered:
+                    table[i] = weights[key]
+        # Code -1 (missing) indexes the trailing zero
+        return table[self.codes[column]]
@@ -1,21 +1,116 @@
 """Database operations for wine data using SQLite with FTS5."""
+import math
+import os
+import random
+import re
 import sqlite3
+import threading
+from collections import Counter, OrderedDict
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, Iterator, List, Dict, Any, Callable, Tuple
 import json
 
 
+from .derived import DERIVED_COLUMNS, compute_derived
+from .metrics import timed_query
+from .planner import FACET_SINGLE_PASS, FTS_FIRST, QueryPlanner
+
+
+# Facet name -> SQL expression to group by
+FACET_EXPRESSIONS = {
+    'country': 'country',
+    'region': 'region',
+    'grapes': 'grapes',
+    'wine_type': 'wine_type',
+    'price_band': 'price_band',
+}
+
+# Facet count results kept per (database file version, query, filters, facets),
+# shared by every connection in the process
+FACET_CACHE_SIZE = 512
+_facet_cache: "OrderedDict[Tuple, Dict[str, List[Dict[str, Any]]]]" = OrderedDict()
+_facet_cache_lock = threading.Lock()
+
+# search_wines order_by name -> ORDER BY clause (each led by an indexed column)
+SEARCH_ORDERS = {
+    'rating': 'rating DESC, num_reviews DESC',
+    'value': 'value_score DESC, rating DESC',
+    'availability': 'availability_score DESC, rating DESC',
+}
+
+# bm25() weights for the wines_fts columns (name, winery, region, grapes)
+FTS_COLUMN_WEIGHTS = (4.0, 2.0, 3.0, 3.0)
+
+# bm25() weights for the notes_fts columns (designation, description)
+NOTES_COLUMN_WEIGHTS = (1.0, 2.0)
+
+# Correlated lookup adding a wine's tasting note to result rows
+NOTE_COLUMN = "(SELECT description FROM wine_notes WHERE wine_id = wines.id) AS tasting_note"
+
+# How search_ranked blends text relevance with quality signals
+RANKED_BLEND = {'relevance': 1.0, 'rating': 0.5, 'popularity': 0.2}
+
+# A saved shipment Bloom filter: (capacity, items added, bit array)
+FilterState = Tuple[int, int, bytes]
+
+
+def fts_query(text: str, any_term: bool = False) -> str:
+    """
+    FTS5 MATCH expression for free text: each word quoted, so punctuation
+    and FTS operators in user input can't cause syntax errors. All words
+    must match unless any_term.
+    """
+    terms = ['"{}"'.format(word.replace('"', '')) for word in re.findall(r'\w+', text)]
+    return (' OR ' if any_term else ' ').join(terms)
+
+
+# Columns sample_wines can stratify by (each has its own index)
+SAMPLE_STRATA = ['country', 'wine_type', 'price_band']
+
+# Filtered samples probe random ids when at least this share of the id range
+# is estimated to match (at most ~20 probes per row); sparser ones use random keys
+SAMPLE_PROBE_DENSITY = 0.05
+
+# Modulus of the random sort keys for filtered samples (ids must stay below it)
+SAMPLE_KEY_PRIME = 2 ** 31 - 1
+
+# Per-column value counts kept in column_stats for the query planner:
+# column -> grouping expression (price in 1-dollar buckets, rating to 0.1)
+STATS_EXPRESSIONS = {
+    'country': 'country',
+    'region': 'region',
+    'grapes': 'grapes',
+    'wine_type': 'wine_type',
+    'price_band': 'price_band',
+    'rating_band': 'rating_band',
+    'price_usd': 'MIN(CAST(price_usd AS INTEGER), 1000)',
+    'rating': 'ROUND(rating, 1)',
+}
+
+
 class WineDatabase:
     """SQLite database with FTS5 for 13M wines from Kaggle."""
 
+    # Open every connection read-only; server worker processes set this on the
+    # class so the catalog they share can't be written by any code path
+    read_only = False
+
     def __init__(self, db_path: str = "data/wines.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.conn: Optional[sqlite3.Connection] = None
+        self.planner = QueryPlanner(self)
+        self.last_plan: Optional[Dict[str, Any]] = None
+        self.last_facet_plan: Optional[Dict[str, Any]] = None
+        self.last_ranked_any_term = False
 
-    def connect(self):
-        """Establish database connection."""
-        self.conn = sqlite3.connect(str(self.db_path))
+    def connect(self, check_same_thread: bool = True):
+        """Establish database connection (read-only if read_only is set)."""
+        if self.read_only:
+            self.conn = sqlite3.connect(self.db_path.resolve().as_uri() + '?mode=ro', uri=True,
+                                        check_same_thread=check_same_thread)
+        else:
+            self.conn = sqlite3.connect(str(self.db_path), check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row
         return self.conn
 
@@ -48,6 +143,10 @@ class WineDatabase:
                 wine_type TEXT,
                 grapes TEXT,
                 source TEXT,
+                availability_score REAL,
+                value_score REAL,
+                price_band TEXT,
+                rating_band REAL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 UNIQUE(wine_id, source)
             )
@@ -59,6 +158,8 @@ class WineDatabase:
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_rating ON wines(rating)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_price ON wines(price_usd)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_wine_type ON wines(wine_type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_grapes ON wines(grapes)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_region_country ON wines(region, country)")
 
         # FTS5 virtual table for full-text search
         cursor.execute("""
@@ -83,31 +184,297 @@ class WineDatabase:
             END
         """)
 
+        # Only text changes need re-indexing; derived-column backfills don't
         cursor.execute("""
-            CREATE TRIGGER IF NOT EXISTS wines_au AFTER UPDATE ON wines BEGIN
+            CREATE TRIGGER IF NOT EXISTS wines_au AFTER UPDATE OF name, winery, region, grapes ON wines BEGIN
                 DELETE FROM wines_fts WHERE rowid = old.id;
                 INSERT INTO wines_fts(rowid, name, winery, region, grapes)
                 VALUES (new.id, new.name, new.winery, new.region, new.grapes);
             END
         """)
 
+        self.initialize_shipments_schema()
+        self.initialize_notes_schema()
+        self.initialize_derived_schema()
+        self.initialize_stats_schema()
+
+        self.conn.commit()
+
+    def initialize_derived_schema(self, batch_size: int = 50_000) -> int:
+        """
+        Add, index and backfill the derived columns (see data/derived.py).
+
+        Safe to call on existing databases: missing columns are added, the
+        old catch-all update trigger is narrowed to text columns so backfills
+        don't rewrite the FTS index, and rows without derived values are
+        computed in batches. Returns the number of rows backfilled.
+        """
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(wines)")}
+        column_types = {'availability_score': 'REAL', 'value_score': 'REAL', 'price_band': 'TEXT', 'rating_band': 'REAL'}
+        for column in DERIVED_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE wines ADD COLUMN {column} {column_types[column]}")
+
+        trigger = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'wines_au'").fetchone()
+        if trigger and 'UPDATE OF' not in trigger[0]:
+            cursor.execute("DROP TRIGGER wines_au")
+            cursor.execute("""
+                CREATE TRIGGER wines_au AFTER UPDATE OF name, winery, region, grapes ON wines BEGIN
+                    DELETE FROM wines_fts WHERE rowid = old.id;
+                    INSERT INTO wines_fts(rowid, name, winery, region, grapes)
+                    VALUES (new.id, new.name, new.winery, new.region, new.grapes);
+                END
+            """)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_availability ON wines(availability_score)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_value ON wines(value_score)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_band ON wines(price_band)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_rating_band ON wines(rating_band)")
+
+        backfilled = 0
+        last_id = 0
+        while True:
+            rows = cursor.execute("""
+                SELECT id, price_usd, rating, num_reviews FROM wines
+                WHERE availability_score IS NULL AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+
+            derived = compute_derived([dict(row) for row in rows])
+            cursor.executemany(
+                f"UPDATE wines SET {', '.join(f'{c} = ?' for c in DERIVED_COLUMNS)} WHERE id = ?",
+                zip(*(derived[c] for c in DERIVED_COLUMNS), (row['id'] for row in rows))
+            )
+            backfilled += len(rows)
+            last_id = rows[-1]['id']
+
+        self.conn.commit()
+        return backfilled
+
+    def initialize_shipments_schema(self):
+        """Create the per-club shipment history table (safe to call on existing databases)."""
+        if not self.conn:
+            self.connect()
+
+        # Keyed (club, wine_id) so "was this shipped to this club" is one
+        # primary-key probe however long the history gets
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS shipped_wines (
+                club TEXT NOT NULL,
+                wine_id INTEGER NOT NULL,
+                theme TEXT,
+                shipped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (club, wine_id)
+            ) WITHOUT ROWID
+        """)
+
+        # Each club's Bloom filter, saved with its shipments so a new process
+        # reads one row instead of replaying the club's whole history
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS shipment_filters (
+                club TEXT PRIMARY KEY,
+                capacity INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                bits BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def initialize_notes_schema(self):
+        """
+        Create the tasting-note tables (safe to call on existing databases).
+
+        Notes live in wine_notes, one row per wine keyed by wines.id, so the
+        wines rows stay narrow; notes_fts indexes them as external content.
+        """
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS wine_notes (
+                wine_id INTEGER PRIMARY KEY,
+                designation TEXT,
+                description TEXT
+            )
+        """)
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                designation, description,
+                content=wine_notes,
+                content_rowid=wine_id
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS wine_notes_ai AFTER INSERT ON wine_notes BEGIN
+                INSERT INTO notes_fts(rowid, designation, description)
+                VALUES (new.wine_id, new.designation, new.description);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS wine_notes_ad AFTER DELETE ON wine_notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, designation, description)
+                VALUES ('delete', old.wine_id, old.designation, old.description);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS wine_notes_au AFTER UPDATE ON wine_notes BEGIN
+                INSERT INTO notes_fts(notes_fts, rowid, designation, description)
+                VALUES ('delete', old.wine_id, old.designation, old.description);
+                INSERT INTO notes_fts(rowid, designation, description)
+                VALUES (new.wine_id, new.designation, new.description);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS wines_notes_ad AFTER DELETE ON wines BEGIN
+                DELETE FROM wine_notes WHERE wine_id = old.id;
+            END
+        """)
+        self.conn.commit()
+
+    def fts_index_sizes(self) -> Dict[str, int]:
+        """
+        Bytes used by each full-text index and the notes table (empty if
+        this SQLite build lacks the dbstat table).
+        """
+        if not self.conn:
+            self.connect()
+
+        try:
+            rows = self.conn.execute("""
+                SELECT CASE WHEN name LIKE 'wines_fts%' THEN 'wines_fts'
+                            WHEN name LIKE 'notes_fts%' THEN 'notes_fts'
+                            ELSE name END AS tbl,
+                       SUM(pgsize)
+                FROM dbstat
+                WHERE name LIKE 'wines_fts%' OR name LIKE 'notes_fts%' OR name = 'wine_notes'
+                GROUP BY tbl
+            """).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+        return {name: size for name, size in rows}
+
+    def initialize_stats_schema(self):
+        """Create the planner statistics table (safe to call on existing databases)."""
+        if not self.conn:
+            self.connect()
+
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS column_stats (
+                column_name TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (column_name, value)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def _has_table(self, name: str) -> bool:
+        """Whether a table exists (read-only, unlike the initialize_* methods)."""
+        if not self.conn:
+            self.connect()
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def max_wine_id(self) -> int:
+        """Largest wine ID (0 for an empty catalog), from one primary-key seek."""
+        if not self.conn:
+            self.connect()
+        return self.conn.execute("SELECT MAX(id) FROM wines").fetchone()[0] or 0
+
+    @timed_query
+    def refresh_column_stats(self):
+        """
+        Recount the value distributions in column_stats (see STATS_EXPRESSIONS)
+        and FTS term document counts (as columns '_term' for wines_fts and
+        '_note_term' for notes_fts), then run ANALYZE.
+        Each column is one GROUP BY over its index and the terms one pass over
+        the FTS vocabulary; call after bulk loads so search plans reflect the
+        catalog.
+        """
+        self.initialize_stats_schema()
+
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM column_stats")
+        cursor.execute("INSERT INTO column_stats VALUES ('_table', 'rows', (SELECT COUNT(*) FROM wines))")
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(wines)")}
+        for name, expression in STATS_EXPRESSIONS.items():
+            if name not in existing:  # derived columns before migrate
+                continue
+            cursor.execute(f"""
+                INSERT INTO column_stats
+                SELECT ?, {expression} AS v, COUNT(*) FROM wines
+                WHERE v IS NOT NULL
+                GROUP BY v
+            """, (name,))
+        for stats_name, fts_table in (('_term', 'wines_fts'), ('_note_term', 'notes_fts')):
+            if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts_table,)).fetchone():
+                continue
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{fts_table}_vocab USING fts5vocab(main, {fts_table}, row)"
+            )
+            cursor.execute(f"INSERT INTO column_stats SELECT ?, term, doc FROM temp.{fts_table}_vocab", (stats_name,))
+        cursor.execute("ANALYZE")
         self.conn.commit()
+        self.planner.invalidate()
+
+    def column_stats(self) -> Dict[str, Dict[str, int]]:
+        """Stored value counts: stats name -> {value: count}; empty if never refreshed. Excludes terms."""
+        if not self._has_table('column_stats'):
+            return {}
+
+        stats: Dict[str, Dict[str, int]] = {}
+        cursor = self.conn.execute(
+            "SELECT column_name, value, count FROM column_stats WHERE column_name NOT IN ('_term', '_note_term')"
+        )
+        for name, value, count in cursor:
+            stats.setdefault(name, {})[str(value)] = count
+        return stats
 
+    def term_doc_count(self, term: str, prefix: bool = False, stats_name: str = '_term') -> int:
+        """
+        Wines containing an FTS term (or any term with this prefix) as of the
+        last stats refresh; stats_name '_note_term' counts tasting notes.
+        """
+        if not self._has_table('column_stats'):
+            return 0
+
+        if prefix:
+            row = self.conn.execute(
+                "SELECT SUM(count) FROM column_stats WHERE column_name = ? AND value >= ? AND value < ?",
+                (stats_name, term, term + '\uffff')
+            ).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT count FROM column_stats WHERE column_name = ? AND value = ?", (stats_name, term)
+            ).fetchone()
+        return (row[0] or 0) if row else 0
+
+    @timed_query
     def insert_wines(self, wines: List[Dict[str, Any]], source: str = "unknown") -> int:
-        """Bulk insert wines into database."""
+        """Bulk insert wines into database (description/designation go to wine_notes)."""
         if not self.conn:
             self.connect()
 
         cursor = self.conn.cursor()
         inserted = 0
+        derived = compute_derived(wines)
 
-        for wine in wines:
+        for i, wine in enumerate(wines):
             try:
                 cursor.execute("""
                     INSERT OR IGNORE INTO wines
                     (wine_id, name, winery, region, country, vintage,
-                     rating, num_reviews, price_usd, wine_type, grapes, source)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     rating, num_reviews, price_usd, wine_type, grapes, source,
+                     availability_score, value_score, price_band, rating_band)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     wine.get('wine_id'),
                     wine.get('name'),
@@ -120,9 +487,15 @@ class WineDatabase:
                     wine.get('price_usd'),
                     wine.get('wine_type'),
                     wine.get('grapes'),
-                    wine.get('source', source)
+                    wine.get('source', source),
+                    *(derived[c][i] for c in DERIVED_COLUMNS)
                 ))
                 inserted += cursor.rowcount
+                if cursor.rowcount and (wine.get('description') or wine.get('designation')):
+                    cursor.execute(
+                        "INSERT INTO wine_notes (wine_id, designation, description) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, wine.get('designation'), wine.get('description'))
+                    )
             except sqlite3.Error as e:
                 print(f"Error inserting wine {wine.get('name')}: {e}")
                 continue
@@ -130,6 +503,7 @@ class WineDatabase:
         self.conn.commit()
         return inserted
 
+    @timed_query
     def search_wines(
         self,
         query: Optional[str] = None,
@@ -140,60 +514,654 @@ class WineDatabase:
         max_price: Optional[float] = None,
         wine_type: Optional[str] = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        order_by: str = 'rating',
+        explain: bool = False,
+        **derived_filters
     ) -> List[Dict[str, Any]]:
-        """Search wines with filters."""
+        """
+        Search wines with filters.
+
+        order_by is one of SEARCH_ORDERS: 'rating' (default), 'value' (rating
+        per dollar) or 'availability'. derived_filters are the other filters
+        of _build_filters (min_price, price_band, rating_band, min_value,
+        min_availability) and notes, a tasting-note text filter; with notes
+        each wine also gets its 'tasting_note'.
+
+        A full-text query is quoted word by word (fts_query), so every word
+        must match and FTS syntax in it is literal. The QueryPlanner picks
+        between walking the FTS matches (FTS-first) and walking a filter's
+        index while probing FTS per row (index-first). The plan is kept in
+        self.last_plan; with explain it also gets SQLite's EXPLAIN QUERY PLAN
+        rows.
+        """
+        filters = dict(
+            country=country,
+            region=region,
+            grapes=grapes,
+            min_rating=min_rating,
+            max_price=max_price,
+            wine_type=wine_type,
+            **derived_filters
+        )
+        cursor = self._search_cursor(query, filters, limit, offset, order_by, explain)
+        return [dict(row) for row in cursor.fetchall()]
+
+    @timed_query
+    def iter_search_wines(
+        self,
+        query: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+        order_by: str = 'rating',
+        batch_size: int = 500,
+        **filters
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        search_wines as a generator: rows are fetched from the cursor
+        batch_size at a time, so memory stays flat however large the limit.
+        The connection must stay open until the generator is exhausted.
+        """
+        cursor = self._search_cursor(query, {k: v for k, v in filters.items() if v is not None},
+                                     limit, offset, order_by)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+
+    def _search_cursor(
+        self,
+        query: Optional[str],
+        filters: Dict[str, Any],
+        limit: int,
+        offset: int,
+        order_by: str,
+        explain: bool = False
+    ) -> sqlite3.Cursor:
+        """Plan and execute a search_wines query, returning the open cursor."""
+        if not self.conn:
+            self.connect()
+        if order_by not in SEARCH_ORDERS:
+            raise ValueError(f"Unknown order: {order_by}")
+
+        conditions, params = self._build_filters(**filters)
+        if order_by == 'value':
+            conditions.append("value_score IS NOT NULL")
+
+        source = "wines"
+        self.last_plan = None
+        match = fts_query(query) if query else ''
+        if query and not match:
+            conditions.append("0")  # no searchable words, so nothing matches
+        if match:
+            self.last_plan = self.planner.plan(query, filters)
+            if self.last_plan['strategy'] == FTS_FIRST:
+                # Flattened by SQLite into a loop over the FTS matches
+                source = """(SELECT rowid AS fts_id FROM wines_fts WHERE wines_fts MATCH ?) AS m
+                    CROSS JOIN wines ON wines.id = m.fts_id"""
+                params.insert(0, match)
+            else:
+                source = f"wines INDEXED BY {self.last_plan['index']}"
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM wines_fts WHERE wines_fts MATCH ? AND wines_fts.rowid = wines.id)"
+                )
+                params.append(match)
+
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+        columns = "wines.*, " + NOTE_COLUMN if filters.get('notes') else "wines.*"
+        query_sql = f"""
+            SELECT {columns} FROM {source}
+            WHERE {where_clause}
+            ORDER BY {SEARCH_ORDERS[order_by]}
+            LIMIT ? OFFSET ?
+        """
+        params.extend([limit, offset])
+
+        cursor = self.conn.cursor()
+        if explain:
+            plan_rows = cursor.execute(f"EXPLAIN QUERY PLAN {query_sql}", params).fetchall()
+            self.last_plan = dict(self.last_plan or {'strategy': 'filters_only'})
+            self.last_plan['explain'] = [row['detail'] for row in plan_rows]
+        return cursor.execute(query_sql, params)
+
+    @timed_query
+    def search_ranked(
+        self,
+        text: str,
+        limit: int = 20,
+        candidates: Optional[int] = None,
+        highlight: Tuple[str, str] = ('[', ']'),
+        **filters
+    ) -> List[Dict[str, Any]]:
+        """
+        Full-text search ranked by relevance blended with rating and popularity.
+
+        Runs FTS-first: the FTS index returns its top `candidates` matches by
+        bm25() (columns weighted by FTS_COLUMN_WEIGHTS, filters applied in
+        the same query), and only those are re-ranked by
+
+            relevance * bm25 relative to the best match
+            + rating * rating / 5
+            + popularity * log review count relative to the most reviewed
+
+        with weights from RANKED_BLEND. Words must all match; if that finds
+        fewer than `limit` wines, any word may match instead
+        (self.last_ranked_any_term records which). Each wine gets
+        'relevance', 'match_score' and a 'snippet' with matched words wrapped
+        in `highlight`.
+        """
+        return self._search_fts_ranked(
+            'wines_fts', FTS_COLUMN_WEIGHTS, -1, 'snippet', text, limit, candidates, highlight, filters
+        )
+
+    @timed_query
+    def search_notes(
+        self,
+        text: str,
+        limit: int = 20,
+        candidates: Optional[int] = None,
+        highlight: Tuple[str, str] = ('[', ']'),
+        **filters
+    ) -> List[Dict[str, Any]]:
+        """
+        Tasting-note search ranked like search_ranked, over notes_fts
+        (description weighted above designation, see NOTES_COLUMN_WEIGHTS).
+        Each wine gets 'relevance', 'match_score' and a 'tasting_note'
+        excerpt with matched words wrapped in `highlight`.
+        """
+        return self._search_fts_ranked(
+            'notes_fts', NOTES_COLUMN_WEIGHTS, 1, 'tasting_note', text, limit, candidates, highlight, filters
+        )
+
+    def _search_fts_ranked(
+        self,
+        fts_table: str,
+        column_weights: Tuple[float, ...],
+        snippet_column: int,
+        snippet_name: str,
+        text: str,
+        limit: int,
+        candidates: Optional[int],
+        highlight: Tuple[str, str],
+        filters: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Shared body of search_ranked and search_notes."""
         if not self.conn:
             self.connect()
 
+        self.last_ranked_any_term = False
+        terms = re.findall(r'\w+', text)
+        if not terms:
+            return []
+        candidates = candidates or min(max(limit * 10, 100), 1000)
+
+        conditions, params = self._build_filters(**filters)
+        where_clause = " AND ".join([f"{fts_table} MATCH ?", "rank MATCH ?"] + conditions)
+        weights = "bm25({})".format(", ".join(str(w) for w in column_weights))
+
+        rows = []
+        for any_term in ([False, True] if len(terms) > 1 else [False]):
+            cursor = self.conn.execute(f"""
+                SELECT wines.*, rank AS bm25,
+                       snippet({fts_table}, {snippet_column}, ?, ?, '…', 12) AS {snippet_name}
+                FROM {fts_table} JOIN wines ON wines.id = {fts_table}.rowid
+                WHERE {where_clause}
+                ORDER BY rank
+                LIMIT ?
+            """, [highlight[0], highlight[1], fts_query(text, any_term), weights] + params + [candidates])
+            rows = [dict(row) for row in cursor.fetchall()]
+            self.last_ranked_any_term = any_term
+            if len(rows) >= limit:
+                break
+
+        if not rows:
+            return []
+
+        best = min(row['bm25'] for row in rows) or -1.0
+        most_reviews = math.log1p(max(row['num_reviews'] or 0 for row in rows)) or 1.0
+        for row in rows:
+            relevance = row.pop('bm25') / best
+            row['relevance'] = round(relevance, 3)
+            row['match_score'] = round(
+                RANKED_BLEND['relevance'] * relevance
+                + RANKED_BLEND['rating'] * (row['rating'] or 0) / 5
+                + RANKED_BLEND['popularity'] * math.log1p(row['num_reviews'] or 0) / most_reviews,
+                3
+            )
+
+        rows.sort(key=lambda row: row['match_score'], reverse=True)
+        return rows[:limit]
+
+    def _build_filters(
+        self,
+        query: Optional[str] = None,
+        country: Optional[str] = None,
+        region: Optional[str] = None,
+        grapes: Optional[str] = None,
+        min_rating: Optional[float] = None,
+        max_price: Optional[float] = None,
+        wine_type: Optional[str] = None,
+        min_price: Optional[float] = None,
+        price_band: Optional[str] = None,
+        rating_band: Optional[float] = None,
+        min_value: Optional[float] = None,
+        min_availability: Optional[float] = None,
+        notes: Optional[str] = None,
+        any_term: bool = False
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        Build WHERE conditions and parameters shared by searches and aggregates.
+
+        Columns are qualified with the table name, since wines_fts shares
+        region and grapes when a search joins it. Text words must all match;
+        with any_term any word of query may (of notes, when there is no
+        query), as in the fallback of search_ranked and search_notes.
+        """
         conditions = []
         params = []
 
-        # Full-text search
+        # Full-text search (words quoted)
         if query:
-            conditions.append("wines.id IN (SELECT rowid FROM wines_fts WHERE wines_fts MATCH ?)")
-            params.append(query)
+            if fts_query(query):
+                conditions.append("wines.id IN (SELECT rowid FROM wines_fts WHERE wines_fts MATCH ?)")
+                params.append(fts_query(query, any_term))
+            else:
+                conditions.append("0")  # no searchable words, so nothing matches
+
+        # Tasting notes (words quoted)
+        if notes and fts_query(notes):
+            conditions.append("wines.id IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)")
+            params.append(fts_query(notes, any_term and not query))
 
         # Filter conditions
         if country:
-            conditions.append("country LIKE ?")
+            conditions.append("wines.country LIKE ?")
             params.append(f"%{country}%")
 
         if region:
-            conditions.append("region LIKE ?")
+            conditions.append("wines.region LIKE ?")
             params.append(f"%{region}%")
 
         if grapes:
-            conditions.append("grapes LIKE ?")
+            conditions.append("wines.grapes LIKE ?")
             params.append(f"%{grapes}%")
 
         if min_rating is not None:
-            conditions.append("rating >= ?")
+            conditions.append("wines.rating >= ?")
             params.append(min_rating)
 
+        if min_price is not None:
+            conditions.append("wines.price_usd >= ?")
+            params.append(min_price)
+
         if max_price is not None:
-            conditions.append("price_usd <= ?")
+            conditions.append("wines.price_usd <= ?")
             params.append(max_price)
 
         if wine_type:
-            conditions.append("wine_type = ?")
+            conditions.append("wines.wine_type = ?")
             params.append(wine_type)
 
+        # Derived columns (indexed)
+        if price_band:
+            conditions.append("wines.price_band = ?")
+            params.append(price_band)
+
+        if rating_band is not None:
+            conditions.append("wines.rating_band = ?")
+            params.append(rating_band)
+
+        if min_value is not None:
+            conditions.append("wines.value_score >= ?")
+            params.append(min_value)
+
+        if min_availability is not None:
+            conditions.append("wines.availability_score >= ?")
+            params.append(min_availability)
+
+        return conditions, params
+
+    @timed_query
+    def facet_counts(
+        self,
+        facets: List[str],
+        limit: int = 20,
+        query: Optional[str] = None,
+        any_term: bool = False,
+        **filters
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Count wines per value of each facet for the given full-text query
+        and filters. Pass any_term (see _build_filters) when the listed
+        results came from a ranked search that fell back to any word
+        (last_ranked_any_term), so the counts cover the same wines.
+
+        Facets: country, region, grapes, wine_type, price_band. The planner
+        chooses between one GROUP BY per facet (served from the column index
+        when nothing is filtered) and a single pass over the matching rows
+        counting all facets at once (QueryPlanner.facet_plan). Results are
+        cached until the database file changes. self.last_facet_plan records
+        the plan, or {'strategy': 'cached'}.
+        """
+        if not self.conn:
+            self.connect()
+        for facet in facets:
+            if facet not in FACET_EXPRESSIONS:
+                raise ValueError(f"Unknown facet: {facet}")
+
+        filters = {name: value for name, value in filters.items() if value is not None}
+        key = (self._file_version(), query, any_term, tuple(facets), limit, tuple(sorted(filters.items())))
+        with _facet_cache_lock:
+            cached = _facet_cache.get(key)
+            if cached is not None:
+                _facet_cache.move_to_end(key)
+        if cached is not None:
+            self.last_facet_plan = {'strategy': 'cached'}
+            return {facet: [dict(count) for count in counts] for facet, counts in cached.items()}
+
+        # Quoted like search_wines, so counts match the listed results
+        conditions, params = self._build_filters(query=query, any_term=any_term, **filters)
+
+        self.last_facet_plan = self.planner.facet_plan(query, filters, len(facets), any_term)
+        if self.last_facet_plan['strategy'] == FACET_SINGLE_PASS:
+            result = self._facet_counts_single_pass(facets, limit, conditions, params)
+        else:
+            result = self._facet_counts_grouped(facets, limit, conditions, params)
+
+        if key[0] is not None:
+            with _facet_cache_lock:
+                _facet_cache[key] = result
+                while len(_facet_cache) > FACET_CACHE_SIZE:
+                    _facet_cache.popitem(last=False)
+        return {facet: [dict(count) for count in counts] for facet, counts in result.items()}
+
+    def _facet_counts_grouped(
+        self,
+        facets: List[str],
+        limit: int,
+        conditions: List[str],
+        params: List[Any]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        cursor = self.conn.cursor()
+        result = {}
+        for facet in facets:
+            expr = FACET_EXPRESSIONS[facet]
+            where_clause = " AND ".join(conditions + [f"({expr}) IS NOT NULL"])
+            cursor.execute(f"""
+                SELECT {expr} AS value, COUNT(*) AS count FROM wines
+                WHERE {where_clause}
+                GROUP BY value
+                ORDER BY count DESC
+                LIMIT ?
+            """, params + [limit])
+            result[facet] = [dict(row) for row in cursor.fetchall()]
+        return result
+
+    def _facet_counts_single_pass(
+        self,
+        facets: List[str],
+        limit: int,
+        conditions: List[str],
+        params: List[Any]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        columns = ", ".join(FACET_EXPRESSIONS[facet] for facet in facets)
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        counters = [Counter() for _ in facets]
+        cursor = self.conn.execute(f"SELECT {columns} FROM wines WHERE {where_clause}", params)
+        for row in cursor:
+            for counter, value in zip(counters, row):
+                if value is not None:
+                    counter[value] += 1
+        return {
+            facet: [{'value': value, 'count': count} for value, count in counter.most_common(limit)]
+            for facet, counter in zip(facets, counters)
+        }
 
-        query_sql = f"""
-            SELECT * FROM wines
-            WHERE {where_clause}
-            ORDER BY rating DESC, num_reviews DESC
-            LIMIT ? OFFSET ?
+    @timed_query
+    def search_with_facets(
+        self,
+        facets: List[str],
+        query: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+        order_by: str = 'rating',
+        facet_limit: int = 20,
+        explain: bool = False,
+        **filters
+    ) -> Dict[str, Any]:
         """
-        params.extend([limit, offset])
+        A search_wines results page plus facet_counts for the same query and
+        filters: {'wines': [...], 'facets': {facet: [{'value', 'count'}]}}.
+        """
+        wines = self.search_wines(query=query, limit=limit, offset=offset, order_by=order_by,
+                                  explain=explain, **filters)
+        return {
+            'wines': wines,
+            'facets': self.facet_counts(facets, limit=facet_limit, query=query, **filters),
+        }
+
+    def _file_version(self) -> Optional[Tuple[str, int, int]]:
+        """(path, mtime_ns, size) of the database file; any committed write changes it."""
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (str(self.db_path.resolve()), st.st_mtime_ns, st.st_size)
+
+    @timed_query
+    def sample_wines(
+        self,
+        n: int,
+        seed: Optional[Any] = None,
+        stratify: Optional[str] = None,
+        **filters
+    ) -> List[Dict[str, Any]]:
+        """
+        Random sample of up to n wines matching the filters, reproducible by seed.
+
+        Avoids ORDER BY RANDOM(), which sorts every match. Unfiltered, each draw
+        picks a random id between the smallest and largest and takes the first
+        row at or after it, an index seek (uniform while ids are dense). With
+        filters, matching ids are gapped, so taking the next match would
+        favour wines after long gaps: where the planner expects matches to be
+        dense a draw only counts if the random id itself matches, and
+        otherwise each matching id gets a seeded random key and the n smallest
+        are kept, one pass over the matches (via an index where there is one).
+        Both are uniform.
+
+        With stratify ('country', 'wine_type' or 'price_band'), the sample is
+        spread evenly over the strata (a random n of them if there are more
+        strata than n), and strata that run short hand their share to the
+        rest. Each row then carries a 'stratum' key. Strata are found by
+        skipping through the column index, one seek per distinct value.
+        """
+        if not self.conn:
+            self.connect()
+
+        rng = random.Random(seed)
+        conditions, params = self._build_filters(**filters)
+        if not stratify:
+            estimated = self.planner.estimate_rows(filters.get('query'), filters) if conditions else 0
+            return self._probe_sample(n, rng, conditions, params, estimated)
+
+        strata = self._strata(stratify)
+        rng.shuffle(strata)
+        strata = strata[:n]
+
+        sample = []
+        for i, (value, condition, condition_params) in enumerate(strata):
+            share = -(-(n - len(sample)) // (len(strata) - i))
+            estimated = self.planner.estimate_rows(filters.get('query'), dict(filters, **{stratify: value}))
+            rows = self._probe_sample(share, rng, conditions + [condition], params + condition_params, estimated)
+            for row in rows:
+                row['stratum'] = value
+            sample.extend(rows)
+
+        return sample
+
+    def _strata(self, stratify: str) -> List[Tuple[str, str, List[Any]]]:
+        """(value, condition, params) for each stratum of a SAMPLE_STRATA column."""
+        if stratify not in SAMPLE_STRATA:
+            raise ValueError(f"Cannot stratify by: {stratify}")
+
+        # Skip-scan the index: each MIN(...) > ? is one seek
+        strata = []
+        row = self.conn.execute(f"SELECT MIN({stratify}) FROM wines").fetchone()
+        while row[0] is not None:
+            strata.append((row[0], f"{stratify} = ?", [row[0]]))
+            row = self.conn.execute(
+                f"SELECT MIN({stratify}) FROM wines WHERE {stratify} > ?", (row[0],)
+            ).fetchone()
+        return strata
+
+    def _probe_sample(
+        self,
+        n: int,
+        rng: random.Random,
+        conditions: List[str],
+        params: List[Any],
+        estimated_rows: int = 0,
+        max_attempts_per_row: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Draw up to n distinct matching rows by random rowid probes.
+
+        Unfiltered, each probe takes the first row at or after a random id.
+        Filtered, that would favour rows after long gaps, so a probe only
+        counts if the random id itself matches (uniform); it is used when the
+        planner's estimate puts at least SAMPLE_PROBE_DENSITY of the id range
+        in the sample, and random keys are used otherwise or if the probes
+        come up short.
+        """
+        if n <= 0:
+            return []
+        where_clause = " AND ".join(conditions) if conditions else "1=1"
+        cursor = self.conn.cursor()
+
+        # Two seeks rather than MIN/MAX, which would scan an index range. The
+        # id bound steers the planner to walk ids (or an equality index)
+        # instead of sorting a range index.
+        bounds = []
+        for op, order, start in (('>=', 'ASC', 0), ('<=', 'DESC', 2 ** 63 - 1)):
+            cursor.execute(f"""
+                SELECT id FROM wines
+                WHERE {where_clause} AND id {op} ?
+                ORDER BY id {order}
+                LIMIT 1
+            """, params + [start])
+            row = cursor.fetchone()
+            if row is None:
+                return []
+            bounds.append(row[0])
+        low, high = bounds
+
+        if conditions and estimated_rows < SAMPLE_PROBE_DENSITY * (high - low + 1):
+            return self._keyed_sample(n, rng, conditions, params)
+
+        attempts = n * max_attempts_per_row
+        probe = "id >= ? ORDER BY id LIMIT 1"
+        if conditions:
+            # Expect (id range / matches) probes per row; allow three times that
+            attempts = max(attempts, int(3 * n * (high - low + 1) / max(estimated_rows, 1)))
+            probe = "id = ?"
+
+        sample: Dict[int, Dict[str, Any]] = {}
+        for _ in range(attempts):
+            if len(sample) >= n:
+                break
+            cursor.execute(f"SELECT * FROM wines WHERE {where_clause} AND {probe}", params + [rng.randint(low, high)])
+            row = cursor.fetchone()
+            if row is not None and row['id'] not in sample:
+                sample[row['id']] = dict(row)
+
+        if conditions and len(sample) < n:
+            return self._keyed_sample(n, rng, conditions, params)
+        return list(sample.values())
+
+    def _keyed_sample(
+        self,
+        n: int,
+        rng: random.Random,
+        conditions: List[str],
+        params: List[Any]
+    ) -> List[Dict[str, Any]]:
+        """
+        Uniform sample of up to n matching rows by random keys: every matching
+        id gets a key from a seeded random polynomial hash and the n smallest
+        keys win (reservoir sampling with keys, done by SQLite's top-n sort
+        over ids alone). Only the winning rows are then fetched.
+        """
+        if n <= 0:
+            return []
+
+        # (a*id^2 + b*id + c) mod p, in Horner form so no product overflows 63 bits
+        p = SAMPLE_KEY_PRIME
+        a, b, c = rng.randrange(1, p), rng.randrange(p), rng.randrange(p)
+        cursor = self.conn.execute(f"""
+            SELECT id FROM wines
+            WHERE {' AND '.join(conditions)}
+            ORDER BY ((? * id + ?) % ? * id + ?) % ?, id
+            LIMIT ?
+        """, params + [a, b, p, c, p, n])
+        return self.get_wines_by_ids([row[0] for row in cursor])
+
+    @timed_query
+    def rating_histogram(self, bin_width: float = 0.5, **filters) -> List[Dict[str, Any]]:
+        """Count rated wines per rating bucket of width bin_width (5.0 folds into the top bucket)."""
+        bin_width = float(bin_width)
+        if not bin_width > 0:
+            raise ValueError(f"bin_width must be positive, got {bin_width}")
+        if not self.conn:
+            self.connect()
+
+        conditions, params = self._build_filters(**filters)
+        where_clause = " AND ".join(conditions + ["rating IS NOT NULL"])
 
         cursor = self.conn.cursor()
-        cursor.execute(query_sql, params)
+        cursor.execute(f"""
+            SELECT CAST(MIN(rating, 4.999) / ? AS INTEGER) * ? AS bucket, COUNT(*) AS count FROM wines
+            WHERE {where_clause}
+            GROUP BY bucket
+            ORDER BY bucket
+        """, [bin_width, bin_width] + params)
+
+        return [
+            {'min_rating': round(row['bucket'], 2), 'max_rating': round(row['bucket'] + bin_width, 2), 'count': row['count']}
+            for row in cursor.fetchall()
+        ]
+
+    @timed_query
+    def distinct_regions(
+        self,
+        match: str,
+        country: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """List distinct regions whose name contains match, with wine counts."""
+        if not self.conn:
+            self.connect()
+
+        conditions = ["region LIKE ?"]
+        params: List[Any] = [f"%{match}%"]
+        if country:
+            conditions.append("country LIKE ?")
+            params.append(f"%{country}%")
+
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT region, country, COUNT(*) AS count FROM wines
+            WHERE {" AND ".join(conditions)}
+            GROUP BY region, country
+            ORDER BY count DESC
+            LIMIT ?
+        """, params + [limit])
 
         return [dict(row) for row in cursor.fetchall()]
 
+    @timed_query
     def get_wine_by_id(self, wine_id: int) -> Optional[Dict[str, Any]]:
         """Get a single wine by ID."""
         if not self.conn:
@@ -205,6 +1173,172 @@ class WineDatabase:
 
         return dict(row) if row else None
 
+    @timed_query
+    def find_wine_id(self, name: str, winery: Optional[str] = None) -> Optional[int]:
+        """
+        ID of the wine with exactly this name (and winery, if given), ignoring
+        case; the best rated one if several match. None when there is none.
+        The full-text index narrows the candidates, so no name index is needed.
+        """
+        if not self.conn:
+            self.connect()
+
+        match = fts_query(f"{name} {winery or ''}")
+        if not match:
+            return None
+
+        sql = """
+            SELECT wines.id FROM wines_fts
+            JOIN wines ON wines.id = wines_fts.rowid
+            WHERE wines_fts MATCH ? AND wines.name = ? COLLATE NOCASE
+        """
+        params = [match, name]
+        if winery:
+            sql += " AND wines.winery = ? COLLATE NOCASE"
+            params.append(winery)
+        sql += " ORDER BY wines.rating DESC LIMIT 1"
+
+        row = self.conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    @timed_query
+    def get_wines_by_ids(self, wine_ids: List[int], in_list_threshold: int = 500) -> List[Dict[str, Any]]:
+        """
+        Get wines by ID in one query, in the order the IDs were given.
+
+        Missing IDs are skipped. Short lists use a single IN (...) query; longer
+        ones (which could exceed SQLite's bound-parameter limit) are bound as
+        one JSON array and joined through json_each, which also keeps the
+        given order. Either way the lookup only reads, so it is safe inside a
+        caller's transaction and on read-only connections.
+        """
+        if not self.conn:
+            self.connect()
+        if not wine_ids:
+            return []
+
+        cursor = self.conn.cursor()
+
+        if len(wine_ids) <= in_list_threshold:
+            placeholders = ", ".join("?" for _ in wine_ids)
+            cursor.execute(f"SELECT * FROM wines WHERE id IN ({placeholders})", list(wine_ids))
+            by_id = {row['id']: dict(row) for row in cursor.fetchall()}
+            return [by_id[wine_id] for wine_id in wine_ids if wine_id in by_id]
+
+        cursor.execute("""
+            SELECT wines.* FROM json_each(?) AS lookup
+            JOIN wines ON wines.id = lookup.value
+            ORDER BY lookup.key
+        """, (json.dumps([int(wine_id) for wine_id in wine_ids]),))
+        return [dict(row) for row in cursor.fetchall()]
+
+    @timed_query
+    def record_shipment(
+        self,
+        club: str,
+        wine_ids: List[int],
+        theme: Optional[str] = None,
+        update_filter: Optional[Callable[[Optional[FilterState]], FilterState]] = None
+    ) -> int:
+        """
+        Add wines to a club's shipment history. Returns the number newly recorded.
+
+        If update_filter is given it is called, inside the same write
+        transaction, with the club's stored filter state (capacity, count,
+        bits) or None, and its result is stored. Holding the write lock means
+        two processes recording at once can't overwrite each other's filters.
+        """
+        self.initialize_shipments_schema()
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(
+                "INSERT OR IGNORE INTO shipped_wines (club, wine_id, theme) VALUES (?, ?, ?)",
+                [(club, wine_id, theme) for wine_id in wine_ids]
+            )
+            added = cursor.rowcount
+            if update_filter:
+                # Read the filter under the same lock; load_shipment_filter
+                # would commit (via schema init) and release it
+                self._store_filter(club, update_filter(self._read_filter(club)))
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return added
+
+    def load_shipment_filter(self, club: str) -> Optional[FilterState]:
+        """A club's saved filter state (capacity, count, bits), or None."""
+        self.initialize_shipments_schema()
+
+        return self._read_filter(club)
+
+    def _read_filter(self, club: str) -> Optional[FilterState]:
+        row = self.conn.execute(
+            "SELECT capacity, count, bits FROM shipment_filters WHERE club = ?", (club,)
+        ).fetchone()
+        return (row[0], row[1], bytes(row[2])) if row else None
+
+    def save_shipment_filter(self, club: str, state: FilterState):
+        """Store a club's filter state."""
+        self.initialize_shipments_schema()
+
+        self._store_filter(club, state)
+        self.conn.commit()
+
+    def _store_filter(self, club: str, state: FilterState):
+        capacity, count, bits = state
+        self.conn.execute(
+            "INSERT OR REPLACE INTO shipment_filters (club, capacity, count, bits) VALUES (?, ?, ?, ?)",
+            (club, capacity, count, bits)
+        )
+
+    @timed_query
+    def shipped_wine_ids(self, club: str) -> List[int]:
+        """Every wine ID ever shipped to a club."""
+        if not self.conn:
+            self.connect()
+
+        cursor = self.conn.execute("SELECT wine_id FROM shipped_wines WHERE club = ?", (club,))
+        return [row[0] for row in cursor]
+
+    @timed_query
+    def shipped_count(self, club: str, **filters) -> int:
+        """Distinct wines shipped to a club that match the filters (see _build_filters)."""
+        if not self._has_table('shipped_wines'):
+            return 0
+
+        conditions, params = self._build_filters(**filters)
+        where_clause = " AND ".join(["shipped_wines.club = ?"] + conditions)
+        row = self.conn.execute(f"""
+            SELECT COUNT(*) FROM shipped_wines
+            JOIN wines ON wines.id = shipped_wines.wine_id
+            WHERE {where_clause}
+        """, [club] + params).fetchone()
+        return row[0]
+
+    @timed_query
+    def was_shipped(self, club: str, wine_id: int) -> bool:
+        """Whether a wine has been shipped to a club."""
+        if not self.conn:
+            self.connect()
+
+        row = self.conn.execute(
+            "SELECT 1 FROM shipped_wines WHERE club = ? AND wine_id = ?", (club, wine_id)
+        ).fetchone()
+        return row is not None
+
+    def catalog_version(self) -> Tuple[int, int]:
+        """
+        Version of the catalog: the database file's (mtime_ns, size), like the
+        response and facet caches. Any committed write changes it, updates to
+        existing wines included, and reading it is one stat() call.
+        """
+        version = self._file_version()
+        return (version[1], version[2]) if version else (0, 0)
+
+    @timed_query
     def get_statistics(self) -> Dict[str, Any]:
         """Get database statistics."""
         if not self.conn:
@@ -0,0 +1,86 @@
+"""Derived per-wine columns computed in vectorized batches at ingest."""
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+# Price bands used for faceting: (label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = [
+    ('under_15', None, 15),
+    ('15-30', 15, 30),
+    ('30-60', 30, 60),
+    ('60-100', 60, 100),
+    ('100+', 100, None),
+]
+
+# Width of the stored rating bands (5.0 folds into the top band)
+RATING_BAND_WIDTH = 0.5
+
+# US availability heuristic: (reason, confidence change, condition on
+# price/rating/reviews arrays, where missing values are NaN)
+AVAILABILITY_RULES = [
+    ("Price in common retail range", 0.3, lambda p, r, n: (p >= 10) & (p <= 100)),
+    ("High price may limit availability", -0.2, lambda p, r, n: p > 200),
+    ("High number of reviews", 0.3, lambda p, r, n: n > 1000),
+    ("Moderate number of reviews", 0.1, lambda p, r, n: (n > 100) & (n <= 1000)),
+    ("Highly rated popular wine", 0.2, lambda p, r, n: (r > 4.5) & (n > 500)),
+]
+
+# Availability tier thresholds, highest first
+AVAILABILITY_TIERS = [(0.5, 'likely'), (0.3, 'possible'), (0.0, 'unknown')]
+
+DERIVED_COLUMNS = ['availability_score', 'value_score', 'price_band', 'rating_band']
+
+
+def _column(wines: List[Dict[str, Any]], key: str) -> np.ndarray:
+    return np.array([np.nan if w.get(key) is None else w[key] for w in wines], dtype=np.float64)
+
+
+def compute_derived(wines: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Derived columns for a batch of wines, one list per DERIVED_COLUMNS entry.
+
+        availability_score  sum of AVAILABILITY_RULES weights that apply
+        value_score         rating per dollar (None without price or rating)
+        price_band          PRICE_BANDS label (None without price)
+        rating_band         lower bound of the 0.5-wide rating band
+    """
+    price = _column(wines, 'price_usd')
+    rating = _column(wines, 'rating')
+    reviews = _column(wines, 'num_reviews')
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        availability = np.zeros(len(wines))
+        for _, weight, condition in AVAILABILITY_RULES:
+            availability += np.where(condition(price, rating, reviews), weight, 0.0)
+
+        value = np.where(price > 0, rating / price, np.nan)
+        rating_band = np.floor(np.minimum(rating, 4.999) / RATING_BAND_WIDTH) * RATING_BAND_WIDTH
+
+    edges = [high for _, _, high in PRICE_BANDS[:-1]]
+    labels = np.array([label for label, _, _ in PRICE_BANDS], dtype=object)
+    price_band = labels[np.searchsorted(edges, np.nan_to_num(price), side='right')]
+
+    def nullable(values: np.ndarray, digits: int) -> List[Any]:
+        return [None if np.isnan(v) else round(float(v), digits) for v in values]
+
+    return {
+        'availability_score': [round(float(v), 2) for v in availability],
+        'value_score': nullable(value, 4),
+        'price_band': [None if np.isnan(p) else b for p, b in zip(price, price_band)],
+        'rating_band': nullable(rating_band, 1),
+    }
+
+
+def availability_tier(score: float) -> str:
+    """Tier for an availability score: likely, possible, unknown or unlikely."""
+    for threshold, tier in AVAILABILITY_TIERS:
+        if score >= threshold:
+            return tier
+    return 'unlikely'
+
+
+def availability_reasons(wine: Dict[str, Any]) -> List[str]:
+    """Which AVAILABILITY_RULES apply to one wine."""
+    values = [np.nan if wine.get(k) is None else wine[k] for k in ('price_usd', 'rating', 'num_reviews')]
+    return [reason for reason, _, condition in AVAILABILITY_RULES if condition(*values)]
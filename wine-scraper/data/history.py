@@ -0,0 +1,122 @@
+"""Per-club shipment history with Bloom filter fronts for fast exclusion checks."""
+import hashlib
+import math
+from typing import Dict, Iterable, Optional
+
+from .db import FilterState, WineDatabase
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over integers.
+
+    Sized for `capacity` items at `error_rate` false positives; never gives
+    false negatives. Uses double hashing (h1 + i*h2) from one blake2b digest.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: int):
+        digest = hashlib.blake2b(item.to_bytes(8, 'little', signed=True), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: int):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class ShipmentHistory:
+    """
+    Which wines each club has already received.
+
+    The shipped_wines table is the source of truth. Each club gets a Bloom
+    filter that answers the common "never shipped" case in memory; only
+    Bloom hits are confirmed against the table, so exclusion is exact and
+    costs no NOT IN list. Filters are saved in shipment_filters and updated
+    in the same transaction as each shipment, so a new process loads one
+    row rather than the club's history (which is only replayed the first
+    time, or to rebuild a full filter at double the capacity). A loaded
+    filter sees the table as it was plus shipments recorded through this
+    object; call refresh() to pick up ones recorded elsewhere.
+    """
+
+    def __init__(self, db: WineDatabase, error_rate: float = 0.01):
+        self.db = db
+        self.error_rate = error_rate
+        self._filters: Dict[str, BloomFilter] = {}
+
+    def _restore(self, state: Optional[FilterState]) -> Optional[BloomFilter]:
+        """A filter from saved state, or None if there is none or it was sized for another error rate."""
+        if state is None:
+            return None
+        capacity, count, bits = state
+        bloom = BloomFilter(capacity, self.error_rate)
+        if len(bits) != len(bloom.bits):
+            return None
+        bloom.bits = bytearray(bits)
+        bloom.count = count
+        return bloom
+
+    def _build(self, club: str) -> BloomFilter:
+        """A filter holding the club's whole history, with room to double."""
+        shipped = self.db.shipped_wine_ids(club)
+        bloom = BloomFilter(max(1024, 2 * len(shipped)), self.error_rate)
+        for wine_id in shipped:
+            bloom.add(wine_id)
+        return bloom
+
+    def _filter(self, club: str) -> BloomFilter:
+        bloom = self._filters.get(club)
+        if bloom is None:
+            bloom = self._restore(self.db.load_shipment_filter(club))
+            if bloom is None:
+                bloom = self._build(club)
+                if not self.db.read_only:
+                    self.db.save_shipment_filter(club, (bloom.capacity, bloom.count, bytes(bloom.bits)))
+            self._filters[club] = bloom
+        return bloom
+
+    def refresh(self, club: Optional[str] = None):
+        """Drop cached filters (one club's, or all) so they reload from the database."""
+        if club is None:
+            self._filters.clear()
+        else:
+            self._filters.pop(club, None)
+
+    def was_shipped(self, club: str, wine_id: int) -> bool:
+        """Exact check: Bloom filter first, the table only on a possible hit."""
+        return wine_id in self._filter(club) and self.db.was_shipped(club, wine_id)
+
+    def record(self, club: str, wine_ids: Iterable[int], theme: Optional[str] = None) -> int:
+        """Record a shipment and update the club's saved filter. Returns wines newly recorded."""
+        wine_ids = list(wine_ids)
+
+        def update(state: Optional[FilterState]) -> FilterState:
+            # Start from the saved filter, which includes other processes' shipments
+            bloom = self._restore(state)
+            if bloom is None or bloom.count + len(wine_ids) > bloom.capacity:
+                # Missing, or past capacity where the false-positive rate
+                # climbs: rebuild from the table, which holds this shipment
+                bloom = self._build(club)
+            else:
+                for wine_id in wine_ids:
+                    bloom.add(wine_id)
+            self._filters[club] = bloom
+            return bloom.capacity, bloom.count, bytes(bloom.bits)
+
+        return self.db.record_shipment(club, wine_ids, theme, update)
+
+    def count(self, club: str) -> int:
+        """Approximate number of wines shipped to a club (exact unless re-recorded)."""
+        return self._filter(club).count
@@ -130,7 +130,9 @@ class KaggleDatasetLoader:
                 'num_reviews': 1,  # Each row is one review
                 'price_usd': self._parse_price(row.get('price')),
                 'wine_type': self._normalize_wine_type(row.get('variety')),
-                'grapes': row.get('variety')
+                'grapes': row.get('variety'),
+                'designation': row.get('designation'),
+                'description': row.get('description')
             }
 
             # Validate required fields
@@ -284,6 +286,7 @@ class KaggleDatasetLoader:
             total_inserted += inserted
 
         print(f"Total wines inserted: {total_inserted}")
+        self.db.refresh_column_stats()
 
         # Show statistics
         stats = self.db.get_statistics()
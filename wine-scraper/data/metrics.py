@@ -0,0 +1,264 @@
+"""
+In-process latency histograms and counters, rendered in the Prometheus text
+exposition format.
+
+Recording is a lock plus a bisect per observation (about a microsecond), so
+instrumentation can stay on in production. Metrics live in the module-level
+REGISTRY and are shared by every database, agent and app in the process.
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(header + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in values]
+
+
+class Gauge(_Metric):
+    """Current value per label set, set by the owner (e.g. at scrape time)."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in values]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Named metrics, rendered together for a /metrics scrape."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Shared metrics, recorded by data.db, agent.agentic and web
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'wine_db_query_duration_seconds', 'WineDatabase method latency.', ['method'])
+DB_ROWS = REGISTRY.counter(
+    'wine_db_rows_returned_total', 'Rows returned by WineDatabase methods.', ['method'])
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    'wine_llm_request_duration_seconds', 'LLM messages.create latency, including scheduler wait.',
+    ['model', 'outcome'])
+LLM_TOKENS = REGISTRY.counter(
+    'wine_llm_tokens_total', 'LLM tokens reported in response usage.', ['model', 'direction'])
+
+
+def _row_count(result: Any) -> int:
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1 if isinstance(result, dict) else 0
+
+
+def timed_query(method: Callable) -> Callable:
+    """
+    Record a WineDatabase method's latency and the rows it returns under its
+    name. Generator methods are timed from first to last row, as consumed.
+    """
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            rows = 0
+            try:
+                for row in method(*args, **kwargs):
+                    rows += 1
+                    yield row
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - start, method=name)
+                DB_ROWS.inc(rows, method=name)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, method=name)
+        DB_ROWS.inc(_row_count(result), method=name)
+        return result
+
+    return wrapper
+
+
+def record_llm_usage(model: str, response: Any):
+    """Count the input/output tokens of an LLM response, if it reports usage."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, 'input_tokens', 0) or 0, model=model, direction='input')
+    LLM_TOKENS.inc(getattr(usage, 'output_tokens', 0) or 0, model=model, direction='output')
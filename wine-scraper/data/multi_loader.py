@@ -27,6 +27,8 @@ class UnifiedWineLoader:
             total_wines += wines_added
             print(f"✓ Added {wines_added} wines from {name}")
 
+        self.db.refresh_column_stats()
+        self.db.close()
         print(f"\n=== Total: {total_wines} wines loaded ===")
         return total_wines
 
@@ -186,6 +188,8 @@ class WineReviewsDatasetLoader:
                     'price_usd': self._parse_float(row.get('price')),
                     'wine_type': self._infer_type(row.get('variety')),
                     'grapes': row.get('variety'),
+                    'designation': row.get('designation'),
+                    'description': row.get('description'),
                     'source': self.SOURCE_NAME
                 }
                 if wine['name']:
@@ -0,0 +1,228 @@
+"""Cost-based choice of execution strategy for full-text searches with filters."""
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Strategies
+FTS_FIRST = 'fts_first'      # walk the FTS matches, look up and filter each row
+INDEX_FIRST = 'index_first'  # walk a column index range, probe FTS for each row
+
+# Rough per-row costs in microseconds, measured on a 1M-wine catalog:
+# joining one FTS match to its row and filtering it, reading one row from an
+# index range, and one correlated FTS probe (dominated by per-probe MATCH setup)
+FTS_MATCH_COST = 1.0
+INDEX_ROW_COST = 1.0
+FTS_PROBE_COST = 50.0
+
+# Facet counting strategies
+FACET_GROUP_BY = 'group_by'        # one GROUP BY per facet
+FACET_SINGLE_PASS = 'single_pass'  # read the matching rows once, count every facet
+
+# Per-row facet costs in microseconds (same catalog): a filtered GROUP BY
+# reading one row, and counting one matching row's facet values in Python
+FACET_SCAN_ROW_COST = 0.4
+FACET_COUNT_ROW_COST = 2.5
+
+# Selectivity assumed for filters without statistics (min_value, min_availability,
+# and every filter before column_stats has been computed)
+DEFAULT_SELECTIVITY = 0.3
+
+# Filters that can drive an index range scan: filter -> index name
+FILTER_INDEXES = {
+    'wine_type': 'idx_wine_type',
+    'price': 'idx_price',
+    'min_rating': 'idx_rating',
+    'price_band': 'idx_price_band',
+    'rating_band': 'idx_rating_band',
+}
+
+def fts_words(text: str) -> List[str]:
+    """The words fts_query() quotes, folded like the unicode61 tokenizer."""
+    words = []
+    for word in re.findall(r'\w+', text):
+        folded = unicodedata.normalize('NFKD', word.lower())
+        words.append(''.join(c for c in folded if not unicodedata.combining(c)))
+    return words
+
+
+class QueryPlanner:
+    """
+    Picks FTS-first or index-first execution for search_wines queries.
+
+    Estimates come from the column_stats table (see
+    WineDatabase.refresh_column_stats): value counts per column, price and
+    rating histograms, and FTS term document counts for names and tasting
+    notes. Terms missing from the stats (new since the last refresh) count
+    as rare. Filters are assumed independent. Each plan is logged at INFO
+    on this module's logger and kept as WineDatabase.last_plan.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._stats: Optional[Dict[str, Dict[str, int]]] = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Column statistics, empty if the database has none. Planning never
+        computes them (a write plus ANALYZE, impossible on read-only
+        workers); `migrate` and the loaders do, and without them estimates
+        fall back to defaults.
+        """
+        if self._stats is None:
+            self._stats = self.db.column_stats()
+        return self._stats
+
+    def invalidate(self):
+        self._stats = None
+
+    def has_stats(self) -> bool:
+        """Whether column statistics have been computed (every refresh stores the row count)."""
+        return '_table' in self.stats()
+
+    def total_rows(self) -> int:
+        rows = self.stats().get('_table', {}).get('rows')
+        if rows is None:
+            rows = self.db.max_wine_id()  # one seek; exact while ids are dense
+        return max(1, rows)
+
+    def term_matches(self, query: str, stats_name: str = '_term', any_term: bool = False) -> int:
+        """
+        Estimated rows matching free text searched as fts_query(query): with
+        every word required, the fewest docs of any word; with any_term, their
+        sum (capped at the catalog). stats_name '_note_term' estimates
+        tasting notes. Without statistics each word matches
+        DEFAULT_SELECTIVITY of the catalog.
+        """
+        words = fts_words(query)
+        if not words:
+            return self.total_rows()
+        if not self.has_stats():
+            # No term counts yet: each word matches a default share
+            share = min(1.0, len(words) * DEFAULT_SELECTIVITY) if any_term else DEFAULT_SELECTIVITY
+            return int(self.total_rows() * share)
+        counts = [self.db.term_doc_count(word, False, stats_name) for word in words]
+        return min(sum(counts), self.total_rows()) if any_term else min(counts)
+
+    def _fraction(self, column: str, predicate) -> float:
+        counts = self.stats().get(column)
+        if not counts:
+            return DEFAULT_SELECTIVITY
+        return sum(n for value, n in counts.items() if predicate(value)) / self.total_rows()
+
+    def estimate_rows(self, query: Optional[str], filters: Dict[str, Any], any_term: bool = False) -> int:
+        """Estimated rows matching query (if any) and all filters, taken as independent."""
+        rows = self.term_matches(query, any_term=any_term) if query else self.total_rows()
+        for selectivity in self.selectivities(filters).values():
+            rows *= selectivity
+        return int(rows)
+
+    def facet_plan(
+        self,
+        query: Optional[str],
+        filters: Dict[str, Any],
+        facets: int,
+        any_term: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Choose how to count facets. Each filtered GROUP BY reads the FTS
+        matches (with a query) or scans the catalog (filters are mostly
+        substring matches), so it pays that read once per facet; a single
+        pass pays it once plus counting every matching row in Python. Without
+        any filter each GROUP BY is an index-only scan, always the cheaper.
+        """
+        active = {name: value for name, value in filters.items() if value is not None}
+        if not query and not active:
+            return {'strategy': FACET_GROUP_BY, 'estimated_rows': self.total_rows()}
+
+        rows_read = self.term_matches(query, any_term=any_term) if query else self.total_rows()
+        estimated = self.estimate_rows(query, active, any_term)
+        costs = {
+            FACET_GROUP_BY: facets * rows_read * FACET_SCAN_ROW_COST,
+            FACET_SINGLE_PASS: rows_read * FACET_SCAN_ROW_COST + estimated * FACET_COUNT_ROW_COST,
+        }
+        return {
+            'strategy': min(costs, key=costs.get),
+            'estimated_rows': estimated,
+            'cost_us': {name: round(c) for name, c in costs.items()},
+        }
+
+    def selectivities(self, filters: Dict[str, Any]) -> Dict[str, float]:
+        """Estimated fraction of the catalog passing each active filter."""
+        estimates = {}
+        for column in ('country', 'region', 'grapes'):
+            if filters.get(column):
+                wanted = filters[column].lower()
+                estimates[column] = self._fraction(column, lambda v: wanted in v.lower())
+
+        if filters.get('wine_type'):
+            estimates['wine_type'] = self._fraction('wine_type', lambda v: v == filters['wine_type'])
+        if filters.get('price_band'):
+            estimates['price_band'] = self._fraction('price_band', lambda v: v == filters['price_band'])
+        if filters.get('rating_band') is not None:
+            estimates['rating_band'] = self._fraction('rating_band', lambda v: float(v) == filters['rating_band'])
+
+        low, high = filters.get('min_price'), filters.get('max_price')
+        prices = self.stats().get('price_usd')
+        if (low is not None or high is not None) and not prices:
+            estimates['price'] = DEFAULT_SELECTIVITY
+        elif low is not None or high is not None:
+            low = low if low is not None else float('-inf')
+            high = high if high is not None else float('inf')
+            # 1-dollar buckets; count the overlapping share of each
+            estimates['price'] = sum(
+                n * max(0.0, min(int(v) + 1, high) - max(int(v), low))
+                for v, n in prices.items()
+            ) / self.total_rows()
+
+        if filters.get('min_rating') is not None:
+            estimates['min_rating'] = self._fraction('rating', lambda v: float(v) >= filters['min_rating'])
+
+        if filters.get('notes'):
+            estimates['notes'] = self.term_matches(filters['notes'], '_note_term') / self.total_rows()
+
+        for name in ('min_value', 'min_availability'):
+            if filters.get(name) is not None:
+                estimates[name] = DEFAULT_SELECTIVITY
+
+        return estimates
+
+    def plan(self, query: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Choose a strategy for a full-text query plus filters.
+
+        FTS-first costs one join per FTS match. Index-first reads the range of
+        the most selective indexable filter and probes FTS for each row that
+        passes the other filters.
+        """
+        rows = self.total_rows()
+        matches = self.term_matches(query)
+        estimates = self.selectivities(filters)
+
+        costs = {FTS_FIRST: matches * FTS_MATCH_COST}
+        index = None
+        indexable = {name: s for name, s in estimates.items() if name in FILTER_INDEXES}
+        if indexable:
+            driver = min(indexable, key=indexable.get)
+            index = FILTER_INDEXES[driver]
+            others = 1.0
+            for name, s in estimates.items():
+                if name != driver:
+                    others *= s
+            index_rows = rows * indexable[driver]
+            costs[INDEX_FIRST] = index_rows * (INDEX_ROW_COST + others * FTS_PROBE_COST)
+
+        strategy = min(costs, key=costs.get)
+        plan = {
+            'strategy': strategy,
+            'index': index if strategy == INDEX_FIRST else None,
+            'catalog_rows': rows,
+            'fts_matches': matches,
+            'selectivity': {name: round(s, 5) for name, s in estimates.items()},
+            'cost_us': {name: round(c) for name, c in costs.items()},
+        }
+        logger.info("search plan for %r: %s", query, plan)
+        return plan
@@ -0,0 +1,64 @@
+"""Thread pool of SQLite connections for running database work off the event loop."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from .db import WineDatabase
+
+
+class WineDatabasePool:
+    """
+    Run WineDatabase calls on a bounded pool of worker threads.
+
+    SQLite connections can't be shared across threads, so each worker lazily
+    opens its own connection and keeps it for the lifetime of the pool.
+    """
+
+    def __init__(self, db_path: str = "data/wines.db", max_workers: int = 4):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._databases = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="wine-db"
+        )
+
+    def _get_db(self) -> WineDatabase:
+        """Get (or open) the connection owned by the current worker thread."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = WineDatabase(self.db_path)
+            db.connect(check_same_thread=False)
+            self._local.db = db
+            with self._lock:
+                self._databases.append(db)
+        return db
+
+    def _call(self, fn: Callable[[WineDatabase], Any]) -> Any:
+        return fn(self._get_db())
+
+    def submit(self, fn: Callable[[WineDatabase], Any]):
+        """Schedule fn(db) on a worker thread and return a concurrent Future."""
+        return self._executor.submit(self._call, fn)
+
+    async def run(self, fn: Callable[[WineDatabase], Any]) -> Any:
+        """Await fn(db) executed on a worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn)
+
+    def close(self):
+        """Shut down workers and close their connections."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for db in self._databases:
+                db.close()
+            self._databases = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
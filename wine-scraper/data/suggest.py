@@ -0,0 +1,102 @@
+"""In-memory prefix index over distinct catalog values, for type-ahead suggestions."""
+import bisect
+import heapq
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .db import WineDatabase
+
+# Fields offered for completion; grapes lists ("Merlot, Cabernet Sauvignon")
+# are split so each grape completes on its own
+SUGGEST_FIELDS = ('region', 'winery', 'grapes', 'country')
+SPLIT_FIELDS = {'grapes': ','}
+
+# Prefixes up to this many characters have their top completions precomputed;
+# longer ones select from a bisected range, which is short by then
+PRECOMPUTED_PREFIX = 3
+MAX_SUGGESTIONS = 25
+
+
+class PrefixIndex:
+    """
+    Per field, the distinct values sorted by their case-folded form, with the
+    number of wines carrying each.
+
+    suggest() answers with the most popular values starting with a prefix
+    (case-insensitively). Short prefixes, which match the most values, are
+    looked up in a table of precomputed top-MAX_SUGGESTIONS lists; longer ones
+    bisect the sorted keys and rank the matching range. version records the
+    catalog version the index was built from, for the caller to compare.
+    """
+
+    def __init__(self):
+        self.keys: Dict[str, List[str]] = {}
+        self.values: Dict[str, List[Tuple[str, int]]] = {}
+        self.top: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}
+        self.version: Any = None
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, Dict[str, int]], version: Any = None) -> 'PrefixIndex':
+        """Build from {field: {value: wine count}}."""
+        index = cls()
+        for field, field_counts in counts.items():
+            entries = sorted(((value.casefold(), value, n) for value, n in field_counts.items()))
+            index.keys[field] = [key for key, _, _ in entries]
+            index.values[field] = [(value, n) for _, value, n in entries]
+
+            # Most popular first, so each prefix list fills in rank order
+            top: Dict[str, List[Tuple[str, int]]] = {}
+            for key, value, n in sorted(entries, key=lambda e: (-e[2], e[0])):
+                for length in range(min(len(key), PRECOMPUTED_PREFIX) + 1):
+                    ranked = top.setdefault(key[:length], [])
+                    if len(ranked) < MAX_SUGGESTIONS:
+                        ranked.append((value, n))
+            index.top[field] = top
+        index.version = version
+        return index
+
+    @classmethod
+    def build(cls, db: WineDatabase, fields: Iterable[str] = SUGGEST_FIELDS, version: Any = None) -> 'PrefixIndex':
+        """Count distinct values of each field (one GROUP BY apiece)."""
+        if not db.conn:
+            db.connect()
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for field in fields:
+            field_counts: Dict[str, int] = {}
+            separator = SPLIT_FIELDS.get(field)
+            rows = db.conn.execute(f"""
+                SELECT {field}, COUNT(*) FROM wines
+                WHERE {field} IS NOT NULL AND {field} != ''
+                GROUP BY {field}
+            """)
+            for value, n in rows:
+                for part in (value.split(separator) if separator else [value]):
+                    part = part.strip()
+                    if part:
+                        field_counts[part] = field_counts.get(part, 0) + n
+            counts[field] = field_counts
+        return cls.from_counts(counts, version)
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys in self.keys.values())
+
+    def suggest(self, field: str, prefix: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Up to k values of field starting with prefix, most wines first."""
+        if field not in self.keys:
+            raise ValueError(f"Unknown suggest field: {field}")
+        k = max(0, min(k, MAX_SUGGESTIONS))
+        key = prefix.casefold()
+
+        if len(key) <= PRECOMPUTED_PREFIX:
+            ranked = self.top[field].get(key, [])
+        else:
+            ranked = self._ranked_range(field, key)
+
+        return [{'value': value, 'count': n} for value, n in ranked[:k]]
+
+    def _ranked_range(self, field: str, key: str) -> List[Tuple[str, int]]:
+        keys = self.keys[field]
+        lo = bisect.bisect_left(keys, key)
+        hi = bisect.bisect_left(keys, key + '\U0010ffff', lo)
+        return heapq.nlargest(MAX_SUGGESTIONS, self.values[field][lo:hi], key=lambda entry: entry[1])
+
@@ -0,0 +1,158 @@
+"""Offline hashed TF-IDF index for theme-to-wine retrieval without an LLM."""
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from .db import WineDatabase
+
+
+# Catalog columns that describe a wine, in the order they are indexed
+TEXT_COLUMNS = ['name', 'winery', 'region', 'country', 'grapes', 'wine_type']
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into',
+    'is', 'it', 'its', 'just', 'like', 'nothing', 'of', 'on', 'or', 'the', 'their',
+    'these', 'this', 'to', 'with', 'you', 'your', 'wine', 'wines', 'selection',
+}
+
+# Size of the hashed feature space. Large enough that distinct catalog
+# tokens almost never share a feature, which is what makes hashing safe.
+FEATURES = 1 << 20
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded unigrams and bigrams."""
+    folded = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+    words = [w for w in re.findall(r'[a-z0-9]+', folded) if len(w) > 1 and w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def feature(token: str) -> int:
+    """Stable feature id for a token (crc32, unlike hash(), isn't salted per process)."""
+    return zlib.crc32(token.encode()) % FEATURES
+
+
+class WineVectorIndex:
+    """
+    Sparse, L2-normalised TF-IDF vectors for every wine, stored feature-major.
+
+    For each hashed feature the index keeps the rows containing it and their
+    weights (a CSC matrix in plain NumPy arrays). A query gathers the postings
+    of its own features and sums them with one bincount, which scores the whole
+    catalog exactly while only touching rows that share a term with the query.
+    """
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.indptr = np.zeros(FEATURES + 1, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(FEATURES, dtype=np.float32)
+        self.catalog_version: Tuple[int, int] = (0, 0)
+
+    @classmethod
+    def build(cls, db: WineDatabase) -> 'WineVectorIndex':
+        """Vectorise the whole catalog."""
+        if not db.conn:
+            db.connect()
+
+        cursor = db.conn.cursor()
+        cursor.execute(f"SELECT id, {', '.join(TEXT_COLUMNS)} FROM wines ORDER BY id")
+
+        ids, row_idx, feats, tfs = [], [], [], []
+        for i, row in enumerate(cursor):
+            ids.append(row[0])
+            counts = Counter(feature(t) for t in tokenize(' '.join(str(v) for v in row[1:] if v)))
+            for feat, tf in counts.items():
+                row_idx.append(i)
+                feats.append(feat)
+                tfs.append(tf)
+
+        index = cls()
+        n = len(ids)
+        rows = np.array(row_idx, dtype=np.int32)
+        feats = np.array(feats, dtype=np.int64)
+
+        df = np.bincount(feats, minlength=FEATURES)
+        index.idf = np.where(df > 0, np.log((1 + n) / (1 + df)) + 1, 0).astype(np.float32)
+
+        weights = (1 + np.log(np.array(tfs, dtype=np.float32))) * index.idf[feats]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=n))
+        weights = (weights / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+
+        order = np.argsort(feats, kind='stable')
+        index.rows = rows[order]
+        index.weights = weights[order]
+        index.indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        index.ids = np.array(ids, dtype=np.int64)
+        index.catalog_version = db.catalog_version()
+        return index
+
+    def query(self, text: str, k: int = 100) -> List[Tuple[int, float]]:
+        """Return up to k (wine id, cosine score) pairs, best first."""
+        counts = Counter(feature(t) for t in tokenize(text))
+        feats = np.array([f for f in counts if self.idf[f] > 0], dtype=np.int64)
+        if not len(feats) or not len(self.ids):
+            return []
+
+        q = (1 + np.log(np.array([counts[f] for f in feats], dtype=np.float32))) * self.idf[feats]
+        q /= np.linalg.norm(q)
+
+        starts, ends = self.indptr[feats], self.indptr[feats + 1]
+        postings = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        scale = np.repeat(q, ends - starts)
+        scores = np.bincount(self.rows[postings], weights=self.weights[postings] * scale, minlength=len(self.ids))
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[r]), float(scores[r])) for r in top]
+
+    def save(self, path: str):
+        """Write the index to a .npz file."""
+        np.savez_compressed(
+            path,
+            ids=self.ids,
+            indptr=self.indptr,
+            rows=self.rows,
+            weights=self.weights,
+            idf=self.idf,
+            catalog_version=np.array(self.catalog_version, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'WineVectorIndex':
+        data = np.load(path)
+        index = cls()
+        index.ids = data['ids']
+        index.indptr = data['indptr']
+        index.rows = data['rows']
+        index.weights = data['weights']
+        index.idf = data['idf']
+        index.catalog_version = tuple(int(v) for v in data['catalog_version'])
+        return index
+
+
+def index_path(db_path) -> Path:
+    """Where the vector index for a database lives (next to it)."""
+    return Path(db_path).with_suffix('.vec.npz')
+
+
+def load_or_build(db: WineDatabase) -> WineVectorIndex:
+    """Load the saved index, rebuilding it if missing or built from another catalog version."""
+    path = index_path(db.db_path)
+    if path.exists():
+        index = WineVectorIndex.load(str(path))
+        if index.catalog_version == db.catalog_version():
+            return index
+
+    index = WineVectorIndex.build(db)
+    index.save(str(path))
+    return index
@@ -0,0 +1,60 @@
+"""Shared fixtures: a small synthetic catalog in a temporary database."""
+import os
+import random
+import sys
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.db import WineDatabase
+
+COUNTRIES = ['France', 'Italy', 'Spain', 'USA', 'Chile']
+TYPES = ['red', 'white', 'rose', 'sparkling']
+GRAPES = ['Merlot', 'Chardonnay', 'Pinot Noir', 'Riesling', 'Syrah']
+
+
+def synthetic_wines(n: int, seed: int = 0):
+    """n wines with varied countries, types, grapes, ratings and prices."""
+    rng = random.Random(seed)
+    return [
+        {
+            'wine_id': f'w{i}',
+            'name': f'Cuvee {i} {rng.choice(GRAPES)}',
+            'winery': f'Winery {i % 97}',
+            'region': f'Region {i % 13}',
+            'country': rng.choice(COUNTRIES),
+            'vintage': rng.randint(1990, 2022),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'num_reviews': rng.randint(0, 2000),
+            'price_usd': round(rng.uniform(5, 300), 2),
+            'wine_type': rng.choice(TYPES),
+            'grapes': rng.choice(GRAPES),
+        }
+        for i in range(n)
+    ]
+
+
+def build_catalog(path: str, n: int) -> str:
+    db = WineDatabase(path)
+    db.connect()
+    db.initialize_schema()
+    db.insert_wines(synthetic_wines(n), source='test')
+    db.initialize_shipments_schema()
+    db.close()
+    return path
+
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    """Path of a fresh 500-wine catalog."""
+    return build_catalog(str(tmp_path / 'wines.db'), 500)
+
+
+@pytest.fixture
+def db(catalog_path):
+    db = WineDatabase(catalog_path)
+    db.connect()
+    yield db
+    db.close()
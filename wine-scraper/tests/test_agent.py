@@ -0,0 +1,41 @@
+"""WineAgent selection paths driven by the stub LLM client."""
+import json
+
+from agent.core import WineAgent
+from agent.stub import StubClient
+from themes.presets import THEMES, Theme
+
+
+def test_agentic_selection_resolves_ids_and_closes_connection(db, catalog_path):
+    wine = db.get_wine_by_id(5)
+    script = [{'text': json.dumps({'wines': [{'name': wine['name'], 'winery': wine['winery']}]})}]
+    agent = WineAgent(db_path=catalog_path, llm_client=StubClient(script), club='club')
+
+    wines = agent.select_for_theme(THEMES[0])
+
+    assert [w['id'] for w in wines] == [5]
+    assert 'selection_reason' in wines[0]
+    assert agent.db.conn is None
+
+
+def test_value_order_holds_on_every_deterministic_path(db, catalog_path):
+    matching = db.conn.execute("SELECT COUNT(*) FROM wines WHERE price_usd <= 40").fetchone()[0]
+    best_value = [row[0] for row in db.conn.execute(
+        "SELECT id FROM wines WHERE price_usd <= 40 ORDER BY value_score DESC, rating DESC LIMIT 5"
+    )]
+    assert matching < 100  # so a sample of 100 holds every match
+
+    agent = WineAgent(agentic=False, db_path=catalog_path)
+    for sampling in ({}, {'stratify': 'country'}):
+        theme = Theme(name='Value', description='Cheap and good.', criteria={'max_price': 40.0},
+                      wine_count=5, sampling=sampling, order_by='value')
+        assert [w['id'] for w in agent.select_for_theme(theme)] == best_value
+
+
+def test_agentic_curation_is_told_the_theme_order(catalog_path):
+    client = StubClient([{'text': json.dumps({'wines': []})}])
+    theme = Theme(name='Value', description='Cheap and good.', criteria={}, wine_count=3, order_by='value')
+
+    WineAgent(db_path=catalog_path, llm_client=client).select_for_theme(theme)
+
+    assert "sort='value'" in client.calls[0]['messages'][0]['content']
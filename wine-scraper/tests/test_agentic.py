@@ -0,0 +1,78 @@
+"""The async agentic loop, driven by the stub LLM client."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent import agentic
+from agent.agentic import curate_themes, select_wines_agentic_async
+from agent.stub import StubClient, curation_script
+from themes.presets import THEMES
+
+
+class CountingStub(StubClient):
+    """StubClient that records how many calls were in flight at once."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = self.peak = 0
+
+    async def _create(self, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super()._create(**kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def test_stub_drives_multi_tool_turns(catalog_path):
+    client = StubClient(curation_script([3, 1, 2], searches=2))
+
+    wines = asyncio.run(select_wines_agentic_async('Test', 'Anything.', 2, client=client, db_path=catalog_path))
+
+    assert [w['id'] for w in wines] == [3, 1]
+    assert len(client.calls) == 3
+    # Each later request answers every tool_use block of the previous turn
+    for call in client.calls[1:]:
+        assistant, results = call['messages'][-2:]
+        asked = [block['id'] for block in assistant['content'] if block['type'] == 'tool_use']
+        answered = [block['tool_use_id'] for block in results['content']]
+        assert len(asked) == 3 and answered == asked
+        assert not any(block['is_error'] for block in results['content'])
+
+
+def test_tool_calls_in_a_turn_run_concurrently(catalog_path, monkeypatch):
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def slow_search(db, args):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.2)
+        with lock:
+            running[0] -= 1
+        return []
+
+    _, encode = agentic.TOOL_HANDLERS['search_wines']
+    monkeypatch.setitem(agentic.TOOL_HANDLERS, 'search_wines', (slow_search, encode))
+
+    start = time.perf_counter()
+    asyncio.run(select_wines_agentic_async(
+        'Test', 'Anything.', 2, client=StubClient(curation_script([1, 2], searches=2)), db_path=catalog_path
+    ))
+
+    assert peak[0] == 3
+    assert time.perf_counter() - start < 1.0  # two turns of 0.2s, not six
+
+
+@pytest.mark.parametrize('limit', [1, 3])
+def test_themes_curated_under_a_bound(catalog_path, limit):
+    client = CountingStub(curation_script([1, 2, 3], searches=1), latency=0.05)
+
+    results = curate_themes(THEMES[:4], max_concurrency=limit, client=client, db_path=catalog_path)
+
+    assert set(results) == {theme.name for theme in THEMES[:4]}
+    assert all([w['id'] for w in wines] == [1, 2, 3] for wines in results.values())
+    assert client.peak == limit
@@ -0,0 +1,79 @@
+"""Box optimizer: large pools, small boxes and optimality on small instances."""
+import itertools
+import random
+import time
+
+from agent.box import box_value, optimize_box, type_minimums
+
+
+def random_wines(n, rng):
+    return [
+        {
+            'id': i,
+            'rating': round(rng.uniform(3, 5), 1),
+            'price_usd': round(rng.uniform(5, 80), 2),
+            'wine_type': rng.choice(['red', 'white', 'rose']),
+            'region': rng.choice('abcd'),
+        }
+        for i in range(n)
+    ]
+
+
+def brute_force(wines, count, budget, rules):
+    minimums = type_minimums(count, rules)
+    best = float('-inf')
+    for box in itertools.combinations(wines, count):
+        if sum(w['price_usd'] for w in box) > budget:
+            continue
+        if any(sum(w['wine_type'] == t for w in box) < m for t, m in minimums.items()):
+            continue
+        best = max(best, box_value(list(box), rules))
+    return best
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    for rules in ({}, {'mix_types': True}, {'mix_types': True, 'vary_region': True}):
+        for _ in range(20):
+            wines = random_wines(12, rng)
+            count, budget = rng.randint(2, 4), rng.uniform(40, 200)
+            box = optimize_box(wines, count, budget, rules, time_limit=5)
+            expected = brute_force(wines, count, budget, rules)
+            if expected == float('-inf'):
+                assert box == []
+            else:
+                assert len(box) == count
+                assert sum(w['price_usd'] for w in box) <= budget
+                assert abs(box_value(box, rules) - expected) < 1e-9
+
+
+def test_large_pool_of_unaffordable_wines():
+    # Every $100 wine is under budget but none fits a 12-bottle box; the
+    # search must get through them without one stack frame per candidate
+    wines = [{'id': i, 'rating': 4.5, 'price_usd': 100, 'wine_type': 'red'} for i in range(1100)]
+    wines += [{'id': 2000 + i, 'rating': 3.5, 'price_usd': 10, 'wine_type': 'white'} for i in range(20)]
+
+    box = optimize_box(wines, 12, 150)
+
+    assert len(box) == 12
+    assert all(w['price_usd'] == 10 for w in box)
+
+
+def test_time_limit_bounds_large_pools():
+    rng = random.Random(1)
+    wines = [{'id': i, 'rating': rng.uniform(3, 5), 'price_usd': rng.uniform(5, 300),
+              'wine_type': rng.choice(['red', 'white'])} for i in range(5000)]
+
+    start = time.perf_counter()
+    box = optimize_box(wines, 12, 300, {'mix_types': True}, time_limit=0.2)
+
+    assert len(box) == 12
+    assert time.perf_counter() - start < 1.0
+
+
+def test_single_bottle_mixed_box():
+    wines = [{'id': 1, 'rating': 4.0, 'price_usd': 20, 'wine_type': 'white'}]
+
+    assert type_minimums(1, {'mix_types': True}) == {}
+    assert optimize_box(wines, 1, 30, {'mix_types': True}) == wines
+    assert type_minimums(2, {'mix_types': True}) == {'red': 1, 'white': 1}
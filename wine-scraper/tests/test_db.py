@@ -0,0 +1,14 @@
+"""WineDatabase lookups."""
+
+
+def test_long_id_lists_keep_order_and_transactions(db):
+    ids = list(range(500, 0, -1)) + [10_000] + list(range(1, 101))
+    db.conn.execute("BEGIN")
+    db.conn.execute("INSERT INTO shipped_wines (club, wine_id) VALUES ('club', 1)")
+
+    wines = db.get_wines_by_ids(ids)
+
+    assert [w['id'] for w in wines] == [i for i in ids if i != 10_000]
+    assert db.conn.in_transaction  # the caller's transaction is left open
+    db.conn.rollback()
+    assert not db.was_shipped('club', 1)
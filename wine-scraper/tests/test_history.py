@@ -0,0 +1,61 @@
+"""Shipment history: Bloom filter updates share the shipment's write lock."""
+import sqlite3
+
+from data.db import WineDatabase
+from data.history import ShipmentHistory
+
+
+def test_filter_update_holds_write_lock(db, catalog_path):
+    seen = {}
+
+    def update(state):
+        seen['in_transaction'] = db.conn.in_transaction
+        other = sqlite3.connect(catalog_path, timeout=0.1)
+        try:
+            other.execute("INSERT INTO shipped_wines (club, wine_id) VALUES ('other', 1)")
+            seen['blocked'] = False
+        except sqlite3.OperationalError:
+            seen['blocked'] = True
+        finally:
+            other.close()
+        return (1024, 1, bytes(2048))
+
+    db.record_shipment('club', [1], update_filter=update)
+
+    assert seen == {'in_transaction': True, 'blocked': True}
+    assert db.load_shipment_filter('club')[:2] == (1024, 1)
+
+    # Once committed, other writers get through
+    other = sqlite3.connect(catalog_path, timeout=0.1)
+    other.execute("INSERT INTO shipped_wines (club, wine_id) VALUES ('other', 1)")
+    other.commit()
+    other.close()
+
+
+def test_recorders_keep_each_others_filters(db, catalog_path):
+    second = WineDatabase(catalog_path)
+    second.connect()
+    try:
+        first_history, second_history = ShipmentHistory(db), ShipmentHistory(second)
+        first_history.record('club', [1, 2])
+        second_history.record('club', [3])
+
+        fresh = ShipmentHistory(db)
+        assert all(fresh.was_shipped('club', wine_id) for wine_id in (1, 2, 3))
+        assert fresh.count('club') == 3
+        assert not fresh.was_shipped('club', 4)
+    finally:
+        second.close()
+
+
+def test_shipped_count_is_distinct_and_filtered(db):
+    history = ShipmentHistory(db)
+    french = [row[0] for row in db.conn.execute("SELECT id FROM wines WHERE country = 'France' LIMIT 5")]
+    italian = [row[0] for row in db.conn.execute("SELECT id FROM wines WHERE country = 'Italy' LIMIT 3")]
+    history.record('club', french + italian)
+    history.record('club', french)  # re-sent wines count once
+
+    assert db.shipped_count('club') == 8
+    assert db.shipped_count('club', country='France') == 5
+    assert db.shipped_count('club', country='Spain') == 0
+    assert db.shipped_count('other') == 0
@@ -0,0 +1,23 @@
+"""Query planner estimates with and without column statistics."""
+from data.planner import DEFAULT_SELECTIVITY, FTS_FIRST, INDEX_FIRST
+
+
+def test_defaults_without_statistics(db):
+    assert not db.planner.has_stats()
+
+    plan = db.planner.plan('merlot', {'max_price': 50, 'country': 'France'})
+
+    assert plan['selectivity'] == {'price': DEFAULT_SELECTIVITY, 'country': DEFAULT_SELECTIVITY}
+    assert plan['fts_matches'] == int(db.planner.total_rows() * DEFAULT_SELECTIVITY)
+    assert plan['cost_us'][INDEX_FIRST] > 0 and plan['cost_us'][FTS_FIRST] > 0
+
+
+def test_estimates_from_statistics(db):
+    db.refresh_column_stats()
+
+    plan = db.planner.plan('merlot', {'max_price': 50})
+    merlot = db.conn.execute("SELECT COUNT(*) FROM wines_fts WHERE wines_fts MATCH 'merlot'").fetchone()[0]
+    cheap = db.conn.execute("SELECT COUNT(*) FROM wines WHERE price_usd <= 50").fetchone()[0]
+
+    assert plan['fts_matches'] == merlot
+    assert abs(plan['selectivity']['price'] - cheap / 500) < 0.02
@@ -0,0 +1,160 @@
+"""LLM scheduler: token buckets, backoff, in-flight cap and priorities."""
+import asyncio
+import time
+
+import pytest
+
+from agent.scheduler import BATCH, INTERACTIVE, LLMScheduler, SqliteTokenBucket, TokenBucket
+from agent.stub import StubResponse, StubUsage
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """messages.create that fails with the queued statuses first, then answers after `latency`."""
+
+    def __init__(self, failures=(), latency: float = 0.0):
+        self.messages = self
+        self.failures = list(failures)
+        self.latency = latency
+        self.started = []
+        self.in_flight = self.peak = 0
+
+    async def create(self, **kwargs):
+        self.started.append(kwargs.get('tag'))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if self.failures:
+                raise StatusError(self.failures.pop(0))
+            return StubResponse(content=[], stop_reason='end_turn', usage=StubUsage(10, 10))
+        finally:
+            self.in_flight -= 1
+
+
+def scheduler(client, **options) -> LLMScheduler:
+    """A scheduler with short backoffs and a request budget that refills in milliseconds."""
+    defaults = {'requests_per_minute': 6000, 'base_delay': 0.01, 'max_delay': 0.05}
+    return LLMScheduler(client, **{**defaults, **options})
+
+
+def test_token_bucket_makes_over_budget_callers_wait():
+    bucket = TokenBucket(capacity=2, rate=10)
+
+    assert bucket.try_acquire(1) == 0
+    assert bucket.try_acquire(1) == 0
+    assert bucket.try_acquire(1) == pytest.approx(0.1, abs=0.02)
+    # Batch work leaves a reserve untouched
+    reserved = TokenBucket(capacity=10, rate=1)
+    assert reserved.try_acquire(5) == 0
+    assert reserved.try_acquire(4, reserve=0.2) > 0
+
+
+def test_sqlite_buckets_share_one_budget(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    first = SqliteTokenBucket(path, 'requests', capacity=2, rate=0.01)
+    second = SqliteTokenBucket(path, 'requests', capacity=2, rate=0.01)
+
+    assert first.try_acquire(1) == 0
+    assert second.try_acquire(1) == 0
+    assert first.try_acquire(1) > 0
+
+
+def test_over_budget_calls_are_delayed():
+    sched = scheduler(FakeClient())
+    sched.requests = TokenBucket(capacity=2, rate=20)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(sched.create(messages=[]) for _ in range(4)))
+        return time.perf_counter() - start
+
+    # Two calls fit the bucket; the other two wait ~50ms each for a refill
+    assert asyncio.run(run()) >= 0.09
+    assert sched.stats['calls'] == 4
+
+
+def test_retryable_errors_back_off_and_retry():
+    client = FakeClient(failures=[429, 503])
+    sched = scheduler(client)
+
+    # Interactive: batch calls would also wait for the drained bucket to
+    # refill past their reserve
+    response = asyncio.run(sched.create(INTERACTIVE, messages=[]))
+
+    assert response.stop_reason == 'end_turn'
+    assert sched.stats == {'calls': 3, 'retries': 2, 'rate_limited': 1, 'failures': 0}
+
+
+def test_other_errors_are_not_retried():
+    sched = scheduler(FakeClient(failures=[400]))
+
+    with pytest.raises(StatusError):
+        asyncio.run(sched.create(messages=[]))
+    assert sched.stats['calls'] == 1 and sched.stats['failures'] == 1
+
+
+def test_in_flight_cap():
+    client = FakeClient(latency=0.02)
+    sched = scheduler(client, max_in_flight=2)
+
+    async def run():
+        await asyncio.gather(*(sched.create(messages=[]) for _ in range(6)))
+
+    asyncio.run(run())
+    assert client.peak == 2
+
+
+def test_interactive_calls_go_ahead_of_batch():
+    client = FakeClient(latency=0.05)
+    sched = scheduler(client, max_in_flight=1)
+
+    async def run():
+        first = asyncio.create_task(sched.create(BATCH, tag='first', messages=[]))
+        await asyncio.sleep(0.01)  # first is in flight; the next two queue
+        batch = asyncio.create_task(sched.create(BATCH, tag='batch', messages=[]))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(sched.create(INTERACTIVE, tag='interactive', messages=[]))
+        await asyncio.gather(first, batch, interactive)
+
+    asyncio.run(run())
+    assert client.started == ['first', 'interactive', 'batch']
+
+
+def test_curation_through_fake_api_survives_429s(catalog_path):
+    anthropic = pytest.importorskip('anthropic')
+    from agent.agentic import select_wines_agentic_async
+    from benchmarks.fake_llm_server import FakeLLMServer
+
+    class FlakyServer(FakeLLMServer):
+        """Answers the first request with a 429 (Retry-After: 1)."""
+
+        async def handle_messages(self, request):
+            if not self.stats['429_injected']:
+                self.stats['429_injected'] += 1
+                return self._error(429, 'rate_limit_error', 'injected rate limit', 1)
+            return await super().handle_messages(request)
+
+    async def run():
+        server = FlakyServer(latency=0.01, jitter=0.0)
+        sdk = anthropic.AsyncAnthropic(base_url=await server.start(), api_key='fake', max_retries=0)
+        sched = scheduler(sdk)
+        try:
+            wines = await select_wines_agentic_async(
+                'Test', 'Anything.', 3, client=sched.client(INTERACTIVE), db_path=catalog_path
+            )
+            return wines, sched.stats, server.stats
+        finally:
+            await sdk.close()
+            await server.stop()
+
+    wines, stats, server_stats = asyncio.run(run())
+
+    assert [w['id'] for w in wines] == [1, 2, 3]
+    assert stats['rate_limited'] == 1 and stats['failures'] == 0
+    assert server_stats['ok'] == 2  # one search turn, then the selection
@@ -0,0 +1,52 @@
+"""/api/search streaming: flat memory for NDJSON, and caching per negotiated format."""
+import pytest
+
+from benchmarks.search_stream_memory import FLAT_TOLERANCE, measure
+from tests.conftest import build_catalog
+from web.app import create_app
+
+LARGE = 20_000
+
+
+@pytest.fixture(scope='module')
+def large_client(tmp_path_factory):
+    path = build_catalog(str(tmp_path_factory.mktemp('large') / 'wines.db'), LARGE)
+    return create_app(db_path=path, response_cache_size=0, search_limits={'json': LARGE}).test_client()
+
+
+def test_ndjson_peak_memory_stays_flat(large_client):
+    small_rows, _, small_peak, _ = measure(large_client, '/api/search?format=ndjson&limit=1000')
+    large_rows, _, large_peak, _ = measure(large_client, f'/api/search?format=ndjson&limit={LARGE}')
+    _, _, json_peak, _ = measure(large_client, f'/api/search?limit={LARGE}')
+
+    assert (small_rows, large_rows) == (1000, LARGE)
+    assert large_peak <= small_peak * FLAT_TOLERANCE
+    # The same rows as one JSON document are held in memory all at once
+    assert json_peak > 5 * large_peak
+
+
+def test_gzip_stream_holds_every_row(large_client):
+    rows, size, _, _ = measure(large_client, '/api/search?format=ndjson&limit=5000', {'Accept-Encoding': 'gzip'})
+    _, plain_size, _, _ = measure(large_client, '/api/search?format=ndjson&limit=5000')
+
+    assert rows == 5000 and size < plain_size / 3
+
+
+def test_etag_and_vary_follow_the_negotiated_format(catalog_path):
+    client = create_app(db_path=catalog_path).test_client()
+    url = '/api/search?q=cuvee&limit=5'
+
+    as_json = client.get(url)
+    as_ndjson = client.get(url, headers={'Accept': 'application/x-ndjson'})
+    as_ndjson.close()  # finish the stream
+
+    assert as_json.mimetype == 'application/json'
+    assert as_ndjson.mimetype == 'application/x-ndjson'
+    assert 'Accept' in as_json.headers['Vary'] and 'Accept' in as_ndjson.headers['Vary']
+    assert as_json.headers['ETag'] != as_ndjson.headers['ETag']
+
+    # A client's JSON ETag doesn't validate the NDJSON representation
+    revalidated = client.get(url, headers={'Accept': 'application/x-ndjson', 'If-None-Match': as_json.headers['ETag']})
+    revalidated.close()
+    assert revalidated.status_code == 200 and revalidated.mimetype == 'application/x-ndjson'
+    assert client.get(url, headers={'If-None-Match': as_json.headers['ETag']}).status_code == 304
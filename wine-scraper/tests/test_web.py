@@ -0,0 +1,96 @@
+"""Flask API: search responses, facets, selection progress and connection handling."""
+import json
+import sqlite3
+import time
+
+import pytest
+
+from agent.stub import StubClient, curation_script
+from data.db import WineDatabase
+from themes.presets import THEMES
+from web.app import create_app
+
+
+@pytest.fixture
+def client(catalog_path):
+    return create_app(db_path=catalog_path, response_cache_size=0).test_client()
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every connection WineDatabase opens during the test."""
+    opened = []
+    connect = WineDatabase.connect
+
+    def tracking_connect(self, *args, **kwargs):
+        opened.append(connect(self, *args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(WineDatabase, 'connect', tracking_connect)
+    return opened
+
+
+def is_open(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.execute("SELECT 1")
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+
+def test_search_with_facets_closes_connections(client, connections):
+    response = client.get('/api/search?q=cuvee&facets=country,wine_type')
+
+    assert response.status_code == 200
+    assert set(response.get_json()['facets']) == {'country', 'wine_type'}
+    assert connections and not any(is_open(conn) for conn in connections)
+
+
+def test_facets_count_the_listed_wines(client):
+    # Wine i is indexed under i, i % 97 and i % 13, so none has both 17 and
+    # 18: ranked search falls back to any word, and the facets must count
+    # that same match set (10 wines, all listed)
+    body = client.get('/api/search?q=17%2018&facets=country&limit=20').get_json()
+
+    counts = {bucket['value']: bucket['count'] for bucket in body['facets']['country']}
+    assert body['count'] == 10
+    assert sum(counts.values()) == body['count']
+    assert all(counts.get(wine['country'], 0) > 0 for wine in body['wines'])
+
+
+def sse_events(chunks):
+    """(event, data, seconds since start) for each event in an SSE body."""
+    start = time.perf_counter()
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                yield fields['event'], json.loads(fields['data']), time.perf_counter() - start
+
+
+def test_selection_progress_streams_before_the_loop_ends(catalog_path):
+    stub = StubClient(curation_script([1, 2, 3], searches=2), latency=0.2)
+    client = create_app(db_path=catalog_path, llm_client=stub).test_client()
+
+    created = client.post('/api/selections', json={'theme': THEMES[0].name})
+    assert created.status_code == 202
+    job_id = created.get_json()['job']['id']
+
+    response = client.get(f'/api/selections/{job_id}/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    events = list(sse_events(response.response))
+    names = [name for name, _, _ in events]
+
+    assert names[-2:] == ['selection', 'done']
+    assert names.count('tool_call') == 6 and 'candidates' in names
+    first_call = next((data, at) for name, data, at in events if name == 'tool_call')
+    assert first_call[0]['tool'] == 'search_wines' and first_call[0]['count'] is not None
+    # The first result arrives after one model call, not the whole loop (three)
+    assert first_call[1] < events[-1][2] / 2
+
+    # Reconnecting with Last-Event-ID replays only what came after it
+    replay = client.get(f'/api/selections/{job_id}/events', headers={'Last-Event-ID': str(len(events) - 2)})
+    assert [name for name, _, _ in sse_events([replay.data])] == ['done']
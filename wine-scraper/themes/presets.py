@@ -11,6 +11,28 @@ class Theme:
     criteria: Dict[str, Any]
     wine_count: int
     diversity_rules: Dict[str, Any] = field(default_factory=dict)
+    # Optional soft criteria scored over the whole catalog (see agent/scoring.py).
+    # When set, candidates are the top-scoring wines instead of SQL criteria matches.
+    scoring: Dict[str, Any] = field(default_factory=dict)
+    # Optional random sampling of candidates for variety themes, passed to
+    # WineDatabase.sample_wines, e.g. {"stratify": "country"}.
+    sampling: Dict[str, Any] = field(default_factory=dict)
+    # Order candidates are preferred in: 'rating' or 'value' (rating per
+    # dollar), as in WineDatabase SEARCH_ORDERS. Every selection path honours
+    # it; agentic curation is asked to via curation_brief().
+    order_by: str = 'rating'
+
+    def curation_brief(self) -> str:
+        """The description given to agentic curation, plus the theme's order preference."""
+        hint = ORDER_BRIEFS.get(self.order_by)
+        return f"{self.description} {hint}" if hint else self.description
+
+
+# Agentic curation hints for themes not ordered by rating
+ORDER_BRIEFS = {
+    'value': "Favour value for money: compare candidates by rating per dollar (search with sort='value').",
+    'availability': "Favour wines that are easy to find (search with sort='availability').",
+}
 
 
 # 100 Pre-defined Wine Themes
@@ -428,7 +450,8 @@ THEMES = [
         description="High-quality, affordable wines perfect for casual gatherings.",
         criteria={"max_price": 20.0, "min_rating": 3.5},
         wine_count=15,
-        diversity_rules={"vary_country": True, "mix_types": True}
+        diversity_rules={"vary_country": True, "mix_types": True},
+        order_by="value"
     ),
 
     Theme(
@@ -436,7 +459,8 @@ THEMES = [
         description="Best value wines in the mid-price range.",
         criteria={"min_rating": 3.5},
         wine_count=12,
-        diversity_rules={"vary_country": True, "mix_types": True}
+        diversity_rules={"vary_country": True, "mix_types": True},
+        scoring={"price": {"target": 30.0, "tolerance": 10.0, "weight": 1.0}, "rating": {"weight": 2.0}, "filters": {"min_rating": 3.0}}
     ),
 
     Theme(
@@ -444,7 +468,8 @@ THEMES = [
         description="Special occasion wines with complexity and age-worthiness.",
         criteria={"min_rating": 3.5},
         wine_count=10,
-        diversity_rules={"vary_country": True, "vary_grapes": True}
+        diversity_rules={"vary_country": True, "vary_grapes": True},
+        scoring={"price": {"target": 60.0, "tolerance": 20.0, "weight": 1.0}, "rating": {"weight": 2.0}, "reviews": {"weight": 0.5}}
     ),
 
     Theme(
@@ -452,7 +477,8 @@ THEMES = [
         description="Investment-grade wines from prestigious producers.",
         criteria={"min_rating": 3.6},
         wine_count=8,
-        diversity_rules={"vary_country": True}
+        diversity_rules={"vary_country": True},
+        scoring={"price": {"target": 115.0, "tolerance": 35.0, "weight": 1.0}, "rating": {"weight": 2.0}, "reviews": {"weight": 0.5}}
     ),
 
     Theme(
@@ -460,7 +486,8 @@ THEMES = [
         description="Iconic wines for collectors and special celebrations.",
         criteria={"min_rating": 3.5},
         wine_count=6,
-        diversity_rules={"vary_country": True}
+        diversity_rules={"vary_country": True},
+        scoring={"price": {"target": 250.0, "tolerance": 100.0, "weight": 1.0}, "rating": {"weight": 2.0}, "filters": {"min_price": 150.0}}
     ),
 
     Theme(
@@ -468,7 +495,8 @@ THEMES = [
         description="Exceptional everyday drinking wines on a budget.",
         criteria={"max_price": 15.0, "min_rating": 3.6},
         wine_count=12,
-        diversity_rules={"vary_country": True, "mix_types": True}
+        diversity_rules={"vary_country": True, "mix_types": True},
+        order_by="value"
     ),
 
     Theme(
@@ -484,7 +512,8 @@ THEMES = [
         description="Affordable Bordeaux from lesser-known appellations.",
         criteria={"region": "Bordeaux", "max_price": 30.0, "min_rating": 3.6},
         wine_count=8,
-        diversity_rules={"vary_winery": True}
+        diversity_rules={"vary_winery": True},
+        order_by="value"
     ),
 
     Theme(
@@ -704,7 +733,8 @@ THEMES = [
         description="Diverse wines for a fun guessing game.",
         criteria={"min_rating": 3.5, "max_price": 38.0},
         wine_count=12,
-        diversity_rules={"vary_country": True, "mix_types": True, "vary_grapes": True}
+        diversity_rules={"vary_country": True, "mix_types": True, "vary_grapes": True},
+        sampling={"stratify": "country"}
     ),
 
     Theme(
@@ -826,7 +856,8 @@ THEMES = [
         description="Obscure, rare, and conversation-starting wines.",
         criteria={"min_rating": 3.5, "max_price": 38.0},
         wine_count=12,
-        diversity_rules={"vary_country": True, "vary_grapes": True, "mix_types": True}
+        diversity_rules={"vary_country": True, "vary_grapes": True, "mix_types": True},
+        sampling={"stratify": "country"}
     ),
 ]
 
@@ -0,0 +1,151 @@
+"""Admission control: per-route-class concurrency limits with bounded queues."""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Mapping, Optional
+
+from data.metrics import REGISTRY
+
+# WSGI environ key set by a server that already admitted the request
+ADMITTED_ENVIRON_KEY = 'wine.admitted'
+
+ADMISSIONS = REGISTRY.counter(
+    'wine_admission_total', 'Requests through admission control by route class and outcome.',
+    ['route_class', 'result'])
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    'wine_admission_wait_seconds', 'Time admitted requests spent queued.', ['route_class'])
+ADMISSION_REQUESTS = REGISTRY.gauge(
+    'wine_admission_requests', 'Requests per route class running or queued.', ['route_class', 'state'])
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed: its class's queue is full or it waited too long."""
+
+    def __init__(self, route_class: str, reason: str, retry_after: int):
+        super().__init__(f"Too many {route_class} requests in progress ({reason}), please retry shortly")
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Limit:
+    """At most `concurrency` requests run at once; up to `queue` more wait for `timeout` seconds."""
+    concurrency: int
+    queue: int
+    timeout: float
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.timeout))
+
+
+class Gate:
+    """
+    The slots of one route class. Waiters queue in arrival order and a
+    release hands its slot straight to the oldest, so a steady stream of
+    new requests can't overtake them. enter() blocks a thread; enter_async()
+    waits on the event loop. release() may be called from any thread.
+    """
+
+    def __init__(self, name: str, limit: Limit):
+        self.name = name
+        self.limit = limit
+        self.running = 0
+        self._waiters: Deque[Callable[[], None]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def enter(self):
+        """Take a slot, waiting up to limit.timeout; raises Overloaded if shed."""
+        start = time.perf_counter()
+        event = threading.Event()
+        wake = event.set
+        if self._try_enter(wake):
+            return
+        if not event.wait(self.limit.timeout) and self._abandon(wake):
+            raise self._shed('timed out in queue', 'timeout')
+        self._admitted_after(start)
+
+    async def enter_async(self):
+        """enter() for a coroutine: queued requests hold no thread."""
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        if self._try_enter(wake):
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(admitted), self.limit.timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(wake):
+                raise self._shed('timed out in queue', 'timeout')
+            # A slot was handed over as the wait ran out: keep it
+        except asyncio.CancelledError:
+            if not self._abandon(wake):
+                self.release()
+            raise
+        self._admitted_after(start)
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.running -= 1
+                return
+            wake = self._waiters.popleft()
+        wake()
+
+    def _try_enter(self, wake: Callable[[], None]) -> bool:
+        """True if a slot was free; otherwise queue wake, or raise if the queue is full."""
+        with self._lock:
+            if self.running < self.limit.concurrency:
+                self.running += 1
+                admitted = True
+            elif len(self._waiters) < self.limit.queue:
+                self._waiters.append(wake)
+                admitted = False
+            else:
+                raise self._shed('queue full', 'rejected')
+        if admitted:
+            ADMISSIONS.inc(route_class=self.name, result='admitted')
+        return admitted
+
+    def _abandon(self, wake: Callable[[], None]) -> bool:
+        """Drop a waiter that gave up; False if a release already handed it a slot."""
+        with self._lock:
+            try:
+                self._waiters.remove(wake)
+                return True
+            except ValueError:
+                return False
+
+    def _admitted_after(self, start: float):
+        ADMISSIONS.inc(route_class=self.name, result='queued')
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, route_class=self.name)
+
+    def _shed(self, reason: str, result: str) -> Overloaded:
+        ADMISSIONS.inc(route_class=self.name, result=result)
+        return Overloaded(self.name, reason, self.limit.retry_after)
+
+
+class AdmissionControl:
+    """A Gate per limited route class; requests of other classes are always admitted."""
+
+    def __init__(self, limits: Mapping[str, Optional[Limit]]):
+        self.gates: Dict[str, Gate] = {name: Gate(name, limit) for name, limit in limits.items() if limit}
+
+    def gate(self, route_class: Optional[str]) -> Optional[Gate]:
+        return self.gates.get(route_class) if route_class else None
+
+    def record_gauges(self):
+        for name, gate in self.gates.items():
+            ADMISSION_REQUESTS.set(gate.running, route_class=name, state='running')
+            ADMISSION_REQUESTS.set(gate.queued, route_class=name, state='queued')
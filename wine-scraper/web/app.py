@@ -1,33 +1,264 @@
 """Flask web application for wine selection."""
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context, url_for
+import json
 import sys
 import os
+import threading
+import time
+from typing import Dict, Optional
+
+from werkzeug.exceptions import HTTPException
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agent.core import WineAgent
+from data.metrics import REGISTRY
+from data.suggest import MAX_SUGGESTIONS, SUGGEST_FIELDS, PrefixIndex
 from themes.presets import get_all_themes, get_theme_by_name, Theme
-from data.db import WineDatabase
+from data.db import FACET_EXPRESSIONS, SEARCH_ORDERS, WineDatabase
+from web.admission import ADMITTED_ENVIRON_KEY, AdmissionControl, Limit, Overloaded
+from web.cache import ResponseCache, cached_json
+from web.jobs import DONE, FAILED, QueueFull, SelectionJobs
+from web.page_cache import PageCache, fingerprint
+from web.streaming import gzip_chunks, ndjson_chunks
+
+# Most ids accepted by one /api/wines request
+MAX_BATCH_IDS = 1000
+
+# Cache-Control max-age (seconds) per JSON route. The catalog only changes on
+# load, and ETags let clients revalidate cheaply after expiry.
+CACHE_MAX_AGE = {
+    'search': 60,
+    'wine': 3600,
+    'stats': 300,
+    'suggest': 300,
+}
+
+# How long /theme/<name> waits for its selection job before serving a
+# self-refreshing "selecting" page instead (fast selections render directly)
+THEME_PAGE_WAIT = 1.0
+THEME_PAGE_REFRESH = 2
+
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15.0
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'wine_http_request_duration_seconds', 'Request latency per route, until the body is fully sent.',
+    ['route', 'method'])
+HTTP_REQUESTS = REGISTRY.counter(
+    'wine_http_requests_total', 'Requests per route and status code.', ['route', 'method', 'status'])
+RESPONSE_CACHE_ENTRIES = REGISTRY.gauge(
+    'wine_response_cache_entries', 'Responses held in the in-process cache.')
+PAGE_CACHE_ENTRIES = REGISTRY.gauge(
+    'wine_page_cache_entries', 'Rendered pages held in memory.')
+SELECTION_JOBS = REGISTRY.gauge(
+    'wine_selection_jobs', 'Selection jobs by status (finished ones until evicted).', ['status'])
+
+# Largest /api/search limit per response format. Beyond it the request is
+# clamped to the maximum (reported in 'limit' / X-Search-Limit) or, with the
+# 'reject' policy, refused with 400. Streamed rows never sit in memory at once.
+SEARCH_LIMITS = {
+    'json': 1000,
+    'ndjson': 100_000,
+}
+
+# Concurrency limits per route class (see admission_class). Requests beyond
+# `concurrency` wait in a queue of `queue` for up to `timeout` seconds, and
+# are shed with 503 and Retry-After when the queue is full or the wait runs
+# out. 'llm' is the budget for pages and posts that start or wait on LLM
+# selections; single wines, suggestions, stats and metrics are never queued.
+ADMISSION_LIMITS = {
+    'search': Limit(concurrency=6, queue=24, timeout=2.0),
+    'bulk': Limit(concurrency=2, queue=4, timeout=5.0),
+    'llm': Limit(concurrency=4, queue=16, timeout=5.0),
+}
+
+# /api/search requests above this limit are 'bulk' rather than 'search'
+BULK_SEARCH_ROWS = 200
+
+
+def wants_ndjson(req) -> bool:
+    """Whether a search request asks for an NDJSON stream."""
+    return req.args.get('format') == 'ndjson' or req.accept_mimetypes.best == NDJSON_MIMETYPE
 
 
-def create_app(db_path: str = "data/wines.db"):
-    """Create and configure Flask app."""
+def admission_class(endpoint: Optional[str], req) -> Optional[str]:
+    """The ADMISSION_LIMITS class of a request to endpoint, or None if it's always admitted."""
+    if endpoint in ('theme_selection', 'api_create_selection'):
+        return 'llm'
+    if endpoint == 'api_search':
+        limit = req.args.get('limit', type=int, default=20)
+        if wants_ndjson(req) or req.args.get('facets') or limit > BULK_SEARCH_ROWS:
+            return 'bulk'
+        return 'search'
+    if endpoint == 'api_wines_details':
+        return 'search'
+    return None
+
+
+def environ_admission_class(app: Flask, environ: Dict) -> Optional[str]:
+    """admission_class for a WSGI environ, before the app handles it (for servers)."""
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None
+    return admission_class(endpoint, app.request_class(environ))
+
+
+def create_app(
+    db_path: str = "data/wines.db",
+    hedge_deadline: Optional[float] = None,
+    response_cache_size: int = 1024,
+    selection_workers: int = 4,
+    llm_client=None,
+    search_limits: Optional[Dict[str, int]] = None,
+    search_limit_policy: str = 'clamp',
+    search_gzip: bool = True,
+    page_cache_size: int = 128,
+    page_cache_dir: Optional[str] = None,
+    selection_jobs: Optional[SelectionJobs] = None,
+    admission_limits: Optional[Dict[str, Optional[Limit]]] = None
+):
+    """
+    Create and configure Flask app (response_cache_size=0 disables the
+    in-process cache; selection_workers sizes the selection job pool;
+    llm_client, e.g. agent.stub.StubClient, replaces the Anthropic client).
+
+    search_limits overrides entries of SEARCH_LIMITS; search_limit_policy is
+    'clamp' or 'reject'; search_gzip compresses NDJSON streams for clients
+    that accept gzip.
+
+    page_cache_size rendered index/selection pages are kept in memory
+    (0 disables the page cache); with page_cache_dir, evicted pages spill
+    to disk there.
+
+    selection_jobs replaces the default thread-pool SelectionJobs (the async
+    server passes jobs that run on its event loop).
+
+    admission_limits overrides entries of ADMISSION_LIMITS; None for a class
+    lifts its limit.
+    """
+    if search_limit_policy not in ('clamp', 'reject'):
+        raise ValueError(f"Unknown search limit policy: {search_limit_policy}")
+
     app = Flask(__name__)
     app.config['db_path'] = db_path
+    app.config['hedge_deadline'] = hedge_deadline
+    app.config['search_limits'] = {**SEARCH_LIMITS, **(search_limits or {})}
+    app.config['search_limit_policy'] = search_limit_policy
+    app.config['search_gzip'] = search_gzip
+
+    # A WineAgent holds one connection at a time, so each request thread gets its own
+    agents = threading.local()
+
+    def current_agent() -> WineAgent:
+        if not hasattr(agents, 'agent'):
+            agents.agent = WineAgent(db_path=db_path, hedge_deadline=hedge_deadline, llm_client=llm_client)
+        return agents.agent
+
+    cache = ResponseCache(db_path, max_entries=response_cache_size)
+    app.extensions['response_cache'] = cache
+    jobs = selection_jobs or SelectionJobs(
+        lambda: WineAgent(db_path=db_path, hedge_deadline=hedge_deadline, llm_client=llm_client),
+        workers=selection_workers
+    )
+    app.extensions['selection_jobs'] = jobs
+    pages = PageCache(max_entries=page_cache_size, spill_dir=page_cache_dir)
+    app.extensions['page_cache'] = pages
+    admission = AdmissionControl({**ADMISSION_LIMITS, **(admission_limits or {})})
+    app.extensions['admission'] = admission
+    # Themes are defined in code, so their fingerprint is fixed per process
+    themes_fingerprint = fingerprint(*get_all_themes())
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
 
-    agent = WineAgent()
+    @app.before_request
+    def admit():
+        # Servers that admit requests before handing them over mark the environ
+        if request.environ.get(ADMITTED_ENVIRON_KEY):
+            return None
+        gate = admission.gate(admission_class(request.endpoint, request))
+        if gate is None:
+            return None
+        try:
+            gate.enter()
+        except Overloaded as e:
+            return overloaded_response(e)
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                gate.release()
+        g.admission_release = release
+        return None
+
+    @app.after_request
+    def release_on_close(response):
+        # Streamed bodies keep their slot until they are fully sent
+        if 'admission_release' in g:
+            response.call_on_close(g.admission_release)
+        return response
+
+    @app.teardown_request
+    def release_on_error(exc):
+        if exc is not None and 'admission_release' in g:
+            g.admission_release()
+
+    def overloaded_response(e: Overloaded):
+        if request.path.startswith('/api/'):
+            response = jsonify({
+                'success': False,
+                'error': str(e)
+            })
+        else:
+            response = Response(str(e), mimetype='text/plain')
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    @app.after_request
+    def record_request(response):
+        # Route templates keep label cardinality bounded; streamed bodies
+        # are timed when the server closes them, not when the view returns
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method = request.method
+        start = g.get('request_start', time.perf_counter())
+        HTTP_REQUESTS.inc(route=route, method=method, status=response.status_code)
+        response.call_on_close(
+            lambda: HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=method)
+        )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint."""
+        RESPONSE_CACHE_ENTRIES.set(len(cache))
+        PAGE_CACHE_ENTRIES.set(len(pages))
+        admission.record_gauges()
+        for status, count in jobs.status_counts().items():
+            SELECTION_JOBS.set(count, status=status)
+        return Response(REGISTRY.render(), content_type=PROMETHEUS_MIMETYPE)
 
     @app.route('/')
     def index():
         """Home page with theme browser."""
-        themes = get_all_themes()
-        db = WineDatabase(app.config['db_path'])
-        db.connect()
-        stats = db.get_statistics()
-        db.close()
+        def render():
+            db = WineDatabase(app.config['db_path'])
+            db.connect()
+            stats = db.get_statistics()
+            db.close()
+            return render_template('index.html', themes=get_all_themes(), stats=stats)
 
-        return render_template('index.html', themes=themes, stats=stats)
+        key = fingerprint('index.html', themes_fingerprint, cache.version())
+        return pages.render('index', key, render)
 
     @app.route('/theme/<theme_name>')
     def theme_selection(theme_name):
@@ -37,41 +268,238 @@ def create_app(db_path: str = "data/wines.db"):
         if not theme:
             return "Theme not found", 404
 
-        wines = agent.select_for_theme(theme)
+        box_budget = request.args.get('box_budget', type=float)
+        # The latest selection for this theme, budget and catalog version is
+        # served from the page cache; ?fresh=1 asks for a new one
+        page_key = fingerprint('selection.html', theme, box_budget, cache.version())
+
+        # Selection runs as a job; the page refreshes with ?job= until it's done
+        job = jobs.get(request.args.get('job', ''))
+        if job is None and not request.args.get('fresh'):
+            cached = pages.lookup('selection', page_key)
+            if cached is not None:
+                return cached
+        if job is None or job.key != (theme.name, box_budget):
+            try:
+                job, _ = jobs.submit(theme, box_budget)
+            except QueueFull:
+                return "Too many selections in progress, please retry shortly", 503, {'Retry-After': '5'}
+
+        job.finished.wait(THEME_PAGE_WAIT)
+        if job.status == DONE:
+            # A finished job is the newest selection: it replaces the cached page
+            return pages.store(page_key, render_template('selection.html', theme=theme, wines=job.wines,
+                                                         box_budget=box_budget))
+        if job.status == FAILED:
+            return f"Selection failed: {job.error}", 500
+
+        refresh_url = url_for('theme_selection', theme_name=theme_name, job=job.id, box_budget=box_budget)
+        return render_template('pending.html', theme=theme, job=job, refresh_url=refresh_url,
+                               refresh_seconds=THEME_PAGE_REFRESH,
+                               events_url=url_for('api_selection_events', job_id=job.id))
+
+    @app.route('/api/selections', methods=['POST'])
+    def api_create_selection():
+        """Queue a theme selection: JSON or form body with theme and optional box_budget."""
+        body = request.get_json(silent=True) or request.form
+        theme = get_theme_by_name(body.get('theme') or '')
+        if not theme:
+            return jsonify({
+                'success': False,
+                'error': f"Theme not found: {body.get('theme')}"
+            }), 404
+
+        try:
+            box_budget = float(body['box_budget']) if body.get('box_budget') else None
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'box_budget must be a number'
+            }), 400
+
+        try:
+            job, deduplicated = jobs.submit(theme, box_budget)
+        except QueueFull as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e)
+            })
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        response = jsonify({
+            'success': True,
+            'deduplicated': deduplicated,
+            'job': job.to_dict()
+        })
+        response.headers['Location'] = url_for('api_selection', job_id=job.id)
+        return response, 202
+
+    @app.route('/api/selections/<job_id>')
+    def api_selection(job_id):
+        """Poll a selection job; wines are included once it's done."""
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+
+        response = jsonify({
+            'success': True,
+            'job': job.to_dict()
+        })
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @app.route('/api/selections/<job_id>/events')
+    def api_selection_events(job_id):
+        """
+        Server-Sent Events stream of a selection job's progress, from the
+        start (or after Last-Event-ID), ending with its done/failed event.
+        """
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
 
-        return render_template('selection.html', theme=theme, wines=wines)
+        try:
+            start = int(request.headers.get('Last-Event-ID', -1)) + 1
+        except ValueError:
+            start = 0
+
+        def stream():
+            index = start
+            while True:
+                events = job.events_since(index, timeout=SSE_KEEPALIVE)
+                if not events:
+                    if job.finished.is_set():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    yield f"id: {index}\nevent: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+                    index += 1
+
+        return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @app.route('/api/search')
+    @cached_json(cache, CACHE_MAX_AGE['search'], negotiate=lambda req: 'ndjson' if wants_ndjson(req) else 'json')
     def api_search():
-        """API endpoint for wine search."""
+        """
+        API endpoint for wine search. format=ndjson (or Accept:
+        application/x-ndjson) streams one wine per line straight from the
+        cursor, gzipped if the client accepts it; see SEARCH_LIMITS for how
+        large limits are handled.
+        """
         country = request.args.get('country')
         region = request.args.get('region')
         grapes = request.args.get('grapes')
         min_rating = request.args.get('min_rating', type=float)
         max_price = request.args.get('max_price', type=float)
         wine_type = request.args.get('wine_type')
+        sort = request.args.get('sort')
+        if sort is not None and sort not in SEARCH_ORDERS:
+            return jsonify({
+                'success': False,
+                'error': f"sort must be one of {', '.join(SEARCH_ORDERS)}"
+            }), 400
+
+        streaming = wants_ndjson(request)
+        facets = [f.strip() for f in request.args.get('facets', '').split(',') if f.strip()]
+        unknown = [f for f in facets if f not in FACET_EXPRESSIONS]
+        if unknown or (facets and streaming):
+            return jsonify({
+                'success': False,
+                'error': f"facets must be among {', '.join(FACET_EXPRESSIONS)}" if unknown
+                         else "facets aren't available with format=ndjson"
+            }), 400
+        max_limit = app.config['search_limits']['ndjson' if streaming else 'json']
         limit = request.args.get('limit', type=int, default=20)
+        clamped = limit > max_limit
+        if limit < 1 or (clamped and app.config['search_limit_policy'] == 'reject'):
+            return jsonify({
+                'success': False,
+                'error': f"limit must be between 1 and {max_limit}"
+                         + ("" if streaming else "; use format=ndjson for more")
+            }), 400
+        limit = min(limit, max_limit)
 
-        wines = agent.search(
+        search_args = dict(
             country=country,
             region=region,
             grapes=grapes,
             min_rating=min_rating,
             max_price=max_price,
             wine_type=wine_type,
-            limit=limit
+            limit=limit,
+            notes=request.args.get('notes'),
+            min_price=request.args.get('min_price', type=float),
+            price_band=request.args.get('price_band'),
+            min_value=request.args.get('min_value', type=float)
         )
+        query = request.args.get('q')
+        agent = current_agent()
 
-        return jsonify({
+        if streaming:
+            ranked = sort is None and (query or search_args['notes'])
+            if ranked:
+                # Ranked searches are capped at their candidate pool already
+                rows = iter(agent.search(query=query, **search_args))
+            else:
+                rows = _stream_search(query=query, order_by=sort or 'rating', **search_args)
+
+            body = ndjson_chunks(rows)
+            headers = {'Vary': 'Accept-Encoding'}
+            if clamped:
+                headers['X-Search-Limit'] = str(limit)
+            if app.config['search_gzip'] and 'gzip' in request.accept_encodings:
+                body = gzip_chunks(body)
+                headers['Content-Encoding'] = 'gzip'
+            return Response(stream_with_context(body), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+        wines = agent.search(order_by=sort, query=query, explain=app.debug, **search_args)
+
+        response = {
             'success': True,
             'count': len(wines),
             'wines': wines
-        })
+        }
+        if facets:
+            filters = {name: value for name, value in search_args.items() if name != 'limit'}
+            response['facets'] = agent.facet_counts(
+                facets,
+                limit=request.args.get('facet_limit', type=int, default=20),
+                query=query,
+                any_term=agent.last_search_any_term,
+                **filters
+            )
+        if clamped:
+            response['limit'] = limit
+        if app.debug and agent.last_search_plan:
+            response['plan'] = agent.last_search_plan
+        if app.debug and facets:
+            response['facet_plan'] = agent.db.last_facet_plan
+        return jsonify(response)
+
+    def _stream_search(**search_args):
+        """Rows of a search_wines query on a connection of its own, closed when the stream ends."""
+        db = WineDatabase(app.config['db_path'])
+        # Servers may resume the stream on another thread; it is only ever read sequentially
+        db.connect(check_same_thread=False)
+        try:
+            yield from db.iter_search_wines(**search_args)
+        finally:
+            db.close()
 
     @app.route('/api/wine/<int:wine_id>')
+    @cached_json(cache, CACHE_MAX_AGE['wine'])
     def api_wine_details(wine_id):
         """API endpoint for wine details."""
-        wine = agent.get_wine_details(wine_id)
+        wine = current_agent().get_wine_details(wine_id)
 
         if not wine:
             return jsonify({
@@ -84,7 +512,76 @@ def create_app(db_path: str = "data/wines.db"):
             'wine': wine
         })
 
+    @app.route('/api/wines')
+    @cached_json(cache, CACHE_MAX_AGE['wine'])
+    def api_wines_details():
+        """API endpoint for details of many wines: /api/wines?ids=1,2,3."""
+        try:
+            wine_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'ids must be comma-separated integers'
+            }), 400
+
+        if not wine_ids or len(wine_ids) > MAX_BATCH_IDS:
+            return jsonify({
+                'success': False,
+                'error': f'Give between 1 and {MAX_BATCH_IDS} ids'
+            }), 400
+
+        wines = current_agent().get_wines_details(wine_ids)
+        found = {wine['id'] for wine in wines}
+
+        return jsonify({
+            'success': True,
+            'count': len(wines),
+            'wines': wines,
+            'missing': [wine_id for wine_id in wine_ids if wine_id not in found]
+        })
+
+    suggestions = {'index': None}
+    suggestions_lock = threading.Lock()
+
+    def suggestion_index() -> PrefixIndex:
+        """The prefix index for the current catalog version, rebuilt when it changes."""
+        version = cache.version()
+        with suggestions_lock:
+            index = suggestions['index']
+            if index is None or index.version != version:
+                db = WineDatabase(app.config['db_path'])
+                db.connect()
+                index = suggestions['index'] = PrefixIndex.build(db, version=version)
+                db.close()
+            return index
+
+    @app.route('/api/suggest')
+    @cached_json(cache, CACHE_MAX_AGE['suggest'])
+    def api_suggest():
+        """Type-ahead completions for a filter field, most common first."""
+        field = request.args.get('field')
+        if field not in SUGGEST_FIELDS:
+            return jsonify({
+                'success': False,
+                'error': f"field must be one of {', '.join(SUGGEST_FIELDS)}"
+            }), 400
+        prefix = request.args.get('prefix', '')
+        limit = request.args.get('limit', type=int, default=10)
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            return jsonify({
+                'success': False,
+                'error': f"limit must be between 1 and {MAX_SUGGESTIONS}"
+            }), 400
+
+        return jsonify({
+            'success': True,
+            'field': field,
+            'prefix': prefix,
+            'suggestions': suggestion_index().suggest(field, prefix, limit)
+        })
+
     @app.route('/api/stats')
+    @cached_json(cache, CACHE_MAX_AGE['stats'])
     def api_stats():
         """API endpoint for database statistics."""
         db = WineDatabase(app.config['db_path'])
@@ -0,0 +1,138 @@
+"""Conditional GET and in-process caching for the JSON API."""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from flask import Response, request
+
+from data.metrics import REGISTRY
+
+
+GZIP_ETAG_SUFFIX = '-gzip'
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'wine_response_cache_requests_total', 'Cached JSON requests by outcome.', ['route', 'result'])
+
+
+def catalog_data_version(db_path: str) -> str:
+    """
+    Version of the database contents, from the file's modification time and
+    size: any committed write changes it, and reading it is one stat() call.
+    """
+    try:
+        st = os.stat(db_path)
+    except OSError:
+        return 'missing'
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def normalized_request_key() -> str:
+    """Route path plus query arguments, sorted and without empty values."""
+    args = sorted((k, v) for k, values in request.args.lists() for v in values if v != '')
+    return request.path + '?' + '&'.join(f"{k}={v}" for k, v in args)
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized JSON responses keyed by (data version, request key).
+
+    Entries from older data versions are never served, and age out as new
+    ones are added. max_entries=0 disables storage; ETags still work.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1024):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> str:
+        return catalog_data_version(self.db_path)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, str], body: bytes, mimetype: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def etag_for(version: str, request_key: str) -> str:
+    """Strong entity tag (unquoted) for a request against a data version."""
+    return hashlib.blake2b(f"{version}\0{request_key}".encode(), digest_size=12).hexdigest()
+
+
+def cached_json(cache: ResponseCache, max_age: int, negotiate: Optional[Callable] = None) -> Callable:
+    """
+    Decorate a JSON GET view with an ETag (data version plus normalized
+    request), 304 Not Modified for a matching If-None-Match,
+    Cache-Control: public with max_age seconds, and the response cache for
+    200 responses that aren't streamed. Other statuses pass through uncached.
+
+    For views that pick their format from the Accept header, negotiate(request)
+    names the chosen format; it becomes part of the cache key and ETag, and
+    responses carry Vary: Accept so shared caches keep formats apart too.
+    """
+    cache_control = f"public, max-age={max_age}"
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request_key = normalized_request_key()
+            if negotiate:
+                request_key += '\0' + negotiate(request)
+            version = cache.version()
+            etag = etag_for(version, request_key)
+
+            if request.if_none_match.contains(etag) or request.if_none_match.contains(etag + GZIP_ETAG_SUFFIX):
+                response = Response(status=304)
+                CACHE_REQUESTS.inc(route=view.__name__, result='not_modified')
+            else:
+                entry = cache.get((version, request_key))
+                if entry is not None:
+                    response = Response(entry[0], mimetype=entry[1])
+                    response.headers['X-Cache'] = 'HIT'
+                    CACHE_REQUESTS.inc(route=view.__name__, result='hit')
+                else:
+                    CACHE_REQUESTS.inc(route=view.__name__, result='miss')
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    if not response.is_streamed:  # streams are too big to keep
+                        cache.put((version, request_key), response.get_data(), response.mimetype)
+                        response.headers['X-Cache'] = 'MISS'
+
+            # Gzipped bodies are a different representation, so a different tag
+            response.set_etag(etag + GZIP_ETAG_SUFFIX if response.content_encoding == 'gzip' else etag)
+            response.headers['Cache-Control'] = cache_control
+            if negotiate:
+                response.vary.add('Accept')
+            return response
+
+        return wrapper
+
+    return decorator
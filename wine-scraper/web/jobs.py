@@ -0,0 +1,203 @@
+"""Background theme-selection jobs for the web app."""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from themes.presets import Theme
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when a job can't be accepted because too many are pending."""
+
+
+@dataclass
+class SelectionJob:
+    """One theme selection, from queueing to result."""
+    id: str
+    theme: Theme
+    box_budget: Optional[float] = None
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    wines: Optional[List[Dict[str, Any]]] = None
+    hedge: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    events: List[Dict[str, Any]] = field(default_factory=list, repr=False)
+    finished: threading.Event = field(default_factory=threading.Event, repr=False)
+    _updated: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    _listeners: List[Callable[[], None]] = field(default_factory=list, repr=False)
+
+    def add_event(self, event: Dict[str, Any], final: bool = False):
+        """Append a progress event and wake readers; final marks the job finished."""
+        with self._updated:
+            self.events.append(event)
+            if final:
+                self.finished.set()
+            self._updated.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def subscribe(self, listener: Callable[[], None]):
+        """Call listener (from the adding thread) after each new event, for readers that can't block."""
+        with self._updated:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[], None]):
+        with self._updated:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def events_since(self, index: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Events from position index on, waiting up to timeout for one if there
+        are none yet. Empty once the job has finished and all were read.
+        """
+        with self._updated:
+            self._updated.wait_for(lambda: len(self.events) > index or self.finished.is_set(), timeout)
+            return self.events[index:]
+
+    @property
+    def key(self) -> Tuple[str, Optional[float]]:
+        return (self.theme.name, self.box_budget)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON view of the job; wines only once done."""
+        job = {
+            'id': self.id,
+            'theme': self.theme.name,
+            'box_budget': self.box_budget,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == DONE:
+            job['wines'] = self.wines
+            if self.hedge:
+                job['hedge'] = self.hedge
+        if self.status == FAILED:
+            job['error'] = self.error
+        return job
+
+
+class SelectionJobs:
+    """
+    Runs theme selections on a bounded pool of worker threads.
+
+    submit() returns the job already queued or running for the same theme and
+    box budget (single-flight) instead of starting another; otherwise it
+    queues a new one, or raises QueueFull once max_pending jobs are waiting.
+    Each worker thread gets its own agent from agent_factory, since agents
+    hold a database connection. The last max_finished finished jobs are kept
+    for polling.
+
+    Every job records its progress as events: {'event': 'status', 'status':
+    ...} on queueing and start, the agentic curation events (tool calls,
+    candidates, selection), then a final 'done' (with wines) or 'failed'.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], Any],
+        workers: int = 4,
+        max_pending: int = 100,
+        max_finished: int = 1000
+    ):
+        self.agent_factory = agent_factory
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wine-selection")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, SelectionJob]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, Optional[float]], SelectionJob] = {}
+
+    def submit(self, theme: Theme, box_budget: Optional[float] = None) -> Tuple[SelectionJob, bool]:
+        """Queue a selection. Returns (job, deduplicated)."""
+        with self._lock:
+            existing = self._in_flight.get((theme.name, box_budget))
+            if existing is not None:
+                return existing, True
+            if sum(job.status == QUEUED for job in self._in_flight.values()) >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} selections already waiting")
+
+            job = SelectionJob(id=uuid.uuid4().hex, theme=theme, box_budget=box_budget)
+            job.add_event({'event': 'status', 'status': QUEUED})
+            self._jobs[job.id] = job
+            self._in_flight[job.key] = job
+            self._evict_finished()
+
+        self._start(job)
+        return job, False
+
+    def get(self, job_id: str) -> Optional[SelectionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of tracked jobs in each state."""
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def _agent(self):
+        agent = getattr(self._local, 'agent', None)
+        if agent is None:
+            agent = self._local.agent = self.agent_factory()
+        return agent
+
+    def _start(self, job: SelectionJob):
+        """Schedule a queued job (subclasses run jobs elsewhere)."""
+        self._executor.submit(self._run, job)
+
+    def _run(self, job: SelectionJob):
+        self._begin(job)
+        try:
+            job.wines, job.hedge = self._agent().select_with_hedge_info(
+                job.theme, box_budget=job.box_budget, progress=job.add_event)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            self._finish(job)
+
+    def _begin(self, job: SelectionJob):
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.add_event({'event': 'status', 'status': RUNNING})
+
+    def _finish(self, job: SelectionJob):
+        """Release the job's single-flight slot and send its final event (status set by the caller)."""
+        if job.status == RUNNING:
+            job.status = FAILED
+        job.finished_at = time.time()
+        with self._lock:
+            self._in_flight.pop(job.key, None)
+        if job.status == DONE:
+            job.add_event({'event': DONE, 'wines': job.wines, 'hedge': job.hedge}, final=True)
+        else:
+            job.add_event({'event': FAILED, 'error': job.error}, final=True)
+
+    def _evict_finished(self):
+        """Drop the oldest finished jobs beyond max_finished (caller holds the lock)."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished.is_set()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
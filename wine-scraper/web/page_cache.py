@@ -0,0 +1,199 @@
+"""Cache of rendered HTML pages, stored with precompressed variants."""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from flask import Response, request
+
+from data.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # optional: pages are still served gzipped
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Content-Encoding -> file suffix on disk
+ENCODINGS = {'identity': '.html', 'gzip': '.html.gz', 'br': '.html.br'}
+
+PAGE_CACHE_REQUESTS = REGISTRY.counter(
+    'wine_page_cache_requests_total', 'Rendered page cache lookups by outcome.', ['page', 'result'])
+
+
+def fingerprint(*parts: Any) -> str:
+    """Short stable digest of JSON-serializable parts (dataclasses included)."""
+    text = json.dumps([asdict(p) if hasattr(p, '__dataclass_fields__') else p for p in parts],
+                      sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+
+
+@dataclass
+class Page:
+    """One rendered page: its bytes per content encoding and an entity tag."""
+    key: str
+    variants: Dict[str, bytes]
+    etag: str = field(init=False)
+
+    def __post_init__(self):
+        # From the content, since a key can be re-rendered (a new selection)
+        self.etag = hashlib.blake2b(self.variants['identity'], digest_size=12).hexdigest()
+
+    @classmethod
+    def compress(cls, key: str, html: str) -> 'Page':
+        body = html.encode()
+        variants = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        return cls(key, variants)
+
+
+class PageCache:
+    """
+    LRU of rendered pages keyed by a digest of whatever the page depends on
+    (template, theme fingerprint, catalog version, ...), so stale pages are
+    never looked up again and simply age out.
+
+    Each page is compressed once when stored (gzip, plus brotli if the brotli
+    package is installed), and served as static bytes in the best encoding
+    the client accepts. With spill_dir, pages evicted from memory are written
+    there and read back on a miss, keeping up to max_disk_entries files.
+    """
+
+    def __init__(self, max_entries: int = 128, spill_dir: Optional[str] = None, max_disk_entries: int = 4096):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.max_disk_entries = max_disk_entries
+        self._pages: "OrderedDict[str, Page]" = OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def get(self, key: str) -> Optional[Page]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                return page
+        page = self._read_spilled(key)
+        if page is not None:
+            self._store(page)
+        return page
+
+    def put(self, key: str, html: str) -> Page:
+        page = Page.compress(key, html)
+        self._store(page)
+        return page
+
+    def lookup(self, page_name: str, key: str) -> Optional[Response]:
+        """Response for the cached page under key, or None on a miss."""
+        page = self.get(key)
+        PAGE_CACHE_REQUESTS.inc(page=page_name, result='miss' if page is None else 'hit')
+        if page is None:
+            return None
+        response = page_response(page)
+        response.headers['X-Page-Cache'] = 'HIT'
+        return response
+
+    def store(self, key: str, html: str) -> Response:
+        """Cache a freshly rendered page (replacing any under key) and serve it."""
+        response = page_response(self.put(key, html))
+        response.headers['X-Page-Cache'] = 'MISS'
+        return response
+
+    def render(self, page_name: str, key: str, render: Callable[[], str]) -> Response:
+        """The cached page for key, rendering and storing it on a miss."""
+        response = self.lookup(page_name, key)
+        return response if response is not None else self.store(key, render())
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def _store(self, page: Page):
+        if self.max_entries <= 0:
+            return
+        evicted = []
+        with self._lock:
+            self._pages[page.key] = page
+            self._pages.move_to_end(page.key)
+            while len(self._pages) > self.max_entries:
+                evicted.append(self._pages.popitem(last=False)[1])
+        for old in evicted:
+            self._spill(old)
+
+    def _path(self, key: str, encoding: str) -> str:
+        return os.path.join(self.spill_dir, key + ENCODINGS[encoding])
+
+    def _spill(self, page: Page):
+        if not self.spill_dir:
+            return
+        try:
+            for encoding, body in page.variants.items():
+                tmp = self._path(page.key, encoding) + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(body)
+                os.replace(tmp, self._path(page.key, encoding))
+            self._prune_disk()
+        except OSError as e:
+            print(f"Error spilling page {page.key}: {e}")
+
+    def _read_spilled(self, key: str) -> Optional[Page]:
+        if not self.spill_dir:
+            return None
+        variants = {}
+        for encoding in ENCODINGS:
+            try:
+                with open(self._path(key, encoding), 'rb') as f:
+                    variants[encoding] = f.read()
+            except OSError:
+                continue
+        if 'identity' not in variants:
+            return None
+        return Page(key, variants)
+
+    def _prune_disk(self):
+        """Remove the least recently written pages beyond max_disk_entries."""
+        pages = {}
+        for name in os.listdir(self.spill_dir):
+            if name.endswith('.html'):
+                path = os.path.join(self.spill_dir, name)
+                pages[name[:-len('.html')]] = os.path.getmtime(path)
+        for key in sorted(pages, key=pages.get)[:max(0, len(pages) - self.max_disk_entries)]:
+            for encoding in ENCODINGS:
+                try:
+                    os.remove(self._path(key, encoding))
+                except OSError:
+                    pass
+
+
+def page_response(page: Page) -> Response:
+    """Serve a page in the best accepted encoding, or 304 if the client has it."""
+    accepted = request.accept_encodings
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in page.variants and accepted[candidate]:
+            encoding = candidate
+            break
+    etag = page.etag if encoding == 'identity' else f"{page.etag}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(page.variants[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Revalidate each time: the ETag makes that a 304 unless the page changed
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,486 @@
+"""
+Production serving mode: an aiohttp server in front of the Flask app.
+
+Requests are handled by the Flask app on a bounded thread pool, so SQLite
+work never blocks the event loop. Theme selections run on the event loop
+itself: the agentic loop awaits LLM calls natively and its tool queries run
+on a WineDatabasePool, so a selection waiting on the LLM holds no thread.
+Their Server-Sent Events streams are served natively too. With several
+workers, processes are forked after the listening socket is bound and the
+catalog prepared, and open the database read-only. Selection jobs live in
+memory, so the first worker owns them all: the others forward selection
+routes to it over a Unix socket, and every poll finds its job.
+
+Admission control (web/admission.py) runs on the event loop before a
+request is handed to the pool: queued requests hold no thread, and as long
+as the limited classes' concurrency stays below the pool size, cheap
+requests always find a free thread.
+"""
+import asyncio
+import contextvars
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import unquote_to_bytes
+
+import aiohttp
+from aiohttp import web
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.agentic import select_wines_agentic_async
+from agent.core import WineAgent, hedge_selection
+from data.db import WineDatabase
+from data.pool import WineDatabasePool
+from web.admission import ADMITTED_ENVIRON_KEY, AdmissionControl, Overloaded
+from web.app import SSE_KEEPALIVE, create_app, environ_admission_class
+from web.jobs import DONE, FAILED, SelectionJob, SelectionJobs
+
+# Response headers the server sets itself
+HOP_BY_HOP = {'connection', 'keep-alive', 'transfer-encoding', 'upgrade'}
+
+# Routes that create or read selection jobs, forwarded to the jobs owner
+JOB_ROUTES = ['/api/selections', '/api/selections/{tail:.*}', '/theme/{tail:.*}']
+
+
+class AsyncSelectionJobs(SelectionJobs):
+    """
+    SelectionJobs whose jobs run as coroutines on the server's event loop.
+
+    At most `workers` selections run at once. Agentic curation is awaited
+    natively, with its queries on db_pool. Deterministic and box selections,
+    the hedge fallback and annotating agentic picks run on the inherited
+    thread pool with a per-thread non-agentic WineAgent. submit() may be
+    called from any thread once bind() has attached the loop.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        db_pool: WineDatabasePool,
+        llm_client=None,
+        agentic: bool = True,
+        hedge_deadline: Optional[float] = None,
+        workers: int = 16,
+        threads: int = 4,
+        max_pending: int = 100
+    ):
+        super().__init__(lambda: WineAgent(agentic=False, db_path=db_path),
+                         workers=threads, max_pending=max_pending)
+        self.db_path = db_path
+        self.db_pool = db_pool
+        self.llm_client = llm_client
+        self.agentic = agentic
+        self.hedge_deadline = hedge_deadline
+        self.workers = workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def _start(self, job: SelectionJob):
+        asyncio.run_coroutine_threadsafe(self._run_async(job), self._loop)
+
+    async def _in_thread(self, fn, *args):
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    async def _run_async(self, job: SelectionJob):
+        async with self._slots:
+            self._begin(job)
+            try:
+                if job.box_budget or not self.agentic:
+                    job.wines = await self._in_thread(
+                        lambda: self._agent().select_for_theme(job.theme, box_budget=job.box_budget))
+                elif self.hedge_deadline:
+                    job.wines, job.hedge = await self._select_hedged(job)
+                else:
+                    job.wines = await self._select_agentic(job)
+                job.status = DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                self._finish(job)
+
+    def _curate(self, job: SelectionJob):
+        """Agentic curation of the job's theme (unannotated), queries on db_pool."""
+        return select_wines_agentic_async(
+            theme_name=job.theme.name,
+            theme_description=job.theme.curation_brief(),
+            wine_count=job.theme.wine_count,
+            client=self.llm_client,
+            pool=self.db_pool,
+            progress=job.add_event
+        )
+
+    async def _select_agentic(self, job: SelectionJob) -> List[Dict[str, Any]]:
+        wines = await self._curate(job)
+        return await self._in_thread(lambda: self._agent().annotate_agentic(wines, job.theme))
+
+    async def _select_hedged(self, job: SelectionJob):
+        """WineAgent.select_hedged on the event loop: the same race, with the deterministic side on the pool."""
+        wines, info = await hedge_selection(
+            self._curate(job),
+            self._in_thread(lambda: self._agent().select_for_theme(job.theme)),
+            self.hedge_deadline
+        )
+        if info['winner'] == 'agentic':
+            wines = await self._in_thread(lambda: self._agent().annotate_agentic(wines, job.theme))
+        return wines, info
+
+
+def wsgi_environ(request: web.Request, body: bytes) -> Dict[str, Any]:
+    """PEP 3333 environ for an aiohttp request."""
+    host, _, port = (request.host or 'localhost').partition(':')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote_to_bytes(request.rel_url.raw_path).decode('latin-1'),
+        'QUERY_STRING': request.rel_url.raw_query_string,
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': host,
+        'SERVER_PORT': port or ('443' if request.secure else '80'),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class WSGIBridge:
+    """
+    Serve a WSGI app from aiohttp on a bounded thread pool.
+
+    Responses with a Content-Length are produced in one hop to the pool;
+    streamed ones (NDJSON) are pulled a chunk per hop, so a slow client
+    holds no pool thread between chunks. With admission, requests of a
+    limited route class wait for a slot on the event loop and keep it until
+    their body is sent; shed ones get a 503 without reaching the pool.
+    """
+
+    def __init__(self, wsgi_app, threads: int = 16, admission: Optional[AdmissionControl] = None):
+        self.wsgi_app = wsgi_app
+        self.admission = admission
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wine-wsgi")
+
+    def _call(self, environ: Dict[str, Any]):
+        state = {}
+
+        def start_response(status, headers, exc_info=None):
+            state['status'], state['headers'] = status, headers
+
+        result = self.wsgi_app(environ, start_response)
+        if any(name.lower() == 'content-length' for name, _ in state['headers']):
+            try:
+                return state, b''.join(result), None, None
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        return state, None, iter(result), result
+
+    async def __call__(self, request: web.Request) -> web.StreamResponse:
+        environ = wsgi_environ(request, await request.read())
+        gate = None
+        if self.admission is not None:
+            gate = self.admission.gate(environ_admission_class(self.wsgi_app, environ))
+        if gate is None:
+            return await self._respond(request, environ)
+
+        try:
+            await gate.enter_async()
+        except Overloaded as e:
+            return overloaded_response(request, e)
+        environ[ADMITTED_ENVIRON_KEY] = True
+        try:
+            return await self._respond(request, environ)
+        finally:
+            gate.release()
+
+    async def _respond(self, request: web.Request, environ: Dict[str, Any]) -> web.StreamResponse:
+        loop = asyncio.get_running_loop()
+        state, body, chunks, result = await loop.run_in_executor(self.executor, self._call, environ)
+
+        code, _, reason = state['status'].partition(' ')
+        headers = [(k, v) for k, v in state['headers'] if k.lower() not in HOP_BY_HOP]
+        if body is not None:
+            response = web.Response(status=int(code), reason=reason, body=body)
+            response.headers.clear()
+            for name, value in headers:
+                response.headers.add(name, value)
+            return response
+
+        response = web.StreamResponse(status=int(code), reason=reason)
+        for name, value in headers:
+            response.headers.add(name, value)
+        # Flask's streamed generators keep their request context in context
+        # variables, so every hop runs in the same (copied) context
+        context = contextvars.copy_context()
+        done = object()
+        try:
+            await response.prepare(request)
+            while True:
+                chunk = await loop.run_in_executor(self.executor, context.run, next, chunks, done)
+                if chunk is done:
+                    break
+                if chunk:
+                    await response.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            await response.write_eof()
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, context.run, result.close)
+        return response
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def overloaded_response(request: web.Request, e: Overloaded) -> web.Response:
+    """The Flask app's 503 for a shed request, without a trip to the pool."""
+    headers = {'Retry-After': str(e.retry_after)}
+    if request.path.startswith('/api/'):
+        return web.json_response({'success': False, 'error': str(e)}, status=503, headers=headers)
+    return web.Response(text=str(e), status=503, headers=headers)
+
+
+class JobForwarder:
+    """
+    Proxy selection routes to the worker that owns the jobs, over its Unix
+    socket. Bodies are streamed through unchanged (SSE included), so the
+    owner's responses, admission and caching headers reach the client as is.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.UnixConnector(path=self.socket_path),
+            auto_decompress=False,
+            timeout=aiohttp.ClientTimeout(total=None)
+        )
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def __call__(self, request: web.Request) -> web.StreamResponse:
+        headers = {k: v for k, v in request.headers.items()
+                   if k.lower() not in HOP_BY_HOP | {'content-length'}}
+        try:
+            upstream = await self.session.request(
+                request.method, f"http://jobs{request.rel_url}", headers=headers,
+                data=await request.read(), allow_redirects=False
+            )
+        except aiohttp.ClientConnectionError:
+            return web.json_response({'success': False, 'error': 'Selection service unavailable'},
+                                     status=503, headers={'Retry-After': '1'})
+
+        async with upstream:
+            response = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+            for name, value in upstream.headers.items():
+                if name.lower() not in HOP_BY_HOP:
+                    response.headers.add(name, value)
+            await response.prepare(request)
+            async for chunk in upstream.content.iter_any():
+                await response.write(chunk)
+            await response.write_eof()
+        return response
+
+
+def create_server_app(
+    db_path: str = "data/wines.db",
+    hedge_deadline: Optional[float] = None,
+    llm_client=None,
+    threads: int = 16,
+    db_workers: int = 8,
+    selection_workers: int = 16,
+    agentic: bool = True,
+    jobs_owner: Optional[str] = None,
+    **flask_options
+) -> web.Application:
+    """
+    The aiohttp application: the Flask app (create_app, with flask_options)
+    behind a WSGIBridge of `threads` threads, selections on the event loop
+    (at most selection_workers at once, queries on db_workers connections),
+    and native selection event streams. With jobs_owner (a Unix socket
+    path), selection routes are forwarded to the worker serving there.
+    """
+    db_pool = WineDatabasePool(db_path, max_workers=db_workers)
+    jobs = AsyncSelectionJobs(db_path, db_pool, llm_client=llm_client, agentic=agentic,
+                              hedge_deadline=hedge_deadline, workers=selection_workers)
+    flask_app = create_app(db_path, hedge_deadline=hedge_deadline, llm_client=llm_client,
+                           selection_jobs=jobs, **flask_options)
+    admission = flask_app.extensions['admission']
+    limited = sum(gate.limit.concurrency for gate in admission.gates.values())
+    if limited >= threads:
+        print(f"Warning: limited routes may run {limited} requests at once on {threads} threads; "
+              f"cheap requests can wait for a thread")
+    bridge = WSGIBridge(flask_app, threads=threads, admission=admission)
+
+    async def selection_events(request: web.Request) -> web.StreamResponse:
+        """The Flask SSE route, awaiting events instead of blocking a thread per stream."""
+        job = jobs.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'success': False, 'error': 'Job not found'}, status=404)
+        try:
+            index = int(request.headers.get('Last-Event-ID', -1)) + 1
+        except ValueError:
+            index = 0
+
+        loop = asyncio.get_running_loop()
+        updated = asyncio.Event()
+
+        def wake():
+            loop.call_soon_threadsafe(updated.set)
+
+        response = web.StreamResponse(headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.content_type = 'text/event-stream'
+        job.subscribe(wake)
+        try:
+            await response.prepare(request)
+            while True:
+                updated.clear()
+                events = job.events[index:]
+                for event in events:
+                    data = json.dumps(event, default=str)
+                    await response.write(f"id: {index}\nevent: {event['event']}\ndata: {data}\n\n".encode())
+                    index += 1
+                if job.finished.is_set() and index >= len(job.events):
+                    break
+                if not events:
+                    try:
+                        await asyncio.wait_for(updated.wait(), SSE_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        await response.write(b": keepalive\n\n")
+            await response.write_eof()
+        finally:
+            job.unsubscribe(wake)
+        return response
+
+    forwarder = JobForwarder(jobs_owner) if jobs_owner else None
+
+    async def on_startup(app: web.Application):
+        jobs.bind(asyncio.get_running_loop())
+        if forwarder:
+            await forwarder.start()
+
+    async def on_cleanup(app: web.Application):
+        if forwarder:
+            await forwarder.close()
+        bridge.shutdown()
+        jobs.shutdown(wait=False)
+        db_pool.close()
+
+    app = web.Application(client_max_size=1024 ** 2)
+    app['flask'] = flask_app
+    app['selection_jobs'] = jobs
+    if forwarder:
+        for path in JOB_ROUTES:
+            app.router.add_route('*', path, forwarder)
+    else:
+        app.router.add_get('/api/selections/{job_id}/events', selection_events)
+    app.router.add_route('*', '/{path:.*}', bridge)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def prepare_catalog(db_path: str):
+    """
+    Create the tables the app would otherwise create lazily (shipments,
+    column statistics), so workers can open the catalog read-only.
+    """
+    db = WineDatabase(db_path)
+    db.connect()
+    db.initialize_shipments_schema()
+    db.initialize_stats_schema()
+    db.close()
+
+
+def _run_worker(
+    sock: socket.socket,
+    db_path: str,
+    read_only: bool,
+    options: Dict[str, Any],
+    jobs_socket: Optional[str] = None,
+    owns_jobs: bool = True
+):
+    """Serve on the shared socket; the jobs owner also listens on jobs_socket, the others forward to it."""
+    WineDatabase.read_only = read_only
+    app = create_server_app(db_path, jobs_owner=None if owns_jobs else jobs_socket, **options)
+    web.run_app(app, sock=sock, path=jobs_socket if owns_jobs else None, print=None, access_log=None)
+
+
+def serve(
+    db_path: str = "data/wines.db",
+    host: str = '0.0.0.0',
+    port: int = 8000,
+    workers: int = 1,
+    backlog: int = 1024,
+    **options
+):
+    """
+    Bind host:port, prepare the catalog, then serve it from `workers`
+    processes sharing the socket (each with its own event loop, thread
+    pools, caches and metrics). The first worker runs every selection job;
+    the rest forward job routes to it over a Unix socket. options go to
+    create_server_app.
+    """
+    prepare_catalog(db_path)
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.set_inheritable(True)
+
+    if workers <= 1:
+        _run_worker(sock, db_path, False, options)
+        return
+
+    socket_dir = tempfile.mkdtemp(prefix='wine-serve-')
+    jobs_socket = os.path.join(socket_dir, 'jobs.sock')
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=_run_worker, args=(sock, db_path, True, options, jobs_socket, i == 0), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop(signal.SIGINT, None)
+        for process in processes:
+            process.join()
+    finally:
+        sock.close()
+        shutil.rmtree(socket_dir, ignore_errors=True)
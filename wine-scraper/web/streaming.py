@@ -0,0 +1,27 @@
+"""Streaming response bodies for large API results."""
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator
+
+
+def ndjson_chunks(rows: Iterable[Dict[str, Any]], rows_per_chunk: int = 500) -> Iterator[str]:
+    """Newline-delimited JSON, one row per line, yielded rows_per_chunk lines at a time."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str, ensure_ascii=False))
+        if len(lines) >= rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a stream of text chunks incrementally. Each chunk is sync-flushed, so
+    clients can decode rows as they arrive rather than at the end.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
@@ -2,12 +2,15 @@
 """Wine Agent CLI - Intelligent wine selection using Kaggle Vivino dataset."""
 import argparse
 import json
+import os
 import sys
 from pathlib import Path
 
 from data.loader import KaggleDatasetLoader
 from data.multi_loader import UnifiedWineLoader
 from agent.core import WineAgent
+from data.db import SEARCH_ORDERS
+from data.derived import PRICE_BANDS
 from themes.presets import get_theme_by_name, get_all_themes, search_themes
 
 
@@ -37,17 +40,38 @@ def cmd_select(args):
             print(f"  - {t.name}")
         sys.exit(1)
 
+    if args.record and not args.club:
+        print("--record needs --club")
+        sys.exit(1)
+
     # Override wine count if specified
     if args.count:
         theme.wine_count = args.count
 
     print(f"Selecting wines for theme: {theme.name}")
     print(f"Description: {theme.description}")
-    print(f"Target: {theme.wine_count} wines\n")
+    print(f"Target: {theme.wine_count} wines")
+    if args.box_budget:
+        print(f"Box budget: ${args.box_budget:.2f}")
+    print()
 
     # Select wines
-    agent = WineAgent()
-    wines = agent.select_for_theme(theme)
+    agent = WineAgent(
+        agentic=not args.semantic,
+        db_path=args.db,
+        hedge_deadline=args.hedge,
+        retrieval=args.semantic,
+        club=args.club,
+        seed=args.seed
+    )
+    wines = agent.select_for_theme(theme, box_budget=args.box_budget)
+
+    if agent.last_hedge:
+        hedge = agent.last_hedge
+        print(f"Hedged selection: {hedge['winner']} won "
+              f"(agentic: {hedge['agentic_status']}, {hedge.get('agentic_ms', '?')}ms; "
+              f"deterministic: {hedge.get('deterministic_ms', '?')}ms; "
+              f"deadline: {hedge['deadline_ms']}ms)\n")
 
     if not wines:
         print("No wines found matching theme criteria")
@@ -70,6 +94,14 @@ def cmd_select(args):
             print(f"   Why: {wine['selection_reason']}")
         print()
 
+    if args.box_budget:
+        total = sum(w['price_usd'] for w in wines)
+        print(f"Box total: ${total:.2f} of ${args.box_budget:.2f}\n")
+
+    if args.record:
+        added = agent.record_shipment(wines, theme)
+        print(f"Recorded {added} wines as shipped to {args.club}\n")
+
     # Export if requested
     if args.output:
         output_path = Path(args.output)
@@ -86,7 +118,7 @@ def cmd_select(args):
 
 def cmd_search(args):
     """Search wines with filters."""
-    agent = WineAgent()
+    agent = WineAgent(db_path=args.db)
     wines = agent.search(
         country=args.country,
         region=args.region,
@@ -94,9 +126,27 @@ def cmd_search(args):
         min_rating=args.min_rating,
         max_price=args.max_price,
         wine_type=args.wine_type,
-        limit=args.limit
+        limit=args.limit,
+        order_by=args.sort,
+        query=args.query,
+        explain=args.explain,
+        notes=args.notes,
+        min_price=args.min_price,
+        price_band=args.price_band,
+        min_value=args.min_value
     )
 
+    plan = agent.last_search_plan
+    if args.explain and plan:
+        print(f"Plan: {plan['strategy']}" + (f" via {plan['index']}" if plan.get('index') else ""))
+        if 'fts_matches' in plan:
+            print(f"  FTS matches: ~{plan['fts_matches']:,} of {plan['catalog_rows']:,}")
+            print(f"  Filter selectivity: {plan['selectivity']}")
+            print(f"  Estimated cost (us): {plan['cost_us']}")
+        for detail in plan.get('explain', []):
+            print(f"  {detail}")
+        print()
+
     if not wines:
         print("No wines found matching criteria")
         sys.exit(1)
@@ -106,6 +156,10 @@ def cmd_search(args):
         print(f"{i}. {wine['name']} ({wine.get('vintage', 'NV')})")
         print(f"   {wine.get('winery', 'N/A')} - {wine.get('region', 'N/A')}, {wine.get('country', 'N/A')}")
         print(f"   Rating: {wine.get('rating', 'N/A')}/5 | Price: ${wine.get('price_usd', 'N/A')}")
+        if wine.get('snippet'):
+            print(f"   Match: {wine['snippet']} (score {wine['match_score']})")
+        if wine.get('tasting_note'):
+            print(f"   Notes: {wine['tasting_note']}")
         print()
 
     # Export if requested
@@ -118,7 +172,7 @@ def cmd_search(args):
 
 def cmd_details(args):
     """Get details for a specific wine."""
-    agent = WineAgent()
+    agent = WineAgent(db_path=args.db)
     wine = agent.get_wine_details(args.id)
 
     if not wine:
@@ -158,16 +212,61 @@ def cmd_themes(args):
         print()
 
 
+def cmd_index(args):
+    """Build the semantic retrieval index."""
+    import time
+    from data.db import WineDatabase
+    from data.vector_index import WineVectorIndex, index_path
+
+    db = WineDatabase(args.db)
+    start = time.perf_counter()
+    index = WineVectorIndex.build(db)
+    db.close()
+
+    path = index_path(args.db)
+    index.save(str(path))
+    print(f"Indexed {len(index.ids)} wines ({len(index.rows)} postings) in {time.perf_counter() - start:.1f}s")
+    print(f"Saved to {path}")
+
+
+def cmd_migrate(args):
+    """Bring an existing database up to the current schema."""
+    import time
+    from data.db import WineDatabase
+
+    db = WineDatabase(args.db)
+    start = time.perf_counter()
+    backfilled = db.initialize_derived_schema()
+    db.initialize_schema()
+    db.refresh_column_stats()
+    db.close()
+    print(f"Schema up to date; backfilled derived columns for {backfilled} wines "
+          f"and refreshed planner statistics in {time.perf_counter() - start:.1f}s")
+
+
 def cmd_web(args):
     """Launch web UI."""
     from web.app import create_app
 
-    app = create_app(args.db)
+    app = create_app(args.db, hedge_deadline=args.hedge, response_cache_size=args.cache_size,
+                     selection_workers=args.workers, page_cache_dir=args.page_cache_dir)
     print(f"Starting wine selector web UI on http://localhost:{args.port}")
     print("Press Ctrl+C to stop")
     app.run(host='0.0.0.0', port=args.port, debug=args.debug)
 
 
+def cmd_serve(args):
+    """Serve the web app in production mode (aiohttp, async selections, several processes)."""
+    from web.server import serve
+
+    print(f"Serving wine selector on http://{args.host}:{args.port} "
+          f"({args.workers} worker{'s' if args.workers != 1 else ''}, {args.threads} threads each)")
+    print("Press Ctrl+C to stop")
+    serve(args.db, host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+          hedge_deadline=args.hedge, selection_workers=args.selections,
+          response_cache_size=args.cache_size, page_cache_dir=args.page_cache_dir)
+
+
 def main():
     """Main CLI entry point."""
     parser = argparse.ArgumentParser(
@@ -199,6 +298,18 @@ def main():
     select_parser.add_argument('theme', help='Theme name')
     select_parser.add_argument('--count', type=int, help='Override wine count')
     select_parser.add_argument('--output', '-o', help='Save selection to JSON file')
+    select_parser.add_argument('--hedge', type=float, metavar='SECONDS',
+                               help='Race agentic curation against deterministic selection with this deadline')
+    select_parser.add_argument('--semantic', action='store_true',
+                               help='Deterministic selection from wines resembling the theme description (no LLM)')
+    select_parser.add_argument('--box-budget', type=float, metavar='USD',
+                               help='Keep the total price of the box within this budget')
+    select_parser.add_argument('--club',
+                               help='Skip wines already shipped to this club')
+    select_parser.add_argument('--seed',
+                               help='Break rating ties pseudo-randomly with this seed (e.g. 2026-10)')
+    select_parser.add_argument('--record', action='store_true',
+                               help="Add the selection to the club's shipment history")
     select_parser.set_defaults(func=cmd_select)
 
     # Search command
@@ -206,12 +317,23 @@ def main():
         'search',
         help='Search wines with filters'
     )
+    search_parser.add_argument('--query', '-q',
+                               help='Full-text query, ranked by relevance, rating and popularity unless --sort is given')
+    search_parser.add_argument('--notes',
+                               help='Tasting-note words (e.g. "smoky"); ranked by note relevance unless --query or --sort is given')
     search_parser.add_argument('--country', help='Filter by country')
     search_parser.add_argument('--region', help='Filter by region')
     search_parser.add_argument('--grapes', help='Filter by grape varietals')
     search_parser.add_argument('--min-rating', type=float, help='Minimum rating (0-5)')
+    search_parser.add_argument('--min-price', type=float, help='Minimum price USD')
     search_parser.add_argument('--max-price', type=float, help='Maximum price USD')
     search_parser.add_argument('--wine-type', choices=['red', 'white', 'rosé', 'sparkling'], help='Wine type')
+    search_parser.add_argument('--price-band', choices=[label for label, _, _ in PRICE_BANDS], help='Price band')
+    search_parser.add_argument('--min-value', type=float, help='Minimum rating per dollar')
+    search_parser.add_argument('--sort', choices=list(SEARCH_ORDERS),
+                               help='Order by rating (default), value (rating per dollar) or availability')
+    search_parser.add_argument('--explain', action='store_true',
+                               help='Show the chosen query plan and SQLite EXPLAIN QUERY PLAN')
     search_parser.add_argument('--limit', type=int, default=20, help='Max results (default: 20)')
     search_parser.add_argument('--output', '-o', help='Save results to JSON file')
     search_parser.set_defaults(func=cmd_search)
@@ -232,6 +354,20 @@ def main():
     themes_parser.add_argument('--search', help='Search themes by keyword')
     themes_parser.set_defaults(func=cmd_themes)
 
+    # Index command
+    index_parser = subparsers.add_parser(
+        'index',
+        help='Build the semantic retrieval index'
+    )
+    index_parser.set_defaults(func=cmd_index)
+
+    # Migrate command
+    migrate_parser = subparsers.add_parser(
+        'migrate',
+        help='Add and backfill new columns, indexes and tables in an existing database'
+    )
+    migrate_parser.set_defaults(func=cmd_migrate)
+
     # Web command
     web_parser = subparsers.add_parser(
         'web',
@@ -239,8 +375,37 @@ def main():
     )
     web_parser.add_argument('--port', type=int, default=5000, help='Port (default: 5000)')
     web_parser.add_argument('--debug', action='store_true', help='Debug mode')
+    web_parser.add_argument('--hedge', type=float, metavar='SECONDS',
+                            help='Serve agentic selections hedged by deterministic ones after this deadline')
+    web_parser.add_argument('--cache-size', type=int, default=1024,
+                            help='API responses kept in memory per catalog version (0 disables; default: 1024)')
+    web_parser.add_argument('--workers', type=int, default=4,
+                            help='Theme selections run at once in the background (default: 4)')
+    web_parser.add_argument('--page-cache-dir', metavar='DIR',
+                            help='Spill rendered pages evicted from memory to this directory')
     web_parser.set_defaults(func=cmd_web)
 
+    # Serve command
+    serve_parser = subparsers.add_parser(
+        'serve',
+        help='Serve the web app in production mode'
+    )
+    serve_parser.add_argument('--host', default='0.0.0.0', help='Interface (default: 0.0.0.0)')
+    serve_parser.add_argument('--port', type=int, default=8000, help='Port (default: 8000)')
+    serve_parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                              help='Server processes sharing the port (default: CPUs, up to 4)')
+    serve_parser.add_argument('--threads', type=int, default=16,
+                              help='Request threads per process for database work (default: 16)')
+    serve_parser.add_argument('--selections', type=int, default=16,
+                              help='Theme selections run at once per process (default: 16)')
+    serve_parser.add_argument('--hedge', type=float, metavar='SECONDS',
+                              help='Serve agentic selections hedged by deterministic ones after this deadline')
+    serve_parser.add_argument('--cache-size', type=int, default=1024,
+                              help='API responses kept in memory per process (0 disables; default: 1024)')
+    serve_parser.add_argument('--page-cache-dir', metavar='DIR',
+                              help='Spill rendered pages evicted from memory to this directory')
+    serve_parser.set_defaults(func=cmd_serve)
+
     args = parser.parse_args()
 
     if not args.command: